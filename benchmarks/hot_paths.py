@@ -0,0 +1,457 @@
+"""
+Throughput and latency of the acquisition and analysis hot paths.
+
+Every benchmark processes the same synthetic tag stream, generated with
+``PoissonSource`` at a chosen total rate and channel mix, one batch at a time.
+Each batch is timed separately, the results give the overall throughput in
+tags/s and percentiles of the per batch latency, and are optionally written as
+JSON so runs from different releases can be compared with ``--compare``.
+
+    python benchmarks/hot_paths.py --output bench_output.json
+    python benchmarks/hot_paths.py --compare bench_output.json coincidence
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+from logicallyUQD import (
+    CoincidenceCounter,
+    Correlator,
+    Demultiplexer,
+    HeraldedGate,
+    LifetimeHistogrammer,
+    MultiTauCorrelator,
+    Pipeline,
+    PoissonSource,
+    RateBinner,
+    TagClient,
+    TagFilter,
+    TagReader,
+    TagMerger,
+    TagRecorder,
+    TagServer,
+    TimeConverter,
+    decode_tags,
+    demultiplex,
+    encode_tags,
+    get_num_threads,
+    set_num_threads,
+)
+from logicallyUQD.__version__ import version
+
+RESOLUTION = 78.125e-12
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """
+    Register a benchmark
+
+    The decorated factory is called with the parsed arguments and the list of
+    batches, and returns the function timed on each ``(channels,
+    timestamps)`` batch.
+    """
+
+    def register(factory):
+        BENCHMARKS[name] = factory
+        return factory
+
+    return register
+
+
+def channel_rates(rate, channels, mix):
+    if mix == 'uniform':
+        weights = np.ones(channels)
+    elif mix == 'skewed':
+        # Each channel half as busy as the previous one
+        weights = 0.5 ** np.arange(channels)
+    else:
+        raise ValueError(f'Unknown channel mix {mix}')
+    return rate * weights / weights.sum()
+
+
+def make_batches(args):
+    source = PoissonSource(
+        channel_rates(args.rate, args.channels, args.mix), seed=args.seed
+    )
+    total = args.batch_size * (args.batches + args.warmup)
+    duration = int(total / args.rate / RESOLUTION)
+    channels, timestamps = source.generate(0, duration, RESOLUTION)
+    return [
+        (channels[i : i + args.batch_size], timestamps[i : i + args.batch_size])
+        for i in range(0, channels.shape[0], args.batch_size)
+    ]
+
+
+@benchmark('copy')
+def copy_batch(args, batches):
+    # read_tags returns uint64 views, wrap as int64 and copy into owned
+    # buffers as read_tags_into and TagBufferPool do
+    channels_out = np.empty(args.batch_size, dtype=np.uint8)
+    timestamps_out = np.empty(args.batch_size, dtype=np.int64)
+
+    def run(channels, timestamps):
+        raw = timestamps.view(np.uint64)
+        n = channels.shape[0]
+        np.copyto(channels_out[:n], channels)
+        np.copyto(timestamps_out[:n], raw.view(np.int64))
+
+    return run
+
+
+@benchmark('channel_mask')
+def channel_mask(args, batches):
+    keep = np.zeros(256, dtype=bool)
+    keep[: max(1, args.channels // 2)] = True
+
+    def run(channels, timestamps):
+        mask = keep[channels]
+        return channels[mask], timestamps[mask]
+
+    return run
+
+
+@benchmark('channel_scan')
+def channel_scan(args, batches):
+    # Splitting a batch by channel with one mask per channel, the baseline
+    # for demultiplex
+    def run(channels, timestamps):
+        for c in range(args.channels):
+            timestamps[channels == c]
+
+    return run
+
+
+@benchmark('demultiplex')
+def demultiplex_batch(args, batches):
+    def run(channels, timestamps):
+        demultiplex(channels, timestamps, args.channels)
+
+    return run
+
+
+@benchmark('demultiplexer')
+def demultiplexer(args, batches):
+    demux = Demultiplexer(args.channels, capacity=args.batch_size)
+
+    def run(channels, timestamps):
+        demux.clear()
+        demux.append(channels, timestamps)
+
+    return run
+
+
+@benchmark('to_picoseconds')
+def to_picoseconds(args, batches):
+    delays = np.linspace(-1e-9, 1e-9, args.channels)
+    converter = TimeConverter(RESOLUTION, delays, args.channels)
+    out = np.empty(args.batch_size, dtype=np.int64)
+
+    def run(channels, timestamps):
+        converter.to_picoseconds(channels, timestamps, out)
+
+    return run
+
+
+@benchmark('coincidence')
+def coincidence(args, batches):
+    counter = CoincidenceCounter(
+        [16, 64, 256], number_of_channels=args.channels
+    )
+    return counter.process
+
+
+@benchmark('coincidence_delays')
+def coincidence_delays(args, batches):
+    counter = CoincidenceCounter(
+        64,
+        delays=np.arange(args.channels) * 100,
+        number_of_channels=args.channels,
+    )
+    return counter.process
+
+
+@benchmark('correlation')
+def correlation(args, batches):
+    pairs = [(0, c) for c in range(args.channels)]
+    correlator = Correlator(pairs, bin_width=16, max_lag=16 * 512)
+    return correlator.process
+
+
+@benchmark('multi_tau')
+def multi_tau(args, batches):
+    # Autocorrelation of every channel from 10 ns to about a second
+    pairs = [(c, c) for c in range(args.channels)]
+    correlator = MultiTauCorrelator(pairs)
+    return correlator.process
+
+
+@benchmark('heralded_gate')
+def heralded_gate(args, batches):
+    # Every other channel gated 10 ns after channel 0
+    gate = HeraldedGate(0, range(1, args.channels), (0, 128))
+    return gate.process
+
+
+@benchmark('lifetime')
+def lifetime(args, batches):
+    # Channel 0 as the sync, 50 ns of micro-time per photon channel
+    tcspc = LifetimeHistogrammer(0, range(1, args.channels), 640)
+    return tcspc.process
+
+
+@benchmark('rate_binner')
+def rate_binner(args, batches):
+    # 1 us bins with two decimation levels
+    binner = RateBinner(
+        12800, number_of_channels=args.channels, levels=3, decimation=10
+    )
+    return binner.process
+
+
+@benchmark('pipeline')
+def pipeline(args, batches):
+    # Half the channels, delayed, into a gate and a rate trace
+    channels = range(args.channels // 2)
+    chain = Pipeline([
+        TagFilter(channels),
+        TagFilter(delays=np.arange(args.channels) * 10),
+        HeraldedGate(0, range(1, args.channels), (0, 128), keep_heralds=True),
+        RateBinner(12800, number_of_channels=args.channels),
+    ])
+    return chain.process
+
+
+@benchmark('merge')
+def merge(args, batches):
+    # Three devices' streams, each batch split between them by channel
+    merger = TagMerger([0, 16, 32])
+    streams = iter([
+        [(c[(c % 3) == d], t[(c % 3) == d]) for d in range(3)]
+        for c, t in batches
+    ])
+
+    def run(channels, timestamps):
+        for device, (c, t) in enumerate(next(streams)):
+            merger.push(device, c, t)
+        merger.pop()
+
+    return run
+
+
+@benchmark('encode')
+def encode(args, batches):
+    def run(channels, timestamps):
+        encode_tags(channels, timestamps)
+
+    return run
+
+
+@benchmark('decode')
+def decode(args, batches):
+    frames = iter([encode_tags(c, t) for c, t in batches])
+
+    def run(channels, timestamps):
+        decode_tags(next(frames))
+
+    return run
+
+
+@benchmark('record')
+def record(args, batches):
+    path = os.path.join(args.workdir, 'record.uqd')
+    recorder = TagRecorder(
+        path, RESOLUTION, args.channels, chunk_size=args.batch_size
+    )
+    args.cleanup.append(recorder.close)
+
+    def run(channels, timestamps):
+        recorder.write(channels, timestamps)
+
+    return run
+
+
+@benchmark('replay')
+def replay(args, batches):
+    path = os.path.join(args.workdir, 'replay.uqd')
+    with TagRecorder(
+        path, RESOLUTION, args.channels, chunk_size=args.batch_size
+    ) as recorder:
+        for channels, timestamps in batches:
+            recorder.write(channels, timestamps)
+    reader = TagReader(path)
+    args.cleanup.append(reader.close)
+    chunks = reader.batches()
+
+    def run(channels, timestamps):
+        # Touch every tag so the pages are actually read
+        chunk_channels, chunk_timestamps = next(chunks)
+        int(chunk_channels.sum())
+        int(chunk_timestamps[-1])
+
+    return run
+
+
+@benchmark('loopback')
+def loopback(args, batches):
+    server = TagServer(
+        policy='block',
+        resolution=RESOLUTION,
+        number_of_channels=args.channels,
+    )
+    client = TagClient(server.address)
+    args.cleanup.append(client.close)
+    args.cleanup.append(server.close)
+    while server.clients == 0:
+        time.sleep(1e-3)
+
+    def run(channels, timestamps):
+        # Round trip of one batch through the server over TCP
+        server.publish(channels, timestamps)
+        client.read()
+
+    return run
+
+
+def run_benchmark(name, args, batches):
+    process = BENCHMARKS[name](args, batches)
+    for channels, timestamps in batches[: args.warmup]:
+        process(channels, timestamps)
+
+    timed = batches[args.warmup :]
+    latencies = np.empty(len(timed), dtype=np.int64)
+    tags = 0
+    for i, (channels, timestamps) in enumerate(timed):
+        start = time.perf_counter_ns()
+        process(channels, timestamps)
+        latencies[i] = time.perf_counter_ns() - start
+        tags += channels.shape[0]
+
+    seconds = latencies.sum() * 1e-9
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e-3
+    return {
+        'tags': tags,
+        'batches': len(timed),
+        'seconds': seconds,
+        'tags_per_second': tags / seconds if seconds > 0 else 0.0,
+        'latency_us': {
+            'mean': latencies.mean() * 1e-3,
+            'p50': p50,
+            'p90': p90,
+            'p99': p99,
+            'max': latencies.max() * 1e-3,
+        },
+    }
+
+
+def compare(results, path):
+    with open(path) as f:
+        previous = json.load(f)['results']
+    print(f'\nCompared to {path}')
+    for name, result in results.items():
+        if name not in previous:
+            continue
+        ratio = result['tags_per_second'] / previous[name]['tags_per_second']
+        flag = '  REGRESSION' if ratio < 0.9 else ''
+        print(f'{name:>20}: {ratio:6.2f}x{flag}')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        'benchmarks',
+        nargs='*',
+        help=f'benchmarks to run, from {", ".join(BENCHMARKS)} (default all)',
+    )
+    parser.add_argument(
+        '--rate', type=float, default=1e7, help='total tag rate in Hz'
+    )
+    parser.add_argument(
+        '--channels', type=int, default=16, help='number of active channels'
+    )
+    parser.add_argument(
+        '--mix', choices=['uniform', 'skewed'], default='uniform'
+    )
+    parser.add_argument('--batch-size', type=int, default=2**18)
+    parser.add_argument('--batches', type=int, default=32)
+    parser.add_argument(
+        '--warmup', type=int, default=2, help='untimed batches to run first'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=1,
+        help='threads for the analysis kernels, 0 for one per CPU',
+    )
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--compare', help='JSON results of an earlier run')
+    args = parser.parse_args(argv)
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            parser.error(f'Unknown benchmark {name}')
+    if len(args.benchmarks) == 0:
+        args.benchmarks = list(BENCHMARKS)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_num_threads(args.threads)
+    batches = make_batches(args)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        args.workdir = workdir
+        args.cleanup = []
+        for name in args.benchmarks:
+            results[name] = run_benchmark(name, args, batches)
+            r = results[name]
+            print(
+                f'{name:>20}: {r["tags_per_second"] / 1e6:9.2f} Mtags/s  '
+                f'p50 {r["latency_us"]["p50"]:9.1f} us  '
+                f'p99 {r["latency_us"]["p99"]:9.1f} us'
+            )
+        for close in args.cleanup:
+            close()
+
+    report = {
+        'metadata': {
+            'version': version,
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'parameters': {
+            'rate': args.rate,
+            'channels': args.channels,
+            'mix': args.mix,
+            'batch_size': args.batch_size,
+            'batches': args.batches,
+            'warmup': args.warmup,
+            'seed': args.seed,
+            'threads': get_num_threads(),
+        },
+        'results': results,
+    }
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare is not None:
+        compare(results, args.compare)
+    return report
+
+
+if __name__ == '__main__':
+    main()
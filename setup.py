@@ -1,4 +1,5 @@
 import os
+import sys
 from numpy import get_include
 from Cython.Build import cythonize
 from ctypes.util import find_library
@@ -20,32 +21,84 @@ cython_dir = os.path.join('./src/logicallyUQD/')
 
 extensions = []
 
-libusb = 'usb'
-if check_library_installed('lib' + libusb) is False:
-    if check_library_installed('lib' + libusb + '-1.0') is True:
-        libusb += '-1.0'
-    else:
-        raise ValueError('Could not find libusb')
-
-logically_UQD = Extension(
-    'logicallyUQD._lib',
-    sources=[
-        os.path.join(cython_dir, '_lib.py'),
-        os.path.join(cython_dir, 'bindings_uqd_logic.cpp'),
-    ],
-    include_dirs=[
-        get_include(),
-        cython_dir,
-        './opt/CTimeTag/Include',
-    ],
-    define_macros=[('NPY_NO_DEPRECATED_API', 'NPY_1_7_API_VERSION')],
-    libraries=[libusb, 'timetag64'],
-    library_dirs=['.', './opt/CTimeTag/Linux'],
-    extra_compile_args=[],
-    optional=os.environ.get('CIBUILDWHEEL', '0') != '1',
+# Set LOGICALLYUQD_NO_HARDWARE=1 to build without the device extension, for
+# machines without libusb or the vendor library. The simulated backend and the
+# analysis modules are still built.
+hardware = os.environ.get('LOGICALLYUQD_NO_HARDWARE', '0') != '1'
+
+if hardware:
+    libusb = 'usb'
+    if check_library_installed('lib' + libusb) is False:
+        if check_library_installed('lib' + libusb + '-1.0') is True:
+            libusb += '-1.0'
+        else:
+            raise ValueError('Could not find libusb')
+
+    logically_UQD = Extension(
+        'logicallyUQD._lib',
+        sources=[
+            os.path.join(cython_dir, '_lib.py'),
+            os.path.join(cython_dir, 'bindings_uqd_logic.cpp'),
+        ],
+        include_dirs=[
+            get_include(),
+            cython_dir,
+            './opt/CTimeTag/Include',
+        ],
+        define_macros=[('NPY_NO_DEPRECATED_API', 'NPY_1_7_API_VERSION')],
+        libraries=[libusb, 'timetag64'],
+        library_dirs=['.', './opt/CTimeTag/Linux'],
+        extra_compile_args=['-pthread'],
+        extra_link_args=['-pthread'],
+        optional=os.environ.get('CIBUILDWHEEL', '0') != '1',
+    )
+
+    extensions.append(logically_UQD)
+
+# Analysis modules only depend on NumPy. Their kernels are parallelised with
+# OpenMP, set LOGICALLYUQD_OPENMP=0 for compilers without it (Apple clang by
+# default), the kernels then run on one thread.
+openmp = (
+    os.environ.get(
+        'LOGICALLYUQD_OPENMP', '0' if sys.platform == 'darwin' else '1'
+    )
+    == '1'
 )
+if not openmp:
+    openmp_args = []
+elif sys.platform == 'win32':
+    openmp_args = ['/openmp']
+else:
+    openmp_args = ['-fopenmp']
+
+analysis_modules = [
+    '_parallel',
+    '_coincidence',
+    '_correlation',
+    '_codec',
+    '_telemetry',
+    '_timebase',
+    '_demux',
+    '_rates',
+    '_merge',
+    '_gate',
+    '_tcspc',
+    '_multitau',
+    '_pipeline',
+]
 
-extensions.append(logically_UQD)
+for module in analysis_modules:
+    extensions.append(
+        Extension(
+            f'logicallyUQD.{module}',
+            sources=[os.path.join(cython_dir, f'{module}.py')],
+            include_dirs=[get_include()],
+            define_macros=[('NPY_NO_DEPRECATED_API', 'NPY_1_7_API_VERSION')],
+            extra_compile_args=openmp_args,
+            extra_link_args=[] if sys.platform == 'win32' else openmp_args,
+            optional=os.environ.get('CIBUILDWHEEL', '0') != '1',
+        )
+    )
 
 ext_modules = cythonize(
     extensions,
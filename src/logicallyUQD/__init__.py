@@ -1,3 +1,60 @@
-from ._lib import UQDLogic16 as UQDLogic16
-from ._lib import LogicMode as LogicMode
-from ._lib import pattern_from_channels as pattern_from_channels
+import os as _os
+from importlib.machinery import EXTENSION_SUFFIXES as _EXTENSION_SUFFIXES
+
+try:
+    from ._lib import UQDLogic16 as UQDLogic16
+    from ._lib import LogicMode as LogicMode
+    from ._lib import TagStream as TagStream
+    from ._lib import TagBatch as TagBatch
+    from ._lib import TagBufferPool as TagBufferPool
+    from ._lib import LogicSampler as LogicSampler
+except (ImportError, AttributeError):
+    # Built without the device extension (LOGICALLYUQD_NO_HARDWARE=1), only
+    # the simulated backend and the analysis tools are available. Importing
+    # the uncompiled _lib.py fails with AttributeError if Cython is installed.
+    # If the extension was built, the vendor library failed to load.
+    if any(
+        _os.path.exists(_os.path.join(_os.path.dirname(__file__), '_lib' + s))
+        for s in _EXTENSION_SUFFIXES
+    ):
+        raise
+from ._parallel import pattern_from_channels as pattern_from_channels
+from ._coincidence import CoincidenceCounter as CoincidenceCounter
+from ._correlation import Correlator as Correlator
+from ._recording import TagRecorder as TagRecorder
+from ._recording import TagReader as TagReader
+from ._codec import encode_tags as encode_tags
+from ._codec import decode_tags as decode_tags
+from ._codec import TagEncoder as TagEncoder
+from ._codec import TagDecoder as TagDecoder
+from ._simulation import PoissonSource as PoissonSource
+from ._simulation import CorrelatedSource as CorrelatedSource
+from ._simulation import ReplaySource as ReplaySource
+from ._simulation import SimulatedUQDLogic16 as SimulatedUQDLogic16
+from ._simulation import SimulatedLogicMode as SimulatedLogicMode
+from ._simulation import SimulatedLogicSampler as SimulatedLogicSampler
+from ._telemetry import Telemetry as Telemetry
+from ._telemetry import LogHistogram as LogHistogram
+from ._calibration import VendorCalibration as VendorCalibration
+from ._calibration import CalibrationCache as CalibrationCache
+from ._config import DeviceConfig as DeviceConfig
+from ._timebase import TimeConverter as TimeConverter
+from ._demux import Demultiplexer as Demultiplexer
+from ._demux import demultiplex as demultiplex
+from ._rates import RateBinner as RateBinner
+from ._shared import TagPublisher as TagPublisher
+from ._shared import TagSubscriber as TagSubscriber
+from ._merge import TagMerger as TagMerger
+from ._multi import MultiDeviceSession as MultiDeviceSession
+from ._gate import HeraldedGate as HeraldedGate
+from ._tcspc import LifetimeHistogrammer as LifetimeHistogrammer
+from ._multitau import MultiTauCorrelator as MultiTauCorrelator
+from ._pipeline import TagFilter as TagFilter
+from ._pipeline import Pipeline as Pipeline
+from ._parallel import set_num_threads as set_num_threads
+from ._parallel import get_num_threads as get_num_threads
+from ._parallel import errors_from_bit_sets as errors_from_bit_sets
+from ._parallel import channels_from_patterns as channels_from_patterns
+from ._parallel import patterns_from_channels as patterns_from_channels
+from ._network import TagServer as TagServer
+from ._network import TagClient as TagClient
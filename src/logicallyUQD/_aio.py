@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Tuple
+from numpy import ndarray
+
+from ._tags import as_timestamps
+
+
+def device_executor() -> ThreadPoolExecutor:
+    """
+    Executor for the blocking calls of one device
+
+    A single worker keeps the calls to a device in order and off the event
+    loop, the vendor library is not safe to call from several threads at
+    once.
+
+    Returns:
+        (ThreadPoolExecutor): executor with one worker thread
+    """
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix='uqd')
+
+
+async def run_blocking(executor: ThreadPoolExecutor, function: Callable, *args):
+    """
+    Await a blocking call made on ``executor``
+
+    Args:
+        executor (ThreadPoolExecutor): executor of the device
+        function (Callable): blocking function to call
+        *args: arguments for ``function``
+
+    Returns:
+        the result of ``function``
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, function, *args)
+
+
+def read_tags_copy(uqd_logic16) -> Tuple[int, ndarray, ndarray]:
+    # read_tags returns views of the library's buffer, copy them on the
+    # worker thread before the next read can overwrite them
+    count, channels, timestamps = uqd_logic16.read_tags()
+    return count, channels.copy(), timestamps.copy()
+
+
+async def stream_tags(
+    uqd_logic16, poll_interval: float
+) -> AsyncIterator[Tuple[ndarray, ndarray]]:
+    """
+    Yield every non-empty batch read from a device
+
+    The stream ends once a device with an ``exhausted`` property, such as a
+    ``SimulatedUQDLogic16`` replaying a recording, reports it has no more
+    tags.
+
+    Args:
+        uqd_logic16 (UQDLogic16): device to read from
+        poll_interval (float): time to wait after an empty read in seconds
+
+    Yields:
+        Tuple[ndarray, ndarray]: (channels, timestamps) owned copies with
+        int64 timestamps
+    """
+    executor = uqd_logic16.executor
+    while True:
+        count, channels, timestamps = await run_blocking(
+            executor, read_tags_copy, uqd_logic16
+        )
+        if count > 0:
+            yield channels, as_timestamps(timestamps)
+        elif getattr(uqd_logic16, 'exhausted', False):
+            return
+        else:
+            await asyncio.sleep(poll_interval)
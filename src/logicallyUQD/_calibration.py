@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import time
+import warnings
+from typing import Optional
+from numpy import ndarray, asarray, float64, int64
+
+HEADER = 'Timetag Calibration Data'
+
+# Fields of the device identity that must match for a cached calibration to
+# be reused
+IDENTITY_FIELDS = ('fpga_version', 'number_of_channels', 'resolution')
+
+
+class VendorCalibration:
+    """
+    Contents of a vendor calibration file, ``Timetag Calibration Data1.txt``.
+
+    The file starts with three header lines, the title, the format version
+    and the number of channels, followed by one row per channel of integer
+    calibration values and a final floating point value. The last value is
+    the channel's delay, in units that are not part of the file, see
+    :meth:`delays`.
+
+    Args:
+        table (ndarray): integer values of each channel, shape
+            (channels, values)
+        delays (ndarray): last value of each channel's row
+        version (int): format version of the file
+    """
+
+    def __init__(self, table, delays, version: int = 1):
+        self.table = asarray(table, dtype=int64)
+        self._delays = asarray(delays, dtype=float64).reshape(-1)
+        if self.table.ndim != 2:
+            raise ValueError('table must have one row per channel')
+        if self.table.shape[0] != self._delays.shape[0]:
+            raise ValueError('table and delays must have the same channels')
+        self.version = version
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of channels in the file
+
+        Returns:
+            (int): number of channels
+        """
+        return self._delays.shape[0]
+
+    def delays(self, unit: float = 1e-12) -> ndarray:
+        """
+        Delay of each channel in seconds
+
+        Args:
+            unit (float): seconds per unit of the values in the file
+
+        Returns:
+            (ndarray): float64 delay of each channel
+        """
+        return self._delays * unit
+
+    @classmethod
+    def load(cls, path: str) -> 'VendorCalibration':
+        """
+        Read a calibration file
+
+        Args:
+            path (str): file to read
+
+        Returns:
+            (VendorCalibration): the file's contents
+        """
+        with open(path) as f:
+            lines = [line.strip() for line in f if line.strip() != '']
+
+        if (len(lines) < 3) or (not lines[0].startswith(HEADER)):
+            raise ValueError(f'{path} is not a timetag calibration file')
+
+        # The vendor spells the version line 'Verson'
+        version = _header_value(lines[1], ('Version', 'Verson'), path)
+        channels = _header_value(lines[2], ('Channels',), path)
+        rows = [line.split() for line in lines[3:]]
+        if len(rows) != channels:
+            raise ValueError(
+                f'{path} has {len(rows)} channel rows, expected {channels}'
+            )
+        if len({len(row) for row in rows}) != 1:
+            raise ValueError(f'{path} has rows of different lengths')
+
+        return cls(
+            [[int(v) for v in row[:-1]] for row in rows],
+            [float(row[-1]) for row in rows],
+            version,
+        )
+
+    def save(self, path: str, version: Optional[int] = None):
+        """
+        Write the calibration in the vendor's format
+
+        Args:
+            path (str): file to write
+            version (int, optional): format version, defaults to
+                :attr:`version`
+        """
+        version = self.version if version is None else version
+        with open(path, 'w') as f:
+            f.write(f'{HEADER}\nVerson {version}\n')
+            f.write(f'Channels {self.number_of_channels}\n')
+            for row, delay in zip(self.table, self._delays):
+                values = ' '.join(str(int(v)) for v in row)
+                f.write(f'{values} {delay:g}\n')
+
+
+def _header_value(line: str, keys, path: str) -> int:
+    parts = line.split()
+    if (len(parts) != 2) or (parts[0] not in keys):
+        raise ValueError(f'{path} has an invalid header line: {line}')
+    return int(parts[1])
+
+
+def default_cache_path() -> str:
+    """
+    Location of the calibration cache used when none is given
+
+    Returns:
+        (str): ``$XDG_CACHE_HOME/logicallyUQD/calibration.json``, with
+        ``~/.cache`` when the variable is not set
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache'
+    )
+    return os.path.join(base, 'logicallyUQD', 'calibration.json')
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+
+class CalibrationCache:
+    """
+    Record of when each device was last calibrated, to skip recalibrating.
+
+    ``CTimeTag_calibrate`` leaves its results in the vendor calibration file,
+    ``Timetag Calibration Data<device id>.txt`` in the working directory. The
+    cache stores, per device id, the device's identity (FPGA version, channel
+    count and resolution), the time of calibration and a digest of that file.
+    A calibration is reused only while the identity and the file are
+    unchanged and it is younger than ``max_age``.
+
+    The cache only decides whether ``calibrate`` is needed. The vendor API
+    cannot load a calibration into the device, so reusing one depends on the
+    vendor library applying its calibration file when the device is opened,
+    which has not been verified on hardware. Every reuse therefore raises a
+    ``RuntimeWarning``, and a changed calibration file means calibrating
+    again.
+
+    Args:
+        path (str, optional): JSON file holding the cache, defaults to
+            :func:`default_cache_path`
+        max_age (float, optional): seconds a calibration stays valid, None
+            for no limit
+        calibration_dir (str, optional): directory the vendor library writes
+            its calibration file to, defaults to the working directory
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_age: Optional[float] = 24 * 3600,
+        calibration_dir: Optional[str] = None,
+    ):
+        self._path = path if path is not None else default_cache_path()
+        self._max_age = max_age
+        self._calibration_dir = calibration_dir
+
+    @property
+    def path(self) -> str:
+        """
+        JSON file holding the cache
+
+        Returns:
+            (str): path of the cache
+        """
+        return self._path
+
+    def calibration_file(self, device_id: int) -> str:
+        """
+        Vendor calibration file of a device
+
+        Args:
+            device_id (int): device id as passed to ``UQDLogic16``
+
+        Returns:
+            (str): absolute path of the file
+        """
+        directory = self._calibration_dir
+        if directory is None:
+            directory = os.getcwd()
+        return os.path.abspath(
+            os.path.join(directory, f'{HEADER}{device_id}.txt')
+        )
+
+    def _load(self) -> dict:
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, entries: dict):
+        directory = os.path.dirname(self._path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        # Replace the file in one step so concurrent readers never see a
+        # partial write
+        temporary = f'{self._path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(entries, f, indent=2)
+        os.replace(temporary, self._path)
+
+    def lookup(self, device_id: int) -> Optional[dict]:
+        """
+        Cached calibration record of a device
+
+        Args:
+            device_id (int): device id
+
+        Returns:
+            (dict | None): record with the identity fields, ``calibrated``
+            (UNIX time) and ``digest``, or None if there is none
+        """
+        return self._load().get(str(device_id))
+
+    def is_valid(self, device_id: int, identity: dict) -> bool:
+        """
+        Whether the cached calibration of a device can be reused
+
+        Args:
+            device_id (int): device id
+            identity (dict): current values of the identity fields, as
+                ``UQDLogic16.identity``
+
+        Returns:
+            (bool): True if the device need not be calibrated again
+        """
+        record = self.lookup(device_id)
+        if record is None:
+            return False
+        for field in IDENTITY_FIELDS:
+            if record.get(field) != identity.get(field):
+                return False
+        if (self._max_age is not None) and (
+            time.time() - record.get('calibrated', 0) > self._max_age
+        ):
+            return False
+        digest = _file_digest(self.calibration_file(device_id))
+        return (digest is not None) and (digest == record.get('digest'))
+
+    def store(self, device_id: int, identity: dict):
+        """
+        Record that a device has just been calibrated
+
+        Args:
+            device_id (int): device id
+            identity (dict): values of the identity fields
+        """
+        entries = self._load()
+        record = {field: identity.get(field) for field in IDENTITY_FIELDS}
+        record['calibrated'] = time.time()
+        record['digest'] = _file_digest(self.calibration_file(device_id))
+        entries[str(device_id)] = record
+        self._save(entries)
+
+    def invalidate(self, device_id: Optional[int] = None):
+        """
+        Forget the calibration of one device, or of every device
+
+        Args:
+            device_id (int, optional): device to forget, None for all
+        """
+        entries = self._load()
+        if device_id is None:
+            entries = {}
+        else:
+            entries.pop(str(device_id), None)
+        self._save(entries)
+
+
+def warn_calibration_reused(cache: CalibrationCache, device_id: int):
+    """
+    Warn that a device was opened without calibrating
+
+    Reusing a calibration depends on the vendor library loading its
+    calibration file when the device is opened, which has not been
+    verified on hardware, so every reuse is reported.
+
+    Args:
+        cache (CalibrationCache): cache that held a valid calibration
+        device_id (int): device that was not calibrated
+    """
+    warnings.warn(
+        f'Device {device_id} was not calibrated, its cached calibration is '
+        'reused. This relies on the vendor library loading '
+        f'{cache.calibration_file(device_id)!r} when the device is opened. '
+        'Pass calibration_cache=None to calibrate.',
+        RuntimeWarning,
+        stacklevel=3,
+    )
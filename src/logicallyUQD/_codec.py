@@ -0,0 +1,271 @@
+import cython
+from typing import BinaryIO, Iterator, Tuple
+from numpy import ndarray, dtype, zeros, empty, frombuffer, uint8, int64
+
+from ._tags import as_channels, as_timestamps
+
+# Each encoded batch is a frame: FRAME_DTYPE followed by ``size`` bytes of
+# LEB128 varints. Varint ``i`` holds ``(t[i] - t[i - 1]) << channel_bits |
+# channel[i]`` with ``t[-1]`` taken as the frame's ``first`` timestamp.
+
+FRAME_MAGIC = b'UQDV'
+
+FRAME_DTYPE = dtype([
+    ('magic', 'S4'),
+    ('channel_bits', 'u1'),
+    ('reserved', 'S3'),
+    ('count', '<u8'),
+    ('first', '<i8'),
+    ('size', '<u8'),
+])
+
+# A 64 bit value never needs more than 10 varint bytes
+_MAX_VARINT_BYTES = 10
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _encode(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    channel_bits: cython.int,
+    out: cython.uchar[::1],
+) -> cython.Py_ssize_t:
+    # Returns the number of bytes written, or -(i + 1) if tag i cannot be
+    # encoded
+    i: cython.Py_ssize_t
+    pos: cython.Py_ssize_t = 0
+    n: cython.Py_ssize_t = timestamps.shape[0]
+    previous: cython.longlong = timestamps[0]
+    delta: cython.longlong
+    value: cython.ulonglong
+    limit: cython.uint = 1 << channel_bits
+
+    for i in range(n):
+        delta = timestamps[i] - previous
+        if (delta < 0) or (channels[i] >= limit):
+            return -(i + 1)
+        previous = timestamps[i]
+
+        value = cython.cast(cython.ulonglong, delta) << channel_bits
+        value |= cython.cast(cython.ulonglong, channels[i])
+        while value >= 0x80:
+            out[pos] = (value & 0x7F) | 0x80
+            value >>= 7
+            pos += 1
+        out[pos] = value
+        pos += 1
+
+    return pos
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _decode(
+    data: cython.const[cython.uchar][::1],
+    first: cython.longlong,
+    channel_bits: cython.int,
+    channels_out: cython.uchar[::1],
+    timestamps_out: cython.longlong[::1],
+) -> cython.Py_ssize_t:
+    # Returns the number of tags decoded, fewer than requested if the data
+    # ends part way through
+    i: cython.Py_ssize_t
+    pos: cython.Py_ssize_t = 0
+    size: cython.Py_ssize_t = data.shape[0]
+    n: cython.Py_ssize_t = timestamps_out.shape[0]
+    t: cython.longlong = first
+    value: cython.ulonglong
+    shift: cython.int
+    byte: cython.uchar
+    mask: cython.ulonglong = (1 << channel_bits) - 1
+
+    for i in range(n):
+        value = 0
+        shift = 0
+        while True:
+            if pos >= size:
+                return i
+            byte = data[pos]
+            pos += 1
+            value |= cython.cast(cython.ulonglong, byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+
+        t += cython.cast(cython.longlong, value >> channel_bits)
+        channels_out[i] = value & mask
+        timestamps_out[i] = t
+
+    return n
+
+
+def encode_tags(channels, timestamps, channel_bits: int = 4) -> bytes:
+    """
+    Compress a batch of tags into a single frame
+
+    Timestamps must not decrease within the batch, each is stored as the
+    varint encoded difference to the previous tag with the channel packed
+    into the low ``channel_bits`` bits.
+
+    Args:
+        channels (ndarray): channel of each tag
+        timestamps (ndarray): timestamp of each tag in bins
+        channel_bits (int): bits reserved for the channel, 4 for 16 channels
+
+    Returns:
+        (bytes): encoded frame
+    """
+    if (channel_bits < 0) or (channel_bits > 8):
+        raise ValueError('channel_bits must be between 0 and 8')
+
+    channels = as_channels(channels)
+    timestamps = as_timestamps(timestamps)
+    n: cython.Py_ssize_t = timestamps.shape[0]
+    if channels.shape[0] != n:
+        raise ValueError('channels and timestamps must be the same length')
+
+    header = zeros(1, dtype=FRAME_DTYPE)
+    header['magic'] = FRAME_MAGIC
+    header['channel_bits'] = channel_bits
+    header['count'] = n
+    if n == 0:
+        return header.tobytes()
+
+    header['first'] = timestamps[0]
+    out = empty(FRAME_DTYPE.itemsize + n * _MAX_VARINT_BYTES, dtype=uint8)
+    size: cython.Py_ssize_t = _encode(
+        channels, timestamps, channel_bits, out[FRAME_DTYPE.itemsize :]
+    )
+    if size < 0:
+        i = -size - 1
+        if channels[i] >= (1 << channel_bits):
+            raise ValueError(
+                f'Channel {channels[i]} does not fit in {channel_bits} bits'
+            )
+        raise ValueError(f'Timestamps decrease at tag {i}')
+
+    header['size'] = size
+    out[: FRAME_DTYPE.itemsize] = header.view(uint8)
+    return out[: FRAME_DTYPE.itemsize + size].tobytes()
+
+
+def _read_header(data) -> ndarray:
+    header = frombuffer(data, dtype=FRAME_DTYPE, count=1)[0]
+    if header['magic'] != FRAME_MAGIC:
+        raise ValueError('Not an encoded tag frame')
+    return header
+
+
+def decode_tags(frame) -> Tuple[ndarray, ndarray]:
+    """
+    Decompress a frame made by :func:`encode_tags`
+
+    Args:
+        frame (bytes): encoded frame
+
+    Returns:
+        Tuple[ndarray, ndarray]: (channels, timestamps) arrays
+    """
+    data = frombuffer(frame, dtype=uint8)
+    header = _read_header(data)
+    start = FRAME_DTYPE.itemsize
+    return _decode_payload(header, data[start : start + int(header['size'])])
+
+
+def _decode_payload(header, payload: ndarray) -> Tuple[ndarray, ndarray]:
+    n = int(header['count'])
+    channels = empty(n, dtype=uint8)
+    timestamps = empty(n, dtype=int64)
+    if n == 0:
+        return channels, timestamps
+
+    decoded = _decode(
+        payload,
+        int(header['first']),
+        int(header['channel_bits']),
+        channels,
+        timestamps,
+    )
+    if decoded != n:
+        raise ValueError(f'Frame truncated after {decoded} of {n} tags')
+    return channels, timestamps
+
+
+class TagEncoder:
+    """
+    Write compressed tag batches to a binary stream.
+
+    Args:
+        stream (BinaryIO): file or socket like object to write frames to
+        channel_bits (int): bits reserved for the channel in each varint
+    """
+
+    def __init__(self, stream: BinaryIO, channel_bits: int = 4):
+        self._stream = stream
+        self._channel_bits = channel_bits
+        self.tags_written = 0
+        self.bytes_written = 0
+
+    @property
+    def bytes_per_tag(self) -> float:
+        """
+        Average encoded size of a tag, including frame headers
+
+        Returns:
+            (float): bytes per tag
+        """
+        if self.tags_written == 0:
+            return 0.0
+        return self.bytes_written / self.tags_written
+
+    def write(self, channels, timestamps):
+        """
+        Encode a batch of tags and write it as one frame
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+        """
+        frame = encode_tags(channels, timestamps, self._channel_bits)
+        self._stream.write(frame)
+        self.tags_written += len(timestamps)
+        self.bytes_written += len(frame)
+
+
+class TagDecoder:
+    """
+    Read compressed tag batches from a binary stream.
+
+    Iterating yields one ``(channels, timestamps)`` pair per frame until the
+    stream is exhausted.
+
+    Args:
+        stream (BinaryIO): file or socket like object written by
+            :class:`TagEncoder`
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+
+    def __iter__(self) -> Iterator[Tuple[ndarray, ndarray]]:
+        return self
+
+    def __next__(self) -> Tuple[ndarray, ndarray]:
+        raw = self._stream.read(FRAME_DTYPE.itemsize)
+        if len(raw) == 0:
+            raise StopIteration
+        if len(raw) < FRAME_DTYPE.itemsize:
+            raise ValueError('Stream ends inside a frame header')
+
+        header = _read_header(raw)
+        payload = self._stream.read(int(header['size']))
+        if len(payload) < int(header['size']):
+            raise ValueError('Stream ends inside a frame')
+        return _decode_payload(header, frombuffer(payload, dtype=uint8))
@@ -0,0 +1,333 @@
+import cython
+from cython.parallel import prange
+from numpy import (
+    ndarray,
+    zeros,
+    arange,
+    asarray,
+    argsort,
+    concatenate,
+    searchsorted,
+    uint8,
+    uint64,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+from ._parallel import get_num_threads
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _scan_groups(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    n: cython.Py_ssize_t,
+    window: cython.longlong,
+    state: cython.longlong[::1],
+    counts: cython.ulonglong[::1],
+    number_of_channels: cython.int,
+) -> cython.void:
+    # state holds (is_open, start, pattern) of the group left open by the
+    # previous call
+    i: cython.Py_ssize_t
+    ch: cython.int
+    t: cython.longlong
+    is_open: cython.longlong = state[0]
+    start: cython.longlong = state[1]
+    pattern: cython.longlong = state[2]
+
+    for i in range(n):
+        ch = channels[i]
+        if ch >= number_of_channels:
+            continue
+
+        t = timestamps[i]
+        if is_open and (t - start <= window):
+            pattern |= 1 << ch
+        else:
+            if is_open:
+                counts[pattern] += 1
+            is_open = 1
+            start = t
+            pattern = 1 << ch
+
+    state[0] = is_open
+    state[1] = start
+    state[2] = pattern
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _scan_windows(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    n: cython.Py_ssize_t,
+    windows: cython.const[cython.longlong][::1],
+    state: cython.longlong[:, ::1],
+    counts: cython.ulonglong[:, ::1],
+    number_of_channels: cython.int,
+    threads: cython.int,
+) -> cython.void:
+    # Windows are independent, each thread scans the batch for its own
+    w: cython.Py_ssize_t
+    for w in prange(windows.shape[0], nogil=True, num_threads=threads):
+        _scan_groups(
+            channels,
+            timestamps,
+            n,
+            windows[w],
+            state[w],
+            counts[w],
+            number_of_channels,
+        )
+
+
+@cython.cclass
+class CoincidenceCounter:
+    """
+    Software coincidence counting over timetag batches.
+
+    Tags are grouped in a single pass: a group opens at the first tag and
+    takes every following tag no more than ``window`` bins after it, the
+    group's pattern is the OR of its channels' bits. Counts are kept for
+    every exact pattern, in the same bitmask layout as
+    ``pattern_from_channels`` with tag channel ``c`` mapping to bit ``c``
+    (i.e. ``pattern_from_channels([c + 1])``).
+
+    Several windows can be evaluated over the same data at once, and the
+    group left open at the end of a batch, along with any tags that per
+    channel delays could still reorder, is carried into the next batch.
+    Call :meth:`flush` after the last batch to close the open groups.
+
+    Args:
+        windows (int | Sequence[int]): coincidence window(s) in bins of
+            ``UQDLogic16.resolution``
+        delays (Sequence[int], optional): delay in bins added to each
+            channel before grouping
+        number_of_channels (int): number of channels to count, tags on
+            higher channels are ignored
+    """
+
+    _windows: ndarray
+    _delays: ndarray
+    _has_delays: cython.bint
+    _number_of_channels: cython.int
+    _counts: ndarray
+    _state: ndarray
+    _carry_channels: ndarray
+    _carry_timestamps: ndarray
+
+    def __init__(
+        self,
+        windows,
+        delays=None,
+        number_of_channels: int = 16,
+    ):
+        if (number_of_channels < 1) or (number_of_channels > 16):
+            raise ValueError('number_of_channels must be between 1 and 16')
+
+        self._windows = asarray(windows, dtype=int64).reshape(-1)
+        if self._windows.shape[0] == 0:
+            raise ValueError('At least one window is required')
+        if (self._windows < 0).any():
+            raise ValueError('windows must be >= 0')
+
+        self._number_of_channels = number_of_channels
+
+        # Indexed directly by the uint8 channel so out of range channels
+        # need no special casing
+        self._delays = zeros(256, dtype=int64)
+        if delays is not None:
+            delays = asarray(delays, dtype=int64)
+            if delays.shape[0] != number_of_channels:
+                raise ValueError(
+                    f'delays must have {number_of_channels} entries'
+                )
+            # Only relative delays matter, keeping them >= 0 means a tag can
+            # never move ahead of the last raw timestamp seen
+            self._delays[:number_of_channels] = delays - delays.min()
+        self._has_delays = bool(self._delays.any())
+
+        self._counts = zeros(
+            (self._windows.shape[0], 1 << number_of_channels), dtype=uint64
+        )
+        self._state = zeros((self._windows.shape[0], 3), dtype=int64)
+        self._carry_channels = zeros(0, dtype=uint8)
+        self._carry_timestamps = zeros(0, dtype=int64)
+
+    @property
+    def windows(self) -> ndarray:
+        """
+        Coincidence windows in bins
+
+        Returns:
+            (ndarray): one entry per window
+        """
+        return self._windows.copy()
+
+    @property
+    def delays(self) -> ndarray:
+        """
+        Relative delay applied to each channel in bins
+
+        Returns:
+            (ndarray): one entry per channel
+        """
+        return self._delays[: self._number_of_channels].copy()
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of channels counted
+
+        Returns:
+            (int): number of channels
+        """
+        return self._number_of_channels
+
+    @property
+    def counts(self) -> ndarray:
+        """
+        Number of closed groups with each exact pattern
+
+        Returns:
+            (ndarray): uint64 array of shape (windows, 2**number_of_channels)
+        """
+        return self._counts
+
+    def reset(self):
+        """
+        Clear all counts and any state carried between batches
+        """
+        self._counts[:] = 0
+        self._state[:] = 0
+        self._carry_channels = zeros(0, dtype=uint8)
+        self._carry_timestamps = zeros(0, dtype=int64)
+
+    def _scan(self, channels: ndarray, timestamps: ndarray):
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if n == 0:
+            return
+        _scan_windows(
+            channels,
+            timestamps,
+            n,
+            self._windows,
+            self._state,
+            self._counts,
+            self._number_of_channels,
+            get_num_threads(),
+        )
+
+    @cython.ccall
+    def process(self, channels, timestamps):
+        """
+        Add a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        if timestamps.shape[0] == 0:
+            return
+
+        if not self._has_delays:
+            self._scan(channels, timestamps)
+            return
+
+        # Later batches can only hold tags at or after the last raw
+        # timestamp, so delayed tags before it are in their final order
+        last = timestamps[timestamps.shape[0] - 1]
+        delayed = timestamps + self._delays[channels]
+        if self._carry_timestamps.shape[0] > 0:
+            channels = concatenate((self._carry_channels, channels))
+            delayed = concatenate((self._carry_timestamps, delayed))
+
+        # The stream is sorted per channel, so this is close to linear
+        order = argsort(delayed, kind='stable')
+        channels = channels[order]
+        delayed = delayed[order]
+
+        cut = searchsorted(delayed, last, side='right')
+        self._carry_channels = channels[cut:]
+        self._carry_timestamps = delayed[cut:]
+        self._scan(channels[:cut], delayed[:cut])
+
+    def flush(self):
+        """
+        Process carried tags and close the groups left open
+
+        Use after the final batch of an acquisition.
+        """
+        self._scan(self._carry_channels, self._carry_timestamps)
+        self._carry_channels = zeros(0, dtype=uint8)
+        self._carry_timestamps = zeros(0, dtype=int64)
+
+        w: cython.Py_ssize_t
+        for w in range(self._windows.shape[0]):
+            if self._state[w, 0]:
+                self._counts[w, self._state[w, 2]] += 1
+            self._state[w] = 0
+
+    def counts_pos(self, window_index: int = 0) -> ndarray:
+        """
+        Counts for every pattern, including groups that are a superset of it
+
+        Entry ``p`` matches ``LogicMode.calc_count_pos(p)``.
+
+        Args:
+            window_index (int): which window to use
+
+        Returns:
+            (ndarray): uint64 array of length 2**number_of_channels
+        """
+        totals = self._counts[window_index].copy()
+        i: cython.int
+        for i in range(self._number_of_channels):
+            # Fold every pattern with bit i set onto the pattern without it
+            view = totals.reshape(-1, 2, 1 << i)
+            view[:, 0, :] += view[:, 1, :]
+        return totals
+
+    def count(
+        self, positive: int, negative: int = 0, window_index: int = 0
+    ) -> int:
+        """
+        Groups containing every channel in ``positive`` and none of
+        ``negative``, as ``LogicMode.calc_count``
+
+        Args:
+            positive (int): pattern of channels that must be present
+            negative (int): pattern of channels that must be absent
+            window_index (int): which window to use
+
+        Returns:
+            (int): number of matching groups
+        """
+        patterns = arange(1 << self._number_of_channels)
+        matches = ((patterns & positive) == positive) & (
+            (patterns & negative) == 0
+        )
+        return int(self._counts[window_index][matches].sum())
+
+    def count_pos(self, pattern: int, window_index: int = 0) -> int:
+        """
+        Groups containing every channel in ``pattern``, as
+        ``LogicMode.calc_count_pos``
+
+        Args:
+            pattern (int): pattern of channels that must be present
+            window_index (int): which window to use
+
+        Returns:
+            (int): number of matching groups
+        """
+        return self.count(pattern, 0, window_index)
@@ -0,0 +1,375 @@
+import json
+from typing import Optional
+from numpy import (
+    ndarray,
+    zeros,
+    arange,
+    asarray,
+    broadcast_to,
+    flatnonzero,
+    rint,
+    float64,
+    int64,
+    uint8,
+)
+
+# Largest input delay the device accepts, in bins
+MAX_DELAY_BINS = (2**18) - 1
+
+
+def channel_mask(bits) -> int:
+    """
+    Bit mask with bit ``i`` set for every non zero ``bits[i]``
+
+    Args:
+        bits (ndarray): one entry per channel
+
+    Returns:
+        (int): mask as taken by ``setInversionMask``/``setFilterException``
+    """
+    bits = asarray(bits).reshape(-1) != 0
+    return int((bits.astype(int64) << arange(bits.shape[0])).sum())
+
+
+class DeviceConfig:
+    """
+    Complete input configuration of a device.
+
+    Holds every setting of the input stage as one array per channel or one
+    value, to be written with ``UQDLogic16.apply_config``. The device compares
+    the configuration with the one it last applied and writes only the
+    registers that differ, so switching between a few configurations during
+    an experiment costs only the changed values. ``UQDLogic16.config``
+    returns the current configuration, which :meth:`save` and :meth:`load`
+    keep in a JSON file.
+
+    Arrays are indexed from channel 0. Scalars given for a per channel
+    setting are used for every channel.
+
+    Args:
+        number_of_channels (int): number of input channels
+        input_threshold (ndarray, optional): threshold of each channel in
+            volts, between -2 V and 2 V
+        input_delay (ndarray, optional): delay of each channel in seconds,
+            rounded to whole bins when applied
+        inversion (ndarray, optional): non zero for channels triggering on
+            the negative edge
+        exclusion (ndarray, optional): non zero for channels excluded from
+            the group filter
+        filter_min_count (int): minimum size of a group
+        filter_max_time (float): maximum time between two pulses in the
+            same group in seconds
+        led_brightness (int): brightness of the front panel LED in percent
+        external_10MHz_reference (bool): use the external 10 MHz reference
+        level_gate (bool): use the level gate
+    """
+
+    def __init__(
+        self,
+        number_of_channels: int = 16,
+        input_threshold=None,
+        input_delay=None,
+        inversion=None,
+        exclusion=None,
+        filter_min_count: int = 1,
+        filter_max_time: float = 0.0,
+        led_brightness: int = 0,
+        external_10MHz_reference: bool = False,
+        level_gate: bool = False,
+    ):
+        n = number_of_channels
+        self.number_of_channels = n
+        self.input_threshold = _per_channel(input_threshold, n, float64)
+        self.input_delay = _per_channel(input_delay, n, float64)
+        self.inversion = _per_channel(inversion, n, uint8)
+        self.exclusion = _per_channel(exclusion, n, uint8)
+        self.filter_min_count = int(filter_min_count)
+        self.filter_max_time = float(filter_max_time)
+        self.led_brightness = int(led_brightness)
+        self.external_10MHz_reference = bool(external_10MHz_reference)
+        self.level_gate = bool(level_gate)
+
+    @property
+    def inversion_mask(self) -> int:
+        """
+        Inverted channels as a bit mask
+
+        Returns:
+            (int): bit ``i`` set if channel ``i`` is inverted
+        """
+        return channel_mask(self.inversion)
+
+    @property
+    def exclusion_mask(self) -> int:
+        """
+        Channels excluded from the group filter as a bit mask
+
+        Returns:
+            (int): bit ``i`` set if channel ``i`` is excluded
+        """
+        return channel_mask(self.exclusion)
+
+    def delay_bins(self, resolution: float) -> ndarray:
+        """
+        Input delays as written to the device
+
+        Args:
+            resolution (float): bin width of the device in seconds
+
+        Returns:
+            (ndarray): int64 delay of each channel in bins
+        """
+        return rint(self.input_delay / resolution).astype(int64)
+
+    def validate(self, resolution: float):
+        """
+        Check every value is in the range the device accepts
+
+        Args:
+            resolution (float): bin width of the device in seconds
+
+        Raises:
+            ValueError: if a value is out of range
+        """
+        n = self.number_of_channels
+        for name in (
+            'input_threshold',
+            'input_delay',
+            'inversion',
+            'exclusion',
+        ):
+            if getattr(self, name).shape != (n,):
+                raise ValueError(f'{name} must have {n} entries')
+        if (abs(self.input_threshold) > 2).any():
+            raise ValueError('abs(voltage) must be <= 2V')
+        bins = self.delay_bins(resolution)
+        if ((bins < 0) | (bins > MAX_DELAY_BINS)).any():
+            raise ValueError(
+                'Delay is out of range, must be >= 0 or < '
+                f'{MAX_DELAY_BINS * resolution}s'
+            )
+        if (self.filter_min_count < 1) or (self.filter_min_count > 10):
+            raise ValueError('Count filter must be between 1 and 10')
+        if self.filter_max_time < 0:
+            raise ValueError('filter_max_time must be >= 0')
+        if (self.led_brightness < 0) or (self.led_brightness > 100):
+            raise ValueError(
+                'led_brightness must be in an integer between 0 and 100'
+            )
+
+    def changes(
+        self, previous: Optional['DeviceConfig'], resolution: float
+    ) -> dict:
+        """
+        Registers that must be written to go from ``previous`` to this
+        configuration
+
+        Delays and the filter time are compared in bins, so values that round
+        to the same register are not written again.
+
+        Args:
+            previous (DeviceConfig, optional): configuration the device has,
+                None if it is not known and everything must be written
+            resolution (float): bin width of the device in seconds
+
+        Returns:
+            (dict): ``input_threshold`` and ``input_delay`` map to the int64
+            indices of the channels to write, every other setting is present
+            only if it must be written
+        """
+        if previous is None:
+            n = self.number_of_channels
+            return {
+                'input_threshold': arange(n, dtype=int64),
+                'input_delay': arange(n, dtype=int64),
+                'inversion_mask': self.inversion_mask,
+                'exclusion_mask': self.exclusion_mask,
+                'filter_min_count': self.filter_min_count,
+                'filter_max_time': self.filter_max_time,
+                'led_brightness': self.led_brightness,
+                'external_10MHz_reference': self.external_10MHz_reference,
+                'level_gate': self.level_gate,
+            }
+
+        if previous.number_of_channels != self.number_of_channels:
+            raise ValueError('Configurations have different channel counts')
+
+        changes = {
+            'input_threshold': flatnonzero(
+                self.input_threshold != previous.input_threshold
+            ).astype(int64),
+            'input_delay': flatnonzero(
+                self.delay_bins(resolution) != previous.delay_bins(resolution)
+            ).astype(int64),
+        }
+        for name in ('inversion_mask', 'exclusion_mask'):
+            value = getattr(self, name)
+            if value != getattr(previous, name):
+                changes[name] = value
+        if int(self.filter_max_time // resolution) != int(
+            previous.filter_max_time // resolution
+        ):
+            changes['filter_max_time'] = self.filter_max_time
+        for name in (
+            'filter_min_count',
+            'led_brightness',
+            'external_10MHz_reference',
+            'level_gate',
+        ):
+            value = getattr(self, name)
+            if value != getattr(previous, name):
+                changes[name] = value
+        return changes
+
+    def copy(self) -> 'DeviceConfig':
+        """
+        Independent copy of the configuration
+
+        Returns:
+            (DeviceConfig): copy
+        """
+        return DeviceConfig.from_dict(self.to_dict())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, DeviceConfig):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f'DeviceConfig({self.to_dict()})'
+
+    def to_dict(self) -> dict:
+        """
+        Configuration as plain Python values
+
+        Returns:
+            (dict): keyword arguments of the constructor
+        """
+        return {
+            'number_of_channels': self.number_of_channels,
+            'input_threshold': self.input_threshold.tolist(),
+            'input_delay': self.input_delay.tolist(),
+            'inversion': self.inversion.tolist(),
+            'exclusion': self.exclusion.tolist(),
+            'filter_min_count': self.filter_min_count,
+            'filter_max_time': self.filter_max_time,
+            'led_brightness': self.led_brightness,
+            'external_10MHz_reference': self.external_10MHz_reference,
+            'level_gate': self.level_gate,
+        }
+
+    @classmethod
+    def from_dict(cls, values: dict) -> 'DeviceConfig':
+        """
+        Configuration from the values returned by :meth:`to_dict`
+
+        Args:
+            values (dict): keyword arguments of the constructor
+
+        Returns:
+            (DeviceConfig): configuration
+        """
+        return cls(**values)
+
+    def save(self, path: str):
+        """
+        Write the configuration as JSON
+
+        Args:
+            path (str): file to write
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'DeviceConfig':
+        """
+        Read a configuration written by :meth:`save`
+
+        Args:
+            path (str): file to read
+
+        Returns:
+            (DeviceConfig): configuration
+        """
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def config_changes(
+    device,
+    config: DeviceConfig,
+    applied: Optional[DeviceConfig],
+    force: bool = False,
+) -> dict:
+    """
+    Check ``config`` fits ``device`` and find the registers to write
+
+    Args:
+        device (UQDLogic16 | SimulatedUQDLogic16): device to configure
+        config (DeviceConfig): configuration to write
+        applied (DeviceConfig, optional): configuration the device has, None
+            if it is not known
+        force (bool): write every register
+
+    Returns:
+        (dict): changes as returned by :meth:`DeviceConfig.changes`
+
+    Raises:
+        ValueError: if ``config`` does not fit the device
+    """
+    n = device.number_of_channels
+    if config.number_of_channels != n:
+        raise ValueError(f'config must have {n} channels')
+    config.validate(device.resolution)
+    return config.changes(None if force else applied, device.resolution)
+
+
+def apply_changes(device, config: DeviceConfig, changes: dict) -> int:
+    """
+    Bring ``device`` to ``config`` once its channel registers are written
+
+    The per channel settings are copied into the device's arrays and every
+    other register in ``changes`` is written through the device's setters.
+
+    Args:
+        device (UQDLogic16 | SimulatedUQDLogic16): device to configure
+        config (DeviceConfig): configuration being written
+        changes (dict): changes from :func:`config_changes`
+
+    Returns:
+        (int): number of registers written, including the channel registers
+    """
+    resolution = device.resolution
+    device.input_threshold[:] = config.input_threshold
+    device.input_delay[:] = config.delay_bins(resolution) * resolution
+    device.inversion[:] = config.inversion
+    device.exclusion[:] = config.exclusion
+    if 'inversion_mask' in changes:
+        device.inversion_apply()
+    if 'exclusion_mask' in changes:
+        device.exclusion_apply()
+    for name in (
+        'filter_min_count',
+        'filter_max_time',
+        'led_brightness',
+        'external_10MHz_reference',
+        'level_gate',
+    ):
+        if name in changes:
+            setattr(device, name, changes[name])
+    return (
+        changes['input_threshold'].shape[0]
+        + changes['input_delay'].shape[0]
+        + len(changes)
+        - 2
+    )
+
+
+def _per_channel(values, n: int, dtype) -> ndarray:
+    if values is None:
+        return zeros(n, dtype=dtype)
+    values = asarray(values, dtype=dtype)
+    if values.ndim == 0:
+        return broadcast_to(values, (n,)).copy()
+    return values.reshape(-1).copy()
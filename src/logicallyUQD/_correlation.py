@@ -0,0 +1,317 @@
+import cython
+from cython.parallel import prange
+from numpy import (
+    ndarray,
+    zeros,
+    arange,
+    concatenate,
+    diff,
+    searchsorted,
+    float64,
+    uint64,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+from ._demux import demultiplex
+from ._parallel import get_num_threads
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _accumulate(
+    starts: cython.const[cython.longlong][::1],
+    starts_lo: cython.Py_ssize_t,
+    starts_hi: cython.Py_ssize_t,
+    stops: cython.const[cython.longlong][::1],
+    stops_lo: cython.Py_ssize_t,
+    stops_hi: cython.Py_ssize_t,
+    skip_same: cython.bint,
+    max_lag: cython.longlong,
+    bin_width: cython.longlong,
+    histogram: cython.ulonglong[::1],
+) -> cython.void:
+    # Histogram stop - start for every pair with -max_lag <= lag < max_lag.
+    # Both inputs should be sorted so the first start in range only moves
+    # forward. Unsorted input gives wrong counts, the lag is still checked
+    # so it never indexes outside the histogram.
+    i: cython.Py_ssize_t
+    j: cython.Py_ssize_t
+    first: cython.Py_ssize_t = starts_lo
+    t: cython.longlong
+    lag: cython.longlong
+
+    for j in range(stops_lo, stops_hi):
+        t = stops[j]
+        while (first < starts_hi) and (starts[first] <= t - max_lag):
+            first += 1
+
+        i = first
+        while (i < starts_hi) and (starts[i] <= t + max_lag):
+            if not (skip_same and (i == j)):
+                lag = t - starts[i]
+                if (lag >= -max_lag) and (lag < max_lag):
+                    histogram[(lag + max_lag) // bin_width] += 1
+            i += 1
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _accumulate_pairs(
+    tags: cython.const[cython.longlong][::1],
+    bounds: cython.const[cython.longlong][:, ::1],
+    max_lag: cython.longlong,
+    bin_width: cython.longlong,
+    histograms: cython.ulonglong[:, ::1],
+    threads: cython.int,
+) -> cython.void:
+    # bounds[p] holds the first, first new and end index of the start
+    # channel's tags, then the same for the stop channel. Pairs have their
+    # own histogram, so each thread takes whole pairs.
+    p: cython.Py_ssize_t
+    same: cython.bint
+    for p in prange(bounds.shape[0], nogil=True, num_threads=threads):
+        same = bounds[p, 0] == bounds[p, 3]
+        # Every pair with a new stop, then new starts with old stops
+        _accumulate(
+            tags,
+            bounds[p, 0],
+            bounds[p, 2],
+            tags,
+            bounds[p, 4],
+            bounds[p, 5],
+            same,
+            max_lag,
+            bin_width,
+            histograms[p],
+        )
+        _accumulate(
+            tags,
+            bounds[p, 1],
+            bounds[p, 2],
+            tags,
+            bounds[p, 3],
+            bounds[p, 4],
+            same,
+            max_lag,
+            bin_width,
+            histograms[p],
+        )
+
+
+@cython.cclass
+class Correlator:
+    """
+    Streaming cross-correlation histograms between channel pairs.
+
+    For every ``(start, stop)`` pair the histogram counts all combinations of
+    a start tag and a stop tag with ``-max_lag <= t_stop - t_start <
+    max_lag``, which for ``start == stop`` gives the autocorrelation without
+    the zero lag self pairs. Both channels are scanned with a sorted two
+    pointer kernel, so each batch costs O(tags + pairs in range), and the
+    tags within ``max_lag`` of the end of a batch are kept so pairs spanning
+    two batches are counted.
+
+    Args:
+        pairs (Sequence[Tuple[int, int]]): (start, stop) tag channels
+        bin_width (int): histogram bin width in bins of
+            ``UQDLogic16.resolution``
+        max_lag (int): largest lag to histogram in bins of
+            ``UQDLogic16.resolution``, rounded up to a whole number of
+            ``bin_width``
+    """
+
+    _pairs: list
+    _channels: list
+    _bin_width: cython.longlong
+    _max_lag: cython.longlong
+    _histograms: ndarray
+    _history: dict
+    _tag_counts: ndarray
+    _first: cython.longlong
+    _last: cython.longlong
+    _started: cython.bint
+
+    def __init__(self, pairs, bin_width: int, max_lag: int):
+        if bin_width < 1:
+            raise ValueError('bin_width must be >= 1')
+        if max_lag < 1:
+            raise ValueError('max_lag must be >= 1')
+
+        self._pairs = [(int(a), int(b)) for a, b in pairs]
+        if len(self._pairs) == 0:
+            raise ValueError('At least one channel pair is required')
+        for a, b in self._pairs:
+            if not ((0 <= a < 256) and (0 <= b < 256)):
+                raise ValueError('channels must be in range 0 <= channel < 256')
+
+        self._channels = sorted({c for pair in self._pairs for c in pair})
+        self._bin_width = bin_width
+        self._max_lag = -(-max_lag // bin_width) * bin_width
+        n_bins: cython.Py_ssize_t = 2 * (self._max_lag // bin_width)
+        self._histograms = zeros((len(self._pairs), n_bins), dtype=uint64)
+        self.reset()
+
+    @property
+    def pairs(self) -> list:
+        """
+        Channel pairs being correlated
+
+        Returns:
+            (List[Tuple[int, int]]): (start, stop) channels
+        """
+        return list(self._pairs)
+
+    @property
+    def bin_width(self) -> int:
+        """
+        Histogram bin width in bins
+
+        Returns:
+            (int): bin width
+        """
+        return self._bin_width
+
+    @property
+    def max_lag(self) -> int:
+        """
+        Largest lag histogrammed in bins
+
+        Returns:
+            (int): maximum lag
+        """
+        return self._max_lag
+
+    @property
+    def bin_edges(self) -> ndarray:
+        """
+        Lag at the edges of the histogram bins
+
+        Returns:
+            (ndarray): int64 array of length bins + 1
+        """
+        return arange(
+            -self._max_lag, self._max_lag + 1, self._bin_width, dtype=int64
+        )
+
+    @property
+    def histograms(self) -> ndarray:
+        """
+        Accumulated histograms, one row per pair
+
+        Returns:
+            (ndarray): uint64 array of shape (pairs, bins)
+        """
+        return self._histograms
+
+    @property
+    def duration(self) -> int:
+        """
+        Time spanned by the tags processed so far in bins
+
+        Returns:
+            (int): last minus first timestamp
+        """
+        if not self._started:
+            return 0
+        return self._last - self._first
+
+    def reset(self):
+        """
+        Clear the histograms and the tags carried between batches
+        """
+        self._histograms[:] = 0
+        self._history = {c: zeros(0, dtype=int64) for c in self._channels}
+        self._tag_counts = zeros(256, dtype=int64)
+        self._first = 0
+        self._last = 0
+        self._started = False
+
+    @cython.ccall
+    def process(self, channels, timestamps):
+        """
+        Add a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins, sorted
+                within each channel and later than the previous batch
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if n == 0:
+            return
+
+        if not self._started:
+            self._first = timestamps[0]
+            self._started = True
+        self._last = timestamps[n - 1]
+        offsets, packed = demultiplex(channels, timestamps, 256)
+        self._tag_counts += diff(offsets)
+
+        # Previously seen tags followed by this batch, per channel, packed in
+        # one buffer so the pairs can be correlated without the GIL
+        parts = []
+        bounds = {}
+        position = 0
+        for c in self._channels:
+            new = packed[offsets[c] : offsets[c + 1]]
+            parts.append(self._history[c])
+            parts.append(new)
+            old = position + self._history[c].shape[0]
+            bounds[c] = (position, old, old + new.shape[0])
+            position = old + new.shape[0]
+        tags = concatenate(parts)
+        pair_bounds = zeros((len(self._pairs), 6), dtype=int64)
+        p: cython.Py_ssize_t
+        for p in range(len(self._pairs)):
+            a, b = self._pairs[p]
+            pair_bounds[p, :3] = bounds[a]
+            pair_bounds[p, 3:] = bounds[b]
+        _accumulate_pairs(
+            tags,
+            pair_bounds,
+            self._max_lag,
+            self._bin_width,
+            self._histograms,
+            get_num_threads(),
+        )
+
+        # Later tags are no earlier than the last timestamp, so only tags
+        # within max_lag of it can still form pairs
+        cutoff = self._last - self._max_lag
+        for c in self._channels:
+            first, _, last = bounds[c]
+            channel = tags[first:last]
+            self._history[c] = channel[searchsorted(channel, cutoff) :].copy()
+
+    def normalised(self) -> ndarray:
+        """
+        Histograms divided by the counts expected for uncorrelated channels
+
+        For Poissonian sources this is g(2) of each pair.
+
+        Returns:
+            (ndarray): float64 array of shape (pairs, bins)
+        """
+        result = zeros(self._histograms.shape, dtype=float64)
+        duration = self.duration
+        if duration <= 0:
+            return result
+
+        p: cython.Py_ssize_t
+        for p in range(len(self._pairs)):
+            a, b = self._pairs[p]
+            n_a = self._tag_counts[a]
+            n_b = self._tag_counts[b]
+            expected = n_a * n_b * self._bin_width / duration
+            if expected > 0:
+                result[p] = self._histograms[p] / expected
+        return result
@@ -0,0 +1,314 @@
+import cython
+from cython.parallel import prange
+from typing import Tuple
+from numpy import (
+    ndarray,
+    zeros,
+    empty,
+    arange,
+    concatenate,
+    cumsum,
+    maximum,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+from ._parallel import chunks
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _count(
+    channels: cython.const[cython.uchar][::1],
+    counts: cython.longlong[::1],
+) -> cython.void:
+    # counts has 256 entries so every uint8 channel has one
+    i: cython.Py_ssize_t
+    for i in range(channels.shape[0]):
+        counts[channels[i]] += 1
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _scatter(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    number_of_channels: cython.int,
+    positions: cython.longlong[::1],
+    out: cython.longlong[::1],
+) -> cython.void:
+    # Write each tag at the next free position of its channel, keeping the
+    # order of the batch within a channel
+    i: cython.Py_ssize_t
+    c: cython.uchar
+    for i in range(timestamps.shape[0]):
+        c = channels[i]
+        if c < number_of_channels:
+            out[positions[c]] = timestamps[i]
+            positions[c] += 1
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _count_chunks(
+    channels: cython.const[cython.uchar][::1],
+    bounds: cython.const[cython.longlong][::1],
+    counts: cython.longlong[:, ::1],
+) -> cython.void:
+    # Chunk j is bounds[j]:bounds[j + 1] and is counted into counts[j]
+    j: cython.Py_ssize_t
+    i: cython.Py_ssize_t
+    k: cython.Py_ssize_t = bounds.shape[0] - 1
+    for j in prange(k, nogil=True, num_threads=k):
+        for i in range(bounds[j], bounds[j + 1]):
+            counts[j, channels[i]] += 1
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _scatter_chunks(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    number_of_channels: cython.int,
+    bounds: cython.const[cython.longlong][::1],
+    positions: cython.longlong[:, ::1],
+    out: cython.longlong[::1],
+) -> cython.void:
+    # positions[j] is where chunk j's first tag of each channel goes, after
+    # those of the earlier chunks, so the order within a channel is kept
+    j: cython.Py_ssize_t
+    i: cython.Py_ssize_t
+    c: cython.uchar
+    k: cython.Py_ssize_t = bounds.shape[0] - 1
+    for j in prange(k, nogil=True, num_threads=k):
+        for i in range(bounds[j], bounds[j + 1]):
+            c = channels[i]
+            if c < number_of_channels:
+                out[positions[j, c]] = timestamps[i]
+                positions[j, c] += 1
+
+
+def demultiplex(
+    channels, timestamps, number_of_channels: int = 16
+) -> Tuple[ndarray, ndarray]:
+    """
+    Split a batch into the timestamps of each channel
+
+    A counting sort, one pass to count the tags of each channel and one to
+    write them, instead of a scan and an allocation per channel. Large
+    batches are split into chunks counted and written by separate threads,
+    see ``set_num_threads``. Tags of channels ``>= number_of_channels`` are
+    dropped.
+
+    Args:
+        channels (ndarray): channel of each tag
+        timestamps (ndarray): timestamp of each tag in bins
+        number_of_channels (int): number of channels to keep
+
+    Returns:
+        (Tuple[ndarray, ndarray]): (offsets, packed) where the timestamps of
+        channel ``c`` are ``packed[offsets[c]:offsets[c + 1]]``
+    """
+    if (number_of_channels < 1) or (number_of_channels > 256):
+        raise ValueError('number_of_channels must be between 1 and 256')
+    channels = as_channels(channels)
+    timestamps = as_timestamps(timestamps)
+    if channels.shape[0] != timestamps.shape[0]:
+        raise ValueError('channels and timestamps must be the same length')
+
+    n = timestamps.shape[0]
+    k = chunks(n)
+    bounds = arange(k + 1, dtype=int64) * n // k
+    counts = zeros((k, 256), dtype=int64)
+    _count_chunks(channels, bounds, counts)
+    counts = counts[:, :number_of_channels]
+    offsets = zeros(number_of_channels + 1, dtype=int64)
+    cumsum(counts.sum(axis=0), out=offsets[1:])
+    packed = empty(offsets[number_of_channels], dtype=int64)
+    positions = offsets[:number_of_channels] + cumsum(counts, axis=0) - counts
+    _scatter_chunks(
+        channels, timestamps, number_of_channels, bounds, positions, packed
+    )
+    return offsets, packed
+
+
+@cython.cclass
+class Demultiplexer:
+    """
+    Per channel timestamps accumulated over many batches.
+
+    Each channel owns a segment of one int64 buffer, ``starts[c]`` to
+    ``starts[c + 1]``, of which the first ``counts[c]`` entries are filled.
+    :meth:`append` counts the tags of each channel in a batch, grows the
+    buffer if a segment would overflow, then writes every tag straight to the
+    end of its channel's segment. :meth:`channel` returns a view of a
+    segment, so consumers read a channel's tags without scanning the batch
+    again.
+
+    Segments at least double when they grow, so the buffer is reallocated
+    O(log tags) times. Views returned by :meth:`channel` are only valid until
+    the next :meth:`append` or :meth:`clear`.
+
+    Args:
+        number_of_channels (int): number of channels to keep, tags of higher
+            channels are counted in :attr:`ignored` and dropped
+        capacity (int): initial number of tags held per channel
+    """
+
+    _number_of_channels: cython.int
+    _buffer: ndarray
+    _starts: ndarray
+    _counts: ndarray
+    _batch_counts: ndarray
+    _ignored: cython.longlong
+
+    def __init__(self, number_of_channels: int = 16, capacity: int = 4096):
+        if (number_of_channels < 1) or (number_of_channels > 256):
+            raise ValueError('number_of_channels must be between 1 and 256')
+        if capacity < 1:
+            raise ValueError('capacity must be >= 1')
+
+        self._number_of_channels = number_of_channels
+        self._starts = zeros(number_of_channels + 1, dtype=int64)
+        self._starts[1:] = capacity
+        cumsum(self._starts, out=self._starts)
+        self._buffer = empty(self._starts[number_of_channels], dtype=int64)
+        self._counts = zeros(number_of_channels, dtype=int64)
+        self._batch_counts = zeros(256, dtype=int64)
+        self._ignored = 0
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of channels kept
+
+        Returns:
+            (int): number of channels
+        """
+        return self._number_of_channels
+
+    @property
+    def counts(self) -> ndarray:
+        """
+        Number of tags held for each channel
+
+        Returns:
+            (ndarray): int64 array of length ``number_of_channels``
+        """
+        return self._counts.copy()
+
+    @property
+    def capacity(self) -> ndarray:
+        """
+        Number of tags each channel can hold before the buffer grows
+
+        Returns:
+            (ndarray): int64 array of length ``number_of_channels``
+        """
+        return self._starts[1:] - self._starts[:-1]
+
+    @property
+    def ignored(self) -> int:
+        """
+        Number of tags dropped because their channel is not kept
+
+        Returns:
+            (int): dropped tags
+        """
+        return self._ignored
+
+    def __len__(self) -> int:
+        return int(self._counts.sum())
+
+    def __getitem__(self, channel: int) -> ndarray:
+        return self.channel(channel)
+
+    @cython.ccall
+    def channel(self, channel: cython.int) -> ndarray:
+        """
+        Timestamps of one channel, in the order they were appended
+
+        Args:
+            channel (int): channel, 0 <= channel < ``number_of_channels``
+
+        Returns:
+            (ndarray): int64 view into the buffer
+        """
+        if (channel < 0) or (channel >= self._number_of_channels):
+            raise ValueError(
+                'channel must be in range 0 <= channel < '
+                f'{self._number_of_channels}'
+            )
+        start = self._starts[channel]
+        return self._buffer[start : start + self._counts[channel]]
+
+    def _grow(self, needed: ndarray):
+        capacity = maximum(needed, 2 * self.capacity)
+        starts = zeros(self._number_of_channels + 1, dtype=int64)
+        cumsum(capacity, out=starts[1:])
+        buffer = empty(starts[self._number_of_channels], dtype=int64)
+        for c in range(self._number_of_channels):
+            count = self._counts[c]
+            buffer[starts[c] : starts[c] + count] = self.channel(c)
+        self._starts = starts
+        self._buffer = buffer
+
+    @cython.ccall
+    def append(self, channels, timestamps):
+        """
+        Add a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        if channels.shape[0] != timestamps.shape[0]:
+            raise ValueError('channels and timestamps must be the same length')
+
+        n: cython.int = self._number_of_channels
+        batch = self._batch_counts
+        batch[:] = 0
+        _count(channels, batch)
+        self._ignored += int(batch[n:].sum())
+
+        needed = self._counts + batch[:n]
+        if (needed > self.capacity).any():
+            self._grow(needed)
+
+        positions = self._starts[:n] + self._counts
+        _scatter(channels, timestamps, n, positions, self._buffer)
+        self._counts[:] = needed
+
+    def clear(self):
+        """
+        Remove every tag, keeping the buffer for the next batches
+        """
+        self._counts[:] = 0
+        self._ignored = 0
+
+    def csr(self) -> Tuple[ndarray, ndarray]:
+        """
+        Every channel's timestamps packed without gaps
+
+        Returns:
+            (Tuple[ndarray, ndarray]): (offsets, packed) in the layout of
+            :func:`demultiplex`, both copies
+        """
+        offsets = zeros(self._number_of_channels + 1, dtype=int64)
+        cumsum(self._counts, out=offsets[1:])
+        packed = concatenate([
+            self.channel(c) for c in range(self._number_of_channels)
+        ])
+        return offsets, packed
@@ -0,0 +1,284 @@
+import cython
+from typing import Sequence, Tuple
+from numpy import (
+    ndarray,
+    zeros,
+    empty,
+    concatenate,
+    searchsorted,
+    uint8,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _collect_heralds(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    herald: cython.uchar,
+    heralds: cython.longlong[::1],
+    count: cython.Py_ssize_t,
+) -> cython.Py_ssize_t:
+    # Append the batch's heralds after the count carried over, returning the
+    # new count
+    i: cython.Py_ssize_t
+    for i in range(timestamps.shape[0]):
+        if channels[i] == herald:
+            heralds[count] = timestamps[i]
+            count += 1
+    return count
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _gate(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    gated: cython.const[cython.uchar][::1],
+    herald: cython.uchar,
+    keep_heralds: cython.bint,
+    start: cython.longlong,
+    stop: cython.longlong,
+    heralds: cython.const[cython.longlong][::1],
+    carried: cython.Py_ssize_t,
+    first_index: cython.longlong,
+    channels_out: cython.uchar[::1],
+    timestamps_out: cython.longlong[::1],
+    index_out: cython.longlong[::1],
+) -> cython.Py_ssize_t:
+    # A gated tag at t is kept if the latest herald h <= t - start has
+    # h >= t - stop. Tags and heralds are sorted so that herald only moves
+    # forward. The first carried heralds are from earlier batches. Returns
+    # the number of tags written.
+    i: cython.Py_ssize_t
+    j: cython.Py_ssize_t = -1
+    kept: cython.Py_ssize_t = 0
+    t: cython.longlong
+    c: cython.uchar
+    last: cython.Py_ssize_t = heralds.shape[0] - 1
+    herald_number: cython.Py_ssize_t = carried - 1
+
+    for i in range(timestamps.shape[0]):
+        c = channels[i]
+        t = timestamps[i]
+        if c == herald:
+            herald_number += 1
+            if keep_heralds:
+                channels_out[kept] = c
+                timestamps_out[kept] = t
+                index_out[kept] = first_index + herald_number
+                kept += 1
+        elif gated[c]:
+            while (j < last) and (heralds[j + 1] <= t - start):
+                j += 1
+            if (j >= 0) and (heralds[j] >= t - stop):
+                channels_out[kept] = c
+                timestamps_out[kept] = t
+                index_out[kept] = first_index + j
+                kept += 1
+    return kept
+
+
+@cython.cclass
+class HeraldedGate:
+    """
+    Keep only the tags that follow a herald within a window.
+
+    A tag on one of the gated channels at time ``t`` is kept when a tag on
+    the herald channel arrived between ``t - window[1]`` and
+    ``t - window[0]``, every other tag is dropped. Heralds are remembered
+    across batches, so windows spanning two batches work, and are numbered
+    from the first one processed so kept tags can be grouped by the herald
+    that opened their window, with the latest such herald when windows
+    overlap. With a window starting at 0, a herald with the same timestamp as
+    a gated tag opens its window only if it is in the same or an earlier
+    batch, the gate cannot wait for a later one.
+
+    Each batch costs one pass to collect the heralds and one to gate, so
+    the gate can run straight after ``read_tags`` and leave only the
+    relevant tags for the analysis and storage behind it.
+
+    Args:
+        herald (int): herald channel
+        channels (Sequence[int]): gated channels
+        window (Tuple[int, int]): (start, stop) of the window after a herald
+            in bins of ``UQDLogic16.resolution``, 0 <= start <= stop
+        keep_heralds (bool): also pass every herald tag
+    """
+
+    _herald: cython.uchar
+    _gated: ndarray
+    _start: cython.longlong
+    _stop: cython.longlong
+    _keep_heralds: cython.bint
+    _heralds: ndarray
+    _carried: cython.Py_ssize_t
+    _first_index: cython.longlong
+    _herald_count: cython.longlong
+    _tags_in: cython.longlong
+    _tags_out: cython.longlong
+    _last_index: ndarray
+
+    def __init__(
+        self,
+        herald: int,
+        channels: Sequence[int],
+        window: Tuple[int, int],
+        keep_heralds: bool = False,
+    ):
+        if not (0 <= herald < 256):
+            raise ValueError('herald must be in range 0 <= channel < 256')
+        start, stop = window
+        if (start < 0) or (stop < start):
+            raise ValueError('window must have 0 <= start <= stop')
+
+        self._herald = herald
+        self._gated = zeros(256, dtype=uint8)
+        for c in channels:
+            if not (0 <= c < 256):
+                raise ValueError('channels must be in range 0 <= channel < 256')
+            if c == herald:
+                raise ValueError('The herald channel cannot be gated')
+            self._gated[c] = 1
+        self._start = start
+        self._stop = stop
+        self._keep_heralds = keep_heralds
+        self._heralds = zeros(1024, dtype=int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the heralds seen and zero the counters
+        """
+        self._carried = 0
+        self._first_index = 0
+        self._herald_count = 0
+        self._tags_in = 0
+        self._tags_out = 0
+        self._last_index = zeros(0, dtype=int64)
+
+    @property
+    def window(self) -> Tuple[int, int]:
+        """
+        Window after each herald
+
+        Returns:
+            (Tuple[int, int]): (start, stop) in bins
+        """
+        return self._start, self._stop
+
+    @property
+    def heralds(self) -> int:
+        """
+        Number of heralds seen
+
+        Returns:
+            (int): heralds processed
+        """
+        return self._herald_count
+
+    @property
+    def tags_in(self) -> int:
+        """
+        Number of tags processed
+
+        Returns:
+            (int): tags given to :meth:`process`
+        """
+        return self._tags_in
+
+    @property
+    def tags_out(self) -> int:
+        """
+        Number of tags kept
+
+        Returns:
+            (int): tags returned by :meth:`process`
+        """
+        return self._tags_out
+
+    @property
+    def herald_index(self) -> ndarray:
+        """
+        Herald of each tag returned by the last :meth:`process`
+
+        Returns:
+            (ndarray): int64 number of the herald that opened each kept
+            tag's window, or of the herald itself for herald tags
+        """
+        return self._last_index
+
+    @cython.ccall
+    def process(self, channels, timestamps) -> Tuple[ndarray, ndarray]:
+        """
+        Gate a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+
+        Returns:
+            (Tuple[ndarray, ndarray]): uint8 channels and int64 timestamps of
+            the tags kept
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+
+        if self._carried + n > self._heralds.shape[0]:
+            self._heralds = concatenate((
+                self._heralds[: self._carried],
+                empty(self._carried + n, dtype=int64),
+            ))
+        count: cython.Py_ssize_t = _collect_heralds(
+            channels, timestamps, self._herald, self._heralds, self._carried
+        )
+
+        channels_out = empty(n, dtype=uint8)
+        timestamps_out = empty(n, dtype=int64)
+        index_out = empty(n, dtype=int64)
+        heralds_view: cython.longlong[::1] = self._heralds
+        kept: cython.Py_ssize_t = _gate(
+            channels,
+            timestamps,
+            self._gated,
+            self._herald,
+            self._keep_heralds,
+            self._start,
+            self._stop,
+            heralds_view[:count],
+            self._carried,
+            self._first_index,
+            channels_out,
+            timestamps_out,
+            index_out,
+        )
+
+        self._herald_count += count - self._carried
+        self._tags_in += n
+        self._tags_out += kept
+        self._last_index = index_out[:kept]
+
+        # Only heralds within stop of the last tag can open later windows
+        if n > 0:
+            keep_from = searchsorted(
+                self._heralds[:count], timestamps[n - 1] - self._stop
+            )
+            remaining = count - keep_from
+            self._heralds[:remaining] = self._heralds[keep_from:count]
+            self._first_index += keep_from
+            self._carried = remaining
+        else:
+            self._carried = count
+        return channels_out[:kept], timestamps_out[:kept]
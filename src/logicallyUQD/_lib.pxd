@@ -1,7 +1,9 @@
 cimport numpy as np
-from libc.stdint cimport int64_t
+from libc.stdint cimport int64_t, uint64_t
 
-cdef extern from "./bindings_uqd_logic.h":
+# Nothing in the shim touches Python objects, so every call may be made
+# with the GIL released
+cdef extern from "./bindings_uqd_logic.h" nogil:
     ctypedef long long c_TimeType
     ctypedef unsigned char c_ChannelType
     ctypedef void* CTimeTag_ptr
@@ -91,3 +93,70 @@ cdef extern from "./bindings_uqd_logic.h":
     void CLogic_setOutputPattern(CLogic_ptr logic, int output, int pos, int neg)
 
     void CLogic_setOutputEventCount(CLogic_ptr logic, int events)
+
+    ctypedef void* TagStream_ptr
+
+    TagStream_ptr TagStream_create(
+        CTimeTag_ptr timetag,
+        int64_t capacity,
+        int min_poll_us,
+        int max_poll_us)
+
+    void TagStream_destroy(TagStream_ptr stream)
+
+    int TagStream_start(TagStream_ptr stream)
+
+    void TagStream_stop(TagStream_ptr stream)
+
+    int TagStream_isRunning(TagStream_ptr stream)
+
+    int64_t TagStream_available(TagStream_ptr stream)
+
+    int64_t TagStream_peek(
+        TagStream_ptr stream,
+        c_ChannelType** channel_ret,
+        c_TimeType** time_ret,
+        int64_t max_count)
+
+    void TagStream_release(TagStream_ptr stream, int64_t count)
+
+    int64_t TagStream_capacity(TagStream_ptr stream)
+
+    int64_t TagStream_totalTags(TagStream_ptr stream)
+
+    int64_t TagStream_droppedTags(TagStream_ptr stream)
+
+    int64_t TagStream_batches(TagStream_ptr stream)
+
+    int TagStream_pollInterval(TagStream_ptr stream)
+
+    int TagStream_takeErrorFlags(TagStream_ptr stream)
+
+    ctypedef void* LogicSampler_ptr
+
+    LogicSampler_ptr LogicSampler_create(
+        CLogic_ptr logic,
+        const int* patterns,
+        int pattern_count,
+        int64_t capacity,
+        int interval_us,
+        int64_t* time_counters,
+        uint64_t* counts)
+
+    void LogicSampler_destroy(LogicSampler_ptr sampler)
+
+    int LogicSampler_start(LogicSampler_ptr sampler)
+
+    void LogicSampler_stop(LogicSampler_ptr sampler)
+
+    int LogicSampler_isRunning(LogicSampler_ptr sampler)
+
+    int64_t LogicSampler_samples(LogicSampler_ptr sampler)
+
+    int64_t LogicSampler_overruns(LogicSampler_ptr sampler)
+
+    int64_t LogicSampler_latest(
+        LogicSampler_ptr sampler,
+        int64_t max_samples,
+        int64_t* time_counters_out,
+        uint64_t* counts_out)
@@ -4,55 +4,44 @@ from cython.cimports import _lib as _lib
 from cython.cimports.libcpp import bool as cbool
 from typing import List, Tuple
 from cython.cimports.libc.stdint import uint32_t as u32
-from numpy import ndarray, zeros, uint8, float64, array, int64
+from cython.cimports.libc.stdint import int64_t as i64
+from cython.cimports.libc.stdint import uint64_t as u64
+from cython.cimports.libc.string import memcpy
+from ._aio import device_executor, run_blocking, read_tags_copy, stream_tags
+from ._telemetry import Telemetry
+from ._calibration import CalibrationCache, warn_calibration_reused
+from ._config import DeviceConfig, channel_mask, MAX_DELAY_BINS
+from ._config import config_changes, apply_changes
+from ._parallel import pattern_from_channels as pattern_from_channels
+from ._parallel import UQD_ERROR_FLAG as UQD_ERROR_FLAG
+from numpy import (
+    ndarray,
+    zeros,
+    empty,
+    ascontiguousarray,
+    rint,
+    uint8,
+    uint64,
+    intc,
+    float64,
+    array,
+    int64,
+    arange,
+)
 
 from cython.cimports.numpy import (
     PyArray_SimpleNewFromData,
+    set_array_base,
     npy_intp,
     NPY_UINT8,
+    NPY_INT64,
     NPY_UINT64,
 )
 
 # from cython.cimports import _tangy
 
-
-UQD_ERROR_FLAG = {
-    1: (
-        'DataOverflow',
-        'An overflow in the 512 k values SRAM FIFO has been detected. \
-        The time-tag generation rate is higher than the USB transmission rate.',
-    ),
-    2: ('NegFifoOverflow', 'Internal reason, should never occur'),
-    4: ('PosFifoOverflow', 'Internal reason, should never occur'),
-    8: (
-        'DoubleError',
-        'One input had two pulses within the coincidence window.',
-    ),
-    16: (
-        'InputFifoOverflow',
-        'More than 1024 successive tags were detected with a rate greater 100 MHz',
-    ),
-    32: (
-        '10MHzHardError',
-        'The 10 MHz input is not connected or connected to a wrong type of signal.',
-    ),
-    64: (
-        '10MHzSoftError',
-        'The 10 MHz input is connected, but the frequency is not 10 MHz.',
-    ),
-    128: ('OutFifoOverflow', 'Internal error, should never occur'),
-    256: (
-        'OutDoublePulse',
-        'An output pulse was generated, while another pulse was still present \
-        on the same output. The pulse length is too long for the given rate.',
-    ),
-    512: (
-        'OutTooLate',
-        'The internal processing was too slow. This is because the output \
-        event queue is too small for the given rate. Increase the value with \
-        SetOutputEventQueue()',
-    ),
-}
+# Period of the logic mode time counter in seconds
+TIME_COUNTER_PERIOD = 5e-9
 
 
 @cython.ccall
@@ -81,6 +70,16 @@ class UQDLogic16:
         ``sudo udevadm control --reload-rules && udevadm trigger`` to update the \
         current device rules.
 
+    Args:
+        device_id (int): id of the device to open
+        calibrate (bool): calibrate the device after opening it
+        calibration_cache (CalibrationCache | bool, optional): skip the
+            calibration while the cache holds a valid one for this device,
+            True for a cache in the default location. The vendor API has no
+            call to load a calibration into the device, so this relies on
+            the vendor library applying its calibration file when the
+            device is opened. That has not been verified on hardware, so
+            every reuse raises a ``RuntimeWarning``
     """
 
     _c_timetag: _lib.CTimeTag_ptr
@@ -90,6 +89,8 @@ class UQDLogic16:
 
     _device_id: cython.int
     _number_of_channels: cython.int
+    _resolution: cython.double
+    _fpga_version: cython.int
     _led_brightness: cython.int
     _filter_min_count: cython.int
     _filter_max_time: cython.double
@@ -101,19 +102,34 @@ class UQDLogic16:
     _function_generator_period: int
     _function_generator_high: int
     _exclusion: ndarray(uint8)
-    _10MHz: cbool = False
+    _inversion_mask: cython.int
+    _exclusion_mask: cython.int
+    _level_gate: cbool
+    _config_known: cbool
+    _10MHz: cbool
     _time_gate: cbool = False
     _gate_width: int
+    _pending_offset: cython.longlong
+    _pending_count: cython.longlong
+    _executor: object
+    _telemetry: object
+    _poll_errors: cbool
+    _calibration_reused: cbool
 
     def __init__(
         self,
         device_id: int = 1,
         calibrate: bool = True,
+        calibration_cache=None,
     ):
         if device_id < 1:
             raise ValueError('device_id must be >= 1')
 
         self._c_timetag = _lib.CTimeTag_create()
+        self._executor = None
+        self._telemetry = None
+        self._poll_errors = False
+        self._calibration_reused = False
 
         if self.is_open() is True:
             raise ResourceWarning(f'Device with id={device_id} in use')
@@ -121,13 +137,36 @@ class UQDLogic16:
         self._device_id = device_id
         # self._c_timetag.Open(device_id)
         _lib.CTimeTag_open(self._c_timetag, device_id)
-        self._input_thresholds = zeros(self.number_of_channels, dtype=float64)
-        self._inversion = zeros(self.number_of_channels, dtype=uint8)
-        self._input_delay = zeros(self.number_of_channels, dtype=float64)
-        self._exclusion = zeros(self.number_of_channels, dtype=uint8)
-
+        # Fixed by the loaded firmware, so read once instead of on every use
+        self._number_of_channels = _lib.CTimeTag_getNoInputs(self._c_timetag)
+        self._resolution = _lib.CTimeTag_getResolution(self._c_timetag)
+        self._fpga_version = _lib.CTimeTag_getFpgaVersion(self._c_timetag)
+
+        self._input_thresholds = zeros(self._number_of_channels, dtype=float64)
+        self._inversion = zeros(self._number_of_channels, dtype=uint8)
+        self._input_delay = zeros(self._number_of_channels, dtype=float64)
+        self._exclusion = zeros(self._number_of_channels, dtype=uint8)
+        self._inversion_mask = 0
+        self._exclusion_mask = 0
+        self._led_brightness = 0
+        self._filter_min_count = 1
+        self._filter_max_time = 0.0
+        self._level_gate = False
+        self._10MHz = False
+        self._config_known = False
+
+        if calibration_cache is True:
+            calibration_cache = CalibrationCache()
         if calibrate is True:
-            self.calibrate()
+            if (calibration_cache is not None) and calibration_cache.is_valid(
+                device_id, self.identity
+            ):
+                self._calibration_reused = True
+                warn_calibration_reused(calibration_cache, device_id)
+            else:
+                self.calibrate()
+                if calibration_cache is not None:
+                    calibration_cache.store(device_id, self.identity)
 
         return
 
@@ -147,7 +186,96 @@ class UQDLogic16:
         _lib.CTimeTag_destroy(self._c_timetag)
 
     def calibrate(self):
-        _lib.CTimeTag_calibrate(self._c_timetag)
+        telemetry = self._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
+        with cython.nogil:
+            _lib.CTimeTag_calibrate(self._c_timetag)
+        if telemetry is not None:
+            telemetry.record_call('calibrate', time.perf_counter_ns() - start)
+
+    @cython.cfunc
+    def _call_start(self) -> cython.longlong:
+        # Start time of a library call, 0 when telemetry is off
+        if self._telemetry is None:
+            return 0
+        return time.perf_counter_ns()
+
+    @cython.cfunc
+    def _call_end(self, name: str, start: cython.longlong):
+        # Record a library call timed from _call_start
+        if (self._telemetry is not None) and (start != 0):
+            self._telemetry.record_call(name, time.perf_counter_ns() - start)
+
+    @property
+    def telemetry(self):
+        """
+        Telemetry being recorded for this device
+
+        Returns:
+            (Telemetry | None): None unless :meth:`enable_telemetry` was called
+        """
+        return self._telemetry
+
+    def enable_telemetry(self, poll_errors: bool = True) -> Telemetry:
+        """
+        Start recording call latencies, read statistics and error flags
+
+        Telemetry is off by default, the instrumented calls then cost a
+        single check. It is shared with any :class:`LogicMode` of the device.
+
+        Args:
+            poll_errors (bool): read the error flags after every tag read
+
+        Returns:
+            (Telemetry): the telemetry, also available as :attr:`telemetry`
+        """
+        if self._telemetry is None:
+            self._telemetry = Telemetry({
+                bit: name for bit, (name, _) in UQD_ERROR_FLAG.items()
+            })
+        self._poll_errors = poll_errors
+        return self._telemetry
+
+    def disable_telemetry(self):
+        """
+        Stop recording telemetry and discard what was recorded
+        """
+        self._telemetry = None
+        self._poll_errors = False
+
+    def read_error_flags(self) -> int:
+        """
+        Read the error flags of the device
+
+        Decode them with ``error_from_bit_set`` or ``UQD_ERROR_FLAG``.
+
+        Returns:
+            (int): error bit set, zero if no error occurred
+        """
+        telemetry = self._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
+        flags: cython.int
+        with cython.nogil:
+            flags = _lib.CTimeTag_readErrorFlags(self._c_timetag)
+        if telemetry is not None:
+            end: cython.longlong = time.perf_counter_ns()
+            telemetry.record_call('read_error_flags', end - start)
+            telemetry.record_error_flags(flags, end)
+        return flags
+
+    @cython.cfunc
+    def _record_read(
+        self, telemetry, count: cython.int, start: cython.longlong
+    ):
+        end: cython.longlong = time.perf_counter_ns()
+        telemetry.record_call('read_tags', end - start)
+        telemetry.record_read(max(count, 0), start, end)
+        if self._poll_errors:
+            self.read_error_flags()
 
     @property
     def led_brightness(self) -> int:
@@ -172,7 +300,9 @@ class UQDLogic16:
                 'led_brightness must be in an integer between 0 and 100'
             )
 
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_setLedBrightness(self._c_timetag, percent)
+        self._call_end('led_brightness', start)
         self._led_brightness = percent
 
     @property
@@ -183,7 +313,35 @@ class UQDLogic16:
         Returns:
             (int): fpga design version
         """
-        return _lib.CTimeTag_getResolution(self._c_timetag)
+        return self._fpga_version
+
+    @property
+    def identity(self) -> dict:
+        """
+        Values that identify the device and its firmware
+
+        Returns:
+            (dict): ``device_id``, ``fpga_version``, ``number_of_channels``
+            and ``resolution``
+        """
+        return {
+            'device_id': self._device_id,
+            'fpga_version': self.fpga_version,
+            'number_of_channels': self.number_of_channels,
+            'resolution': self.resolution,
+        }
+
+    @property
+    def calibration_reused(self) -> bool:
+        """
+        Whether construction skipped calibrating because the calibration
+        cache was valid, leaving the device with whatever calibration the
+        vendor library applied when opening it
+
+        Returns:
+            (bool): True if the cached calibration was reused
+        """
+        return self._calibration_reused
 
     @property
     def resolution(self) -> float:
@@ -196,8 +354,7 @@ class UQDLogic16:
         Returns:
             (float): resolution
         """
-        res: cython.double = _lib.CTimeTag_getResolution(self._c_timetag)
-        return res
+        return self._resolution
 
     @property
     def number_of_channels(self) -> int:
@@ -209,7 +366,7 @@ class UQDLogic16:
         Returns:
             (int): number of usable input channels
         """
-        return _lib.CTimeTag_getNoInputs(self._c_timetag)
+        return self._number_of_channels
 
     @property
     def input_threshold(self) -> List[float64]:
@@ -235,7 +392,7 @@ class UQDLogic16:
 
         """
 
-        n: int = self.number_of_channels
+        n: int = self._number_of_channels
         channel: int = value[0]
         if (channel < 1) or (channel > n):
             raise ValueError(f'channel must be in range 0 <= channel < {n}')
@@ -245,7 +402,9 @@ class UQDLogic16:
             raise ValueError('abs(voltage) must be <= 2V')
 
         self._input_thresholds[channel - 1] = voltage
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_setInputThreshold(self._c_timetag, channel, voltage)
+        self._call_end('input_threshold', start)
 
     @property
     def inversion(self) -> List[uint8]:
@@ -269,20 +428,18 @@ class UQDLogic16:
         channel: int = invert[0]
         mask: int = invert[1]
 
-        n: int = self.number_of_channels
+        n: int = self._number_of_channels
         if (channel < 0) or (channel >= n):
             raise ValueError(f'channel must be in range 0 <= channel < {n}')
         self._inversion[channel] = mask
 
     @cython.ccall
     def inversion_apply(self):
-        bits = self.inversion
-        # bits.reverse()
-        bit_string = ''
-        for b in bits[::-1]:
-            bit_string += str(b)
-        mask: cython.int = int(bit_string, 2)
+        mask: cython.int = channel_mask(self._inversion)
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_setInversionMask(self._c_timetag, mask)
+        self._call_end('inversion_apply', start)
+        self._inversion_mask = mask
 
     @property
     def input_delay(self) -> float64:
@@ -303,20 +460,22 @@ class UQDLogic16:
             value (Tuple[int, float64]): Tuple of (channel, delay)
         """
 
-        n: int = self.number_of_channels
+        n: int = self._number_of_channels
         channel: int = value[0]
         if (channel < 0) or (channel >= n):
             raise ValueError(f'channel must be in range 0 <= channel < {n}')
 
-        max_delay: float = ((2**18) - 1) * self.resolution
-        delay: int = value[0] // self.resolution
-        if (delay < 0) or (delay > max_delay):
+        max_delay: float = MAX_DELAY_BINS * self._resolution
+        delay: int = int(rint(value[1] / self._resolution))
+        if (delay < 0) or (delay > MAX_DELAY_BINS):
             raise ValueError(
                 f'Delay is out of range, must be >= 0 or < {max_delay}s'
             )
 
-        self._input_delay[channel] = delay
-        _lib.CTimeTag_setDelay(self._c_timetag, channel, delay)
+        self._input_delay[channel] = delay * self._resolution
+        start: cython.longlong = self._call_start()
+        _lib.CTimeTag_setDelay(self._c_timetag, channel + 1, delay)
+        self._call_end('input_delay', start)
 
     @property
     def external_10MHz_reference(self) -> bool:
@@ -331,46 +490,66 @@ class UQDLogic16:
         else:
             use = False
 
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_use10MHz(self._c_timetag, use)
-        self._external_10MHz_reference = value
+        self._call_end('external_10MHz_reference', start)
+        self._10MHz = use
 
     def start_timetags(self):
         """
         Start transmitting timetags from the device to the host computer
         """
 
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_startTimetags(self._c_timetag)
+        self._call_end('start_timetags', start)
 
     def stop_timetags(self):
         """
         Stop transmitting timetags from the device to the host computer
         """
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_stopTimetags(self._c_timetag)
+        self._call_end('stop_timetags', start)
 
     @cython.ccall
     def read_tags(self) -> Tuple[int, ndarray, ndarray]:
         """
         Read tags from the device and return them as NumPy arrays
 
+        NOTE:
+            The returned arrays are views of the library's internal buffer
+            and are overwritten by the next read, use :meth:`read_tags_into`
+            or a :class:`TagBufferPool` to keep tags in memory you own.
+
         Returns:
             Tuple[ndarray, ndarray]: (channels, timestamps) arrays
         """
-        # Initialize pointers to NULL
-        # channels = cython.declare(cython.pointer(_lib.c_ChannelType))
-        # timestamps = cython.declare(cython.pointer(_lib.c_TimeType))
+        # Any batch partially copied by read_tags_into is lost on this read
+        self._pending_offset = 0
+        self._pending_count = 0
+
+        telemetry = self._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
 
         # Call ReadTags, which will update our pointers
-        count: int = _lib.CTimeTag_readTags(
-            self._c_timetag,
-            cython.address(self._channel_ptr),
-            cython.address(self._timetag_ptr),
-        )
+        count: cython.int
+        with cython.nogil:
+            count = _lib.CTimeTag_readTags(
+                self._c_timetag,
+                cython.address(self._channel_ptr),
+                cython.address(self._timetag_ptr),
+            )
+        if telemetry is not None:
+            self._record_read(telemetry, count, start)
 
         if count <= 0:
             return 0, array([], dtype=uint8), array([], dtype=int64)
 
         # Create dimensions array for NumPy array creation
-        dims = cython.declare(cython.pointer(npy_intp))
+        dims: npy_intp[1]
         dims[0] = count
 
         # Create NumPy arrays from the data pointers
@@ -388,16 +567,133 @@ class UQDLogic16:
             cython.cast(cython.pointer(cython.void), self._timetag_ptr),
         )
 
-        # print(channel_array, time_array)
-
-        # Convert to NumPy arrays - use copy=True for safety
-        # return (
-        #     count,
-        #     array(channel_array, copy=True),
-        #     array(time_array, copy=True),
-        # )
         return (count, channel_array, time_array)
 
+    @cython.ccall
+    def read_tags_into(
+        self,
+        channels_out: cython.uchar[::1],
+        timestamps_out: cython.longlong[::1],
+    ) -> cython.longlong:
+        """
+        Read tags from the device into caller owned arrays
+
+        Each tag is copied exactly once, from the library's buffer into the
+        start of ``channels_out`` and ``timestamps_out``. If a batch is
+        larger than the arrays the remainder is kept back and returned by
+        the following calls before the device is read again, see
+        :attr:`pending_tags`.
+
+        Args:
+            channels_out (ndarray): uint8 array to receive channels
+            timestamps_out (ndarray): int64 array to receive timestamps
+
+        Returns:
+            (int): number of tags written to the arrays
+        """
+        space: cython.longlong = min(
+            channels_out.shape[0], timestamps_out.shape[0]
+        )
+        if space <= 0:
+            return 0
+
+        count: cython.int
+        start: cython.longlong = 0
+        if self._pending_count <= 0:
+            telemetry = self._telemetry
+            if telemetry is not None:
+                start = time.perf_counter_ns()
+            with cython.nogil:
+                count = _lib.CTimeTag_readTags(
+                    self._c_timetag,
+                    cython.address(self._channel_ptr),
+                    cython.address(self._timetag_ptr),
+                )
+            if telemetry is not None:
+                self._record_read(telemetry, count, start)
+            if count <= 0:
+                return 0
+            self._pending_offset = 0
+            self._pending_count = count
+
+        n: cython.longlong = min(space, self._pending_count)
+        memcpy(
+            cython.address(channels_out[0]),
+            self._channel_ptr + self._pending_offset,
+            n * cython.sizeof(_lib.c_ChannelType),
+        )
+        memcpy(
+            cython.address(timestamps_out[0]),
+            self._timetag_ptr + self._pending_offset,
+            n * cython.sizeof(_lib.c_TimeType),
+        )
+        self._pending_offset += n
+        self._pending_count -= n
+
+        return n
+
+    @property
+    def pending_tags(self) -> int:
+        """
+        Tags from the last batch not yet copied by :meth:`read_tags_into`
+
+        Returns:
+            (int): number of tags held back
+        """
+        return self._pending_count
+
+    @property
+    def executor(self):
+        """
+        Executor that runs the device's blocking calls for the async methods
+
+        It has a single worker so calls made through it never overlap, other
+        blocking calls can be submitted to it to keep them in order with the
+        acquisition.
+
+        Returns:
+            (ThreadPoolExecutor): executor of this device
+        """
+        if self._executor is None:
+            self._executor = device_executor()
+        return self._executor
+
+    async def acalibrate(self):
+        """
+        Awaitable :meth:`calibrate`, run on the device's executor
+        """
+        await run_blocking(self.executor, self.calibrate)
+
+    async def aread_tags(self) -> Tuple[int, ndarray, ndarray]:
+        """
+        Awaitable :meth:`read_tags`, run on the device's executor
+
+        Unlike :meth:`read_tags` the arrays are copies owned by the caller,
+        the library's buffer may be refilled by another read before the
+        awaiting task resumes.
+
+        Returns:
+            Tuple[int, ndarray, ndarray]: (count, channels, timestamps)
+        """
+        return await run_blocking(self.executor, read_tags_copy, self)
+
+    def stream(self, poll_interval: float = 1e-3):
+        """
+        Asynchronously iterate over the batches read from the device
+
+        ``async for channels, timestamps in uqd.stream()`` reads on the
+        device's executor, empty reads are skipped and followed by a sleep of
+        ``poll_interval`` on the event loop.
+
+        Args:
+            poll_interval (float): time to wait after an empty read in seconds
+
+        Returns:
+            (AsyncIterator[Tuple[ndarray, ndarray]]): (channels, timestamps)
+            owned copies with int64 timestamps
+        """
+        return stream_tags(self, poll_interval)
+
     @property
     def filter_min_count(self) -> int:
         """
@@ -416,10 +712,12 @@ class UQDLogic16:
         Args:
             count (int): size of group
         """
-        if (count < 1) and (count > 10):
+        if (count < 1) or (count > 10):
             raise ValueError('Count filter must be between 1 and 10')
         self._filter_min_count = count
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_setFilterMinCount(self._c_timetag, count)
+        self._call_end('filter_min_count', start)
 
     @property
     def filter_max_time(self) -> cython.double:
@@ -439,9 +737,11 @@ class UQDLogic16:
         Args:
             time (float): maximum time between two pulses in the same group
         """
-        bins: int = max_time // self.resolution
-        self._filter_max_time = time
+        bins: int = int(max_time // self._resolution)
+        self._filter_max_time = max_time
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_setFilterMaxTime(self._c_timetag, bins)
+        self._call_end('filter_max_time', start)
 
     @property
     def exclusion(self) -> List[uint8]:
@@ -450,36 +750,28 @@ class UQDLogic16:
 
     @exclusion.setter
     def exclusion(self, value: Tuple[int, int]):
-        n: int = self.number_of_channels
+        n: int = self._number_of_channels
         channel: int = value[0]
         mask: int = value[1]
         if (channel < 0) or (channel >= n):
             raise ValueError(f'channel must be in range 0 <= channel < {n}')
-        _lib.CTimeTag_setFilterException(self._c_timetag, channel)
         self._exclusion[channel] = mask
 
     @cython.ccall
     def exclusion_apply(self):
-        bits = self.exclusion
-        if sum(bits) == 0:
-            _lib.CTimeTag_setInversionMask(self._c_timetag, 0)
-            return
-
-        if sum(bits) == self.number_of_channels:
-            _lib.CTimeTag_setInversionMask(self._c_timetag, 0)
-            return
-
-        # bits.reverse()
-        bit_string = ''
-        for b in bits[::-1]:
-            bit_string += str(b)
-        mask: cython.int = int(bit_string, 2)
-        _lib.CTimeTag_setInversionMask(self._c_timetag, mask)
+        mask: cython.int = channel_mask(self._exclusion)
+        start: cython.longlong = self._call_start()
+        _lib.CTimeTag_setFilterException(self._c_timetag, mask)
+        self._call_end('exclusion_apply', start)
+        self._exclusion_mask = mask
 
     @property
     def level_gate(self) -> bool:
         """ """
-        return _lib.CTimeTag_levelGateActive(self._c_timetag)
+        start: cython.longlong = self._call_start()
+        active: cbool = _lib.CTimeTag_levelGateActive(self._c_timetag)
+        self._call_end('level_gate_active', start)
+        return active
 
     @level_gate.setter
     def level_gate(self, value: bool):
@@ -489,7 +781,107 @@ class UQDLogic16:
         else:
             use = False
 
+        start: cython.longlong = self._call_start()
         _lib.CTimeTag_useLevelGate(self._c_timetag, use)
+        self._call_end('level_gate', start)
+        self._level_gate = use
+
+    @property
+    def config(self) -> DeviceConfig:
+        """
+        Snapshot of the input configuration
+
+        Inversion and exclusion are given as last set, whether or not
+        ``inversion_apply``/``exclusion_apply`` has been called since.
+
+        Returns:
+            (DeviceConfig): copy of the current settings
+        """
+        return DeviceConfig(
+            self._number_of_channels,
+            self._input_thresholds,
+            self._input_delay,
+            self._inversion,
+            self._exclusion,
+            self._filter_min_count,
+            self._filter_max_time,
+            self._led_brightness,
+            self._10MHz,
+            self._level_gate,
+        )
+
+    def _applied_config(self):
+        # Settings as the device has them, None until a whole configuration
+        # has been written
+        if not self._config_known:
+            return None
+        config = self.config
+        config.inversion[:] = (
+            self._inversion_mask >> arange(self._number_of_channels)
+        ) & 1
+        config.exclusion[:] = (
+            self._exclusion_mask >> arange(self._number_of_channels)
+        ) & 1
+        return config
+
+    def apply_config(self, config: DeviceConfig, force: bool = False) -> int:
+        """
+        Write a whole input configuration
+
+        Only the registers that differ from the configuration last written
+        are sent, the first call after opening the device, or any call with
+        ``force``, writes every register.
+
+        Args:
+            config (DeviceConfig): configuration to write
+            force (bool): write every register
+
+        Returns:
+            (int): number of registers written
+        """
+        changes = config_changes(self, config, self._applied_config(), force)
+        thresholds: cython.double[::1] = ascontiguousarray(
+            config.input_threshold, dtype=float64
+        )
+        delays: cython.longlong[::1] = config.delay_bins(self._resolution)
+        threshold_channels: cython.longlong[::1] = changes['input_threshold']
+        delay_channels: cython.longlong[::1] = changes['input_delay']
+        start: cython.longlong = self._call_start()
+        with cython.nogil:
+            _write_channels(
+                self._c_timetag,
+                thresholds,
+                delays,
+                threshold_channels,
+                delay_channels,
+            )
+        self._call_end('write_channels', start)
+        writes: int = apply_changes(self, config, changes)
+        self._config_known = True
+        return writes
+
+
+@cython.cfunc
+@cython.nogil
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _write_channels(
+    timetag: _lib.CTimeTag_ptr,
+    thresholds: cython.const[cython.double][::1],
+    delays: cython.const[cython.longlong][::1],
+    threshold_channels: cython.const[cython.longlong][::1],
+    delay_channels: cython.const[cython.longlong][::1],
+) -> cython.void:
+    # The library numbers inputs from 1
+    i: cython.Py_ssize_t
+    c: cython.longlong
+    for i in range(threshold_channels.shape[0]):
+        c = threshold_channels[i]
+        _lib.CTimeTag_setInputThreshold(timetag, c + 1, thresholds[c])
+    for i in range(delay_channels.shape[0]):
+        c = delay_channels[i]
+        _lib.CTimeTag_setDelay(timetag, c + 1, delays[c])
 
 
 @cython.cclass
@@ -505,60 +897,892 @@ class LogicMode:
         return
 
     def switch_logic_mode(self):
+        start: cython.longlong = self._uqd_logic16._call_start()
         _lib.CLogic_switchLogicMode(self._c_logic)
+        self._uqd_logic16._call_end('switch_logic_mode', start)
 
     def set_window_width(self, window: int):
+        start: cython.longlong = self._uqd_logic16._call_start()
         _lib.CLogic_setWindowWidth(self._c_logic, window)
+        self._uqd_logic16._call_end('set_window_width', start)
 
     def set_window_width_ex(self, index: int, window: int):
+        start: cython.longlong = self._uqd_logic16._call_start()
         _lib.CLogic_setWindowWidthEx(self._c_logic, index, window)
+        self._uqd_logic16._call_end('set_window_width_ex', start)
 
     def set_delay(self, channel: int, delay: int):
+        start: cython.longlong = self._uqd_logic16._call_start()
         _lib.CLogic_setDelay(self._c_logic, channel, delay)
+        self._uqd_logic16._call_end('set_delay', start)
 
     def read_logic(self):
-        result: int = _lib.CLogic_readLogic(self._c_logic)
+        telemetry = self._uqd_logic16._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
+        result: cython.longlong
+        with cython.nogil:
+            result = _lib.CLogic_readLogic(self._c_logic)
+        if telemetry is not None:
+            telemetry.record_call('read_logic', time.perf_counter_ns() - start)
         return result
 
     def calc_count_pos(self, pattern: int):
+        telemetry = self._uqd_logic16._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
         result: int = _lib.CLogic_calcCountPos(self._c_logic, pattern)
+        if telemetry is not None:
+            telemetry.record_call(
+                'calc_count_pos', time.perf_counter_ns() - start
+            )
         return result
 
     def calc_count(self, positive: int, negative: int):
+        telemetry = self._uqd_logic16._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
         result: int = _lib.CLogic_calcCount(self._c_logic, positive, negative)
+        if telemetry is not None:
+            telemetry.record_call('calc_count', time.perf_counter_ns() - start)
         return result
 
     def get_time_counter(self):
+        start: cython.longlong = self._uqd_logic16._call_start()
         result: int = _lib.CLogic_getTimeCounter(self._c_logic)
+        self._uqd_logic16._call_end('get_time_counter', start)
         return result
 
+    @cython.ccall
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def calc_counts(self, patterns, out=None) -> ndarray:
+        """
+        Evaluate ``calc_count_pos`` for many patterns in one native loop
+
+        Args:
+            patterns (ndarray): patterns, as from ``pattern_from_channels``
+            out (ndarray, optional): uint64 array to write the counts to
+
+        Returns:
+            (ndarray): uint64 count for each pattern
+        """
+        pattern_array = ascontiguousarray(patterns, dtype=int64)
+        pattern_view: cython.longlong[::1] = pattern_array
+        n: cython.Py_ssize_t = pattern_view.shape[0]
+        if out is None:
+            out = empty(n, dtype=uint64)
+        count_view: cython.ulonglong[::1] = out
+        if count_view.shape[0] < n:
+            raise ValueError('out must be at least as long as patterns')
+
+        telemetry = self._uqd_logic16._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
+
+        i: cython.Py_ssize_t
+        with cython.nogil:
+            for i in range(n):
+                count_view[i] = _lib.CLogic_calcCountPos(
+                    self._c_logic, pattern_view[i]
+                )
+        if telemetry is not None:
+            telemetry.record_call('calc_counts', time.perf_counter_ns() - start)
+        return out
+
+    @cython.ccall
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def calc_counts_pn(self, positive, negative, out=None) -> ndarray:
+        """
+        Evaluate ``calc_count`` for many pattern pairs in one native loop
+
+        Args:
+            positive (ndarray): channels that must be present, per count
+            negative (ndarray): channels that must be absent, per count
+            out (ndarray, optional): uint64 array to write the counts to
+
+        Returns:
+            (ndarray): uint64 count for each pair of patterns
+        """
+        positive_array = ascontiguousarray(positive, dtype=int64)
+        negative_array = ascontiguousarray(negative, dtype=int64)
+        positive_view: cython.longlong[::1] = positive_array
+        negative_view: cython.longlong[::1] = negative_array
+        n: cython.Py_ssize_t = positive_view.shape[0]
+        if negative_view.shape[0] != n:
+            raise ValueError('positive and negative must be the same length')
+        if out is None:
+            out = empty(n, dtype=uint64)
+        count_view: cython.ulonglong[::1] = out
+        if count_view.shape[0] < n:
+            raise ValueError('out must be at least as long as positive')
+
+        telemetry = self._uqd_logic16._telemetry
+        start: cython.longlong = 0
+        if telemetry is not None:
+            start = time.perf_counter_ns()
+
+        i: cython.Py_ssize_t
+        with cython.nogil:
+            for i in range(n):
+                count_view[i] = _lib.CLogic_calcCount(
+                    self._c_logic, positive_view[i], negative_view[i]
+                )
+        if telemetry is not None:
+            telemetry.record_call(
+                'calc_counts_pn', time.perf_counter_ns() - start
+            )
+        return out
+
+    def read_counts(self, patterns, out=None) -> Tuple[int, ndarray]:
+        """
+        Read the logic counters and evaluate many patterns at once
+
+        Equivalent to ``read_logic`` followed by ``get_time_counter`` and
+        :meth:`calc_counts`.
+
+        Args:
+            patterns (ndarray): patterns, as from ``pattern_from_channels``
+            out (ndarray, optional): uint64 array to write the counts to
+
+        Returns:
+            Tuple[int, ndarray]: (time counter, counts)
+        """
+        self.read_logic()
+        time_counter: cython.longlong = _lib.CLogic_getTimeCounter(
+            self._c_logic
+        )
+        return time_counter, self.calc_counts(patterns, out)
+
+    async def aread_logic(self) -> int:
+        """
+        Awaitable :meth:`read_logic`, run on the device's executor
+
+        Returns:
+            (int): result of ``read_logic``
+        """
+        return await run_blocking(self._uqd_logic16.executor, self.read_logic)
+
+    async def aread_counts(self, patterns, out=None) -> Tuple[int, ndarray]:
+        """
+        Awaitable :meth:`read_counts`, run on the device's executor
+
+        Args:
+            patterns (ndarray): patterns, as from ``pattern_from_channels``
+            out (ndarray, optional): uint64 array to write the counts to
+
+        Returns:
+            Tuple[int, ndarray]: (time counter, counts)
+        """
+        return await run_blocking(
+            self._uqd_logic16.executor, self.read_counts, patterns, out
+        )
+
     def set_output_width(self, width: int):
+        start: cython.longlong = self._uqd_logic16._call_start()
         _lib.CLogic_setOutputWidth(self._c_logic, width)
+        self._uqd_logic16._call_end('set_output_width', start)
 
     def set_output_pattern(self, output: int, positive: int, negative: int):
+        start: cython.longlong = self._uqd_logic16._call_start()
         _lib.CLogic_setOutputPattern(self._c_logic, output, positive, negative)
+        self._uqd_logic16._call_end('set_output_pattern', start)
 
     def set_output_event_count(self, events: int):
+        start: cython.longlong = self._uqd_logic16._call_start()
         _lib.CLogic_setOutputEventCount(self._c_logic, events)
+        self._uqd_logic16._call_end('set_output_event_count', start)
 
 
-@cython.ccall
-def pattern_from_channels(input_channels: List[int]) -> int:
+@cython.cclass
+class TagStream:
+    """
+    Acquire timetags on a native background thread.
+
+    The thread repeatedly calls ``CTimeTag_readTags`` without holding the GIL
+    and copies every batch into a preallocated ring of channels and
+    timestamps. Python consumes the ring whenever it is ready, either as
+    zero-copy views with :meth:`peek` and :meth:`release` or as copies with
+    :meth:`read`. The poll interval adapts to the observed tag rate so that
+    each read collects roughly an eighth of the ring.
+
+    Tags that arrive while the ring is full are discarded and counted in
+    :attr:`dropped_tags`, device error flags are accumulated and can be
+    collected with :meth:`error_flags`.
+
+    NOTE:
+        While the stream is running it owns the device's tag buffer, do not
+        call :meth:`UQDLogic16.read_tags` at the same time.
+
+    Args:
+        uqd_logic16 (UQDLogic16): device to read from
+        capacity (int): number of tags the ring can hold
+        min_poll (float): shortest interval between reads in seconds
+        max_poll (float): longest interval between reads in seconds
+    """
+
+    _uqd_logic16: UQDLogic16
+    _c_stream: _lib.TagStream_ptr
+
+    def __init__(
+        self,
+        uqd_logic16: UQDLogic16,
+        capacity: int = 2**22,
+        min_poll: float = 50e-6,
+        max_poll: float = 10e-3,
+    ):
+        if capacity < 1:
+            raise ValueError('capacity must be >= 1')
+
+        min_poll_us: int = max(1, int(min_poll * 1e6))
+        max_poll_us: int = int(max_poll * 1e6)
+        if max_poll_us < min_poll_us:
+            raise ValueError('max_poll must be >= min_poll')
+
+        self._uqd_logic16 = uqd_logic16
+        self._c_stream = _lib.TagStream_create(
+            self._uqd_logic16._c_timetag, capacity, min_poll_us, max_poll_us
+        )
+        return
+
+    def __dealloc__(self):
+        if self._c_stream != cython.NULL:
+            with cython.nogil:
+                _lib.TagStream_destroy(self._c_stream)
+            self._c_stream = cython.NULL
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Start transmitting timetags and launch the acquisition thread
+        """
+        start: cython.longlong = self._uqd_logic16._call_start()
+        _lib.CTimeTag_startTimetags(self._uqd_logic16._c_timetag)
+        self._uqd_logic16._call_end('start_timetags', start)
+        _lib.TagStream_start(self._c_stream)
+
+    def stop(self):
+        """
+        Stop the acquisition thread and stop transmitting timetags
+
+        Tags already in the ring remain available for reading.
+        """
+        with cython.nogil:
+            _lib.TagStream_stop(self._c_stream)
+        start: cython.longlong = self._uqd_logic16._call_start()
+        _lib.CTimeTag_stopTimetags(self._uqd_logic16._c_timetag)
+        self._uqd_logic16._call_end('stop_timetags', start)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Whether the acquisition thread is running
+
+        Returns:
+            (bool): True while the thread is reading from the device
+        """
+        return _lib.TagStream_isRunning(self._c_stream) == 1
+
+    @property
+    def capacity(self) -> int:
+        """
+        Number of tags the ring can hold
+
+        Returns:
+            (int): ring capacity in tags
+        """
+        return _lib.TagStream_capacity(self._c_stream)
+
+    @property
+    def available(self) -> int:
+        """
+        Number of tags waiting to be consumed
+
+        Returns:
+            (int): unread tags in the ring
+        """
+        return _lib.TagStream_available(self._c_stream)
+
+    @property
+    def total_tags(self) -> int:
+        """
+        Number of tags written to the ring since the stream was created
+
+        Returns:
+            (int): total tags stored
+        """
+        return _lib.TagStream_totalTags(self._c_stream)
+
+    @property
+    def dropped_tags(self) -> int:
+        """
+        Number of tags discarded because the ring was full
+
+        Returns:
+            (int): total tags dropped
+        """
+        return _lib.TagStream_droppedTags(self._c_stream)
+
+    @property
+    def batches(self) -> int:
+        """
+        Number of non-empty reads made by the acquisition thread
+
+        Returns:
+            (int): total batches read
+        """
+        return _lib.TagStream_batches(self._c_stream)
+
+    @property
+    def poll_interval(self) -> float:
+        """
+        Current interval between reads chosen by the acquisition thread
+
+        Returns:
+            (float): poll interval in seconds
+        """
+        return _lib.TagStream_pollInterval(self._c_stream) * 1e-6
+
+    def error_flags(self) -> int:
+        """
+        Error flags reported by the device since the last call
+
+        The flags are cleared on reading, decode them with
+        ``error_from_bit_set`` or ``UQD_ERROR_FLAG``.
+
+        Returns:
+            (int): accumulated error bit set
+        """
+        return _lib.TagStream_takeErrorFlags(self._c_stream)
+
+    @cython.ccall
+    def peek(
+        self, max_tags: cython.longlong = 0
+    ) -> Tuple[int, ndarray, ndarray]:
+        """
+        View the oldest unread tags without copying
+
+        Only the contiguous part of the ring is returned, once it has been
+        released the remainder is returned by the next call. The views stay
+        valid until :meth:`release` is called for them.
+
+        Args:
+            max_tags (int): upper limit on the number of tags, 0 for no limit
+
+        Returns:
+            Tuple[int, ndarray, ndarray]: (count, channels, timestamps)
+        """
+        channel_ptr: cython.pointer(_lib.c_ChannelType)
+        timetag_ptr: cython.pointer(_lib.c_TimeType)
+        count: cython.longlong = _lib.TagStream_peek(
+            self._c_stream,
+            cython.address(channel_ptr),
+            cython.address(timetag_ptr),
+            max_tags,
+        )
+
+        if count <= 0:
+            return 0, array([], dtype=uint8), array([], dtype=int64)
+
+        dims: npy_intp[1]
+        dims[0] = count
+
+        channel_array = PyArray_SimpleNewFromData(
+            1,
+            dims,
+            NPY_UINT8,
+            cython.cast(cython.pointer(cython.void), channel_ptr),
+        )
+        time_array = PyArray_SimpleNewFromData(
+            1,
+            dims,
+            NPY_INT64,
+            cython.cast(cython.pointer(cython.void), timetag_ptr),
+        )
+
+        # Keep the ring alive for as long as the views are
+        set_array_base(channel_array, self)
+        set_array_base(time_array, self)
+
+        return (count, channel_array, time_array)
+
+    @cython.ccall
+    def release(self, count: cython.longlong):
+        """
+        Mark tags returned by :meth:`peek` as consumed
+
+        Args:
+            count (int): number of tags to hand back to the ring
+        """
+        _lib.TagStream_release(self._c_stream, count)
+
+    @cython.ccall
+    def read(
+        self, max_tags: cython.longlong = 0
+    ) -> Tuple[int, ndarray, ndarray]:
+        """
+        Copy the oldest unread tags out of the ring and release them
+
+        Args:
+            max_tags (int): upper limit on the number of tags, 0 for no limit
+
+        Returns:
+            Tuple[int, ndarray, ndarray]: (count, channels, timestamps)
+        """
+        total: cython.longlong = _lib.TagStream_available(self._c_stream)
+        if (max_tags > 0) and (total > max_tags):
+            total = max_tags
+
+        channels = empty(total, dtype=uint8)
+        timestamps = empty(total, dtype=int64)
+        channel_view: cython.uchar[::1] = channels
+        time_view: cython.longlong[::1] = timestamps
+
+        channel_ptr: cython.pointer(_lib.c_ChannelType)
+        timetag_ptr: cython.pointer(_lib.c_TimeType)
+        filled: cython.longlong = 0
+        count: cython.longlong
+        while filled < total:
+            count = _lib.TagStream_peek(
+                self._c_stream,
+                cython.address(channel_ptr),
+                cython.address(timetag_ptr),
+                total - filled,
+            )
+            if count <= 0:
+                break
+            memcpy(
+                cython.address(channel_view[filled]),
+                channel_ptr,
+                count * cython.sizeof(_lib.c_ChannelType),
+            )
+            memcpy(
+                cython.address(time_view[filled]),
+                timetag_ptr,
+                count * cython.sizeof(_lib.c_TimeType),
+            )
+            _lib.TagStream_release(self._c_stream, count)
+            filled += count
+
+        return (filled, channels[:filled], timestamps[:filled])
+
+
+@cython.cclass
+class TagBatch:
+    """
+    A batch of tags held in a buffer borrowed from a :class:`TagBufferPool`.
+
+    The arrays returned by :attr:`channels` and :attr:`timestamps` are views
+    of the pooled buffers, call :meth:`release` (or leave a ``with`` block)
+    once they are no longer needed so the buffers can be reused.
     """
-    Calculate a bitmask for TCSPC device based on input channels.
+
+    _pool: object
+    _channels: ndarray
+    _timestamps: ndarray
+    count: cython.longlong
+    released: cython.bint
+
+    def __init__(self, pool, batch_size: int):
+        self._pool = pool
+        self._channels = zeros(batch_size, dtype=uint8)
+        self._timestamps = zeros(batch_size, dtype=int64)
+        self.count = 0
+        self.released = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def channels(self) -> ndarray:
+        """
+        Channels of the tags in the batch
+
+        Returns:
+            (ndarray): uint8 view of the pooled buffer
+        """
+        return self._channels[: self.count]
+
+    @property
+    def timestamps(self) -> ndarray:
+        """
+        Timestamps of the tags in the batch
+
+        Returns:
+            (ndarray): int64 view of the pooled buffer
+        """
+        return self._timestamps[: self.count]
+
+    @property
+    def channels_buffer(self) -> ndarray:
+        """
+        Whole channel buffer, for filling the batch directly
+
+        Returns:
+            (ndarray): uint8 buffer of length ``batch_size``
+        """
+        return self._channels
+
+    @property
+    def timestamps_buffer(self) -> ndarray:
+        """
+        Whole timestamp buffer, for filling the batch directly
+
+        Returns:
+            (ndarray): int64 buffer of length ``batch_size``
+        """
+        return self._timestamps
+
+    def release(self):
+        """
+        Return the buffers to the pool they were taken from
+        """
+        if self.released:
+            return
+        self.released = True
+        self.count = 0
+        self._pool._give_back(self)
+
+
+@cython.cclass
+class TagBufferPool:
+    """
+    Fixed set of reusable tag buffers.
+
+    All buffers are allocated up front, reading into the pool copies each
+    batch once into a free buffer and never allocates. Batches must be
+    returned with :meth:`TagBatch.release` before their buffers are handed
+    out again.
 
     Args:
-        input_channels: List of integers representing channel numbers
+        buffers (int): number of batches that can be held at once
+        batch_size (int): maximum number of tags per batch
+    """
+
+    _free: list
+    _batch_size: cython.longlong
+    _buffers: cython.int
+
+    def __init__(self, buffers: int = 8, batch_size: int = 2**20):
+        if buffers < 1:
+            raise ValueError('buffers must be >= 1')
+        if batch_size < 1:
+            raise ValueError('batch_size must be >= 1')
+
+        self._buffers = buffers
+        self._batch_size = batch_size
+        self._free = [TagBatch(self, batch_size) for _ in range(buffers)]
+
+    @property
+    def batch_size(self) -> int:
+        """
+        Maximum number of tags held by each buffer
+
+        Returns:
+            (int): tags per buffer
+        """
+        return self._batch_size
+
+    @property
+    def buffers(self) -> int:
+        """
+        Total number of buffers in the pool
 
-    Returns:
-        Integer representing the pattern (bitmask) where each bit corresponds
-            to an input channel
+        Returns:
+            (int): number of buffers
+        """
+        return self._buffers
+
+    @property
+    def free(self) -> int:
+        """
+        Number of buffers available to :meth:`acquire`
+
+        Returns:
+            (int): free buffers
+        """
+        return len(self._free)
+
+    @cython.ccall
+    def acquire(self) -> TagBatch:
+        """
+        Take an empty batch from the pool
+
+        Raises:
+            BufferError: every buffer is still in use
+
+        Returns:
+            (TagBatch): batch with ``count == 0``
+        """
+        if len(self._free) == 0:
+            raise BufferError(
+                'No free buffers, release batches before reading more'
+            )
+
+        batch: TagBatch = self._free.pop()
+        batch.released = False
+        batch.count = 0
+        return batch
+
+    def _give_back(self, batch: TagBatch):
+        self._free.append(batch)
+
+    @cython.ccall
+    def read(self, uqd_logic16) -> TagBatch:
+        """
+        Read tags from the device into a pooled buffer
+
+        Args:
+            uqd_logic16 (UQDLogic16): device to read from, or anything else
+                with a ``read_tags_into`` method
+
+        Returns:
+            (TagBatch): batch holding the tags read, may be empty
+        """
+        batch: TagBatch = self.acquire()
+        batch.count = uqd_logic16.read_tags_into(
+            batch._channels, batch._timestamps
+        )
+        return batch
+
+
+@cython.cclass
+class LogicSampler:
+    """
+    Record the logic counters at a fixed interval on a native thread.
+
+    Every ``interval`` the thread calls ``read_logic``, stores the time
+    counter and ``calc_count_pos`` of each configured pattern as one row of a
+    preallocated ring of ``capacity`` samples, and sleeps until the next
+    deadline. Sampling never touches the GIL, so the cadence is unaffected by
+    the Python program and rates of 1 kHz and above can be kept up for long
+    monitoring runs. Once the ring is full the oldest samples are overwritten.
+
+    NOTE:
+        While the sampler is running it owns the logic counters, do not call
+        :meth:`LogicMode.read_logic` at the same time.
+
+    Args:
+        logic_mode (LogicMode): logic mode of the device to sample
+        patterns (Sequence[int]): patterns to record, as from
+            ``pattern_from_channels``
+        interval (float): time between samples in seconds
+        capacity (int): number of samples the ring can hold
     """
-    pattern = 0
 
-    for channel in input_channels:
-        # Set the bit at position (channel-1)
-        # For example: channel 1 sets bit 0, channel 2 sets bit 1, etc.
-        pattern |= 1 << (channel - 1)
+    _logic_mode: LogicMode
+    _c_sampler: _lib.LogicSampler_ptr
+    _patterns: ndarray
+    _time_counters: ndarray
+    _counts: ndarray
+    _interval: cython.double
+    _capacity: cython.longlong
+
+    def __init__(
+        self,
+        logic_mode: LogicMode,
+        patterns,
+        interval: float = 1e-3,
+        capacity: int = 2**16,
+    ):
+        # One slot is kept free for the sample being written
+        if capacity < 2:
+            raise ValueError('capacity must be >= 2')
+        interval_us: int = int(round(interval * 1e6))
+        if interval_us < 1:
+            raise ValueError('interval must be at least 1 us')
+
+        self._patterns = ascontiguousarray(patterns, dtype=intc).reshape(-1)
+        n: cython.Py_ssize_t = self._patterns.shape[0]
+        if n == 0:
+            raise ValueError('At least one pattern is required')
+
+        self._logic_mode = logic_mode
+        self._interval = interval_us * 1e-6
+        self._capacity = capacity
+        self._time_counters = zeros(capacity, dtype=int64)
+        self._counts = zeros((capacity, n), dtype=uint64)
+
+        pattern_view: cython.int[::1] = self._patterns
+        time_view: cython.longlong[::1] = self._time_counters
+        count_view: cython.ulonglong[:, ::1] = self._counts
+        self._c_sampler = _lib.LogicSampler_create(
+            self._logic_mode._c_logic,
+            cython.address(pattern_view[0]),
+            n,
+            capacity,
+            interval_us,
+            cython.cast(cython.pointer(i64), cython.address(time_view[0])),
+            cython.cast(cython.pointer(u64), cython.address(count_view[0, 0])),
+        )
+        return
+
+    def __dealloc__(self):
+        if self._c_sampler != cython.NULL:
+            with cython.nogil:
+                _lib.LogicSampler_destroy(self._c_sampler)
+            self._c_sampler = cython.NULL
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Launch the sampling thread
+        """
+        _lib.LogicSampler_start(self._c_sampler)
+
+    def stop(self):
+        """
+        Stop the sampling thread, recorded samples remain available
+        """
+        with cython.nogil:
+            _lib.LogicSampler_stop(self._c_sampler)
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Whether the sampling thread is running
+
+        Returns:
+            (bool): True while samples are being taken
+        """
+        return _lib.LogicSampler_isRunning(self._c_sampler) == 1
+
+    @property
+    def patterns(self) -> ndarray:
+        """
+        Patterns recorded in each sample
+
+        Returns:
+            (ndarray): one entry per column of the samples
+        """
+        return self._patterns.copy()
+
+    @property
+    def interval(self) -> float:
+        """
+        Time between samples
+
+        Returns:
+            (float): interval in seconds
+        """
+        return self._interval
 
-    return pattern
+    @property
+    def capacity(self) -> int:
+        """
+        Number of samples the ring can hold
+
+        Returns:
+            (int): ring capacity in samples
+        """
+        return self._capacity
+
+    @property
+    def samples(self) -> int:
+        """
+        Number of samples taken since the sampler was created
+
+        Returns:
+            (int): total samples
+        """
+        return _lib.LogicSampler_samples(self._c_sampler)
+
+    @property
+    def overruns(self) -> int:
+        """
+        Number of samples taken late because a deadline was missed
+
+        Returns:
+            (int): total missed deadlines
+        """
+        return _lib.LogicSampler_overruns(self._c_sampler)
+
+    @cython.ccall
+    def latest(
+        self, max_samples: cython.longlong = -1
+    ) -> Tuple[ndarray, ndarray]:
+        """
+        Copy the most recent samples out of the ring, oldest first
+
+        Args:
+            max_samples (int): upper limit on the number of samples, -1 for
+                everything held in the ring
+
+        Returns:
+            Tuple[ndarray, ndarray]: (time counters, counts) with the counts
+            of shape (samples, patterns)
+        """
+        limit: cython.longlong = self._capacity
+        if 0 <= max_samples < limit:
+            limit = max_samples
+        time_counters = empty(limit, dtype=int64)
+        counts = empty((limit, self._patterns.shape[0]), dtype=uint64)
+        if limit == 0:
+            return time_counters, counts
+
+        time_view: cython.longlong[::1] = time_counters
+        count_view: cython.ulonglong[:, ::1] = counts
+        n: cython.longlong = _lib.LogicSampler_latest(
+            self._c_sampler,
+            limit,
+            cython.cast(cython.pointer(i64), cython.address(time_view[0])),
+            cython.cast(cython.pointer(u64), cython.address(count_view[0, 0])),
+        )
+        return time_counters[:n], counts[:n]
+
+    def averages(self, window: int = -1) -> ndarray:
+        """
+        Mean counts per sample over the most recent samples
+
+        Args:
+            window (int): number of samples to average, -1 for the whole ring
+
+        Returns:
+            (ndarray): float64 average for each pattern
+        """
+        _, counts = self.latest(window)
+        if counts.shape[0] == 0:
+            return zeros(self._patterns.shape[0], dtype=float64)
+        return counts.mean(axis=0)
+
+    def rates(self, window: int = -1) -> ndarray:
+        """
+        Count rates over the most recent samples
+
+        The counts are divided by the integration time reported by the time
+        counter rather than the nominal interval.
+
+        Args:
+            window (int): number of samples to use, -1 for the whole ring
+
+        Returns:
+            (ndarray): float64 rate for each pattern in counts per second
+        """
+        time_counters, counts = self.latest(window)
+        duration = time_counters.sum() * TIME_COUNTER_PERIOD
+        if duration <= 0:
+            return zeros(self._patterns.shape[0], dtype=float64)
+        return counts.sum(axis=0) / duration
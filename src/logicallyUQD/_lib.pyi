@@ -1,19 +1,34 @@
 import cython
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+from ._telemetry import Telemetry
+from ._calibration import CalibrationCache
+from ._config import DeviceConfig
 from _typeshed import Incomplete
 from numpy import float64, ndarray as ndarray, uint64, uint8
 
 UQD_ERROR_FLAG: Incomplete
+TIME_COUNTER_PERIOD: float
 
 def error_from_bit_set(bit_set: int) -> list[int]: ...
 
 class UQDLogic16:
-    '''
+    """
 
     NOTE:
         Linux users will need to add the following file to their system,         ``/etc/udev/rules.d/UQDLogic16.rules`` that contains the following line         ``ATTR{idVendor}=="0bd0", ATTR{idProduct}=="f100", MODE="666"``. This         will ensure that the device does not need additional root privaledges to         operate. After this file has been created the user will have to log out         and the log in again or run the following command         ``sudo udevadm control --reload-rules && udevadm trigger`` to update the         current device rules.
 
-    '''
-    def __init__(self, device_id: int = 1, calibrate: bool = True) -> None: ...
+    """
+    def __init__(
+        self,
+        device_id: int = 1,
+        calibrate: bool = True,
+        calibration_cache: CalibrationCache | bool | None = None,
+    ) -> None: ...
+    @property
+    def identity(self) -> dict: ...
+    @property
+    def calibration_reused(self) -> bool: ...
     def is_open(self) -> bool: ...
     def __close__(self) -> None: ...
     def __exit__(self) -> None: ...
@@ -131,6 +146,23 @@ class UQDLogic16:
         Stop transmitting timetags from the device to the host computer
         """
     def read_tags(self) -> tuple[int, list[uint8], list[uint64]]: ...
+    def read_tags_into(
+        self, channels_out: ndarray, timestamps_out: ndarray
+    ) -> int: ...
+    @property
+    def pending_tags(self) -> int: ...
+    @property
+    def executor(self) -> ThreadPoolExecutor: ...
+    @property
+    def telemetry(self) -> Telemetry | None: ...
+    def enable_telemetry(self, poll_errors: bool = True) -> Telemetry: ...
+    def disable_telemetry(self) -> None: ...
+    def read_error_flags(self) -> int: ...
+    async def acalibrate(self) -> None: ...
+    async def aread_tags(self) -> tuple[int, ndarray, ndarray]: ...
+    def stream(
+        self, poll_interval: float = 1e-3
+    ) -> AsyncIterator[tuple[ndarray, ndarray]]: ...
     @property
     def filter_min_count(self) -> int:
         """
@@ -174,6 +206,32 @@ class UQDLogic16:
         """ """
     @level_gate.setter
     def level_gate(self, value: bool): ...
+    @property
+    def config(self) -> DeviceConfig:
+        """
+        Snapshot of the input configuration
+
+        Inversion and exclusion are given as last set, whether or not
+        ``inversion_apply``/``exclusion_apply`` has been called since.
+
+        Returns:
+            (DeviceConfig): copy of the current settings
+        """
+    def apply_config(self, config: DeviceConfig, force: bool = False) -> int:
+        """
+        Write a whole input configuration
+
+        Only the registers that differ from the configuration last written
+        are sent, the first call after opening the device, or any call with
+        ``force``, writes every register.
+
+        Args:
+            config (DeviceConfig): configuration to write
+            force (bool): write every register
+
+        Returns:
+            (int): number of registers written
+        """
 
 class LogicMode:
     def __init__(self, uqd_logic16) -> None: ...
@@ -185,6 +243,123 @@ class LogicMode:
     def calc_count_pos(self, pattern: int): ...
     def calc_count(self, positive: int, negative: int): ...
     def get_time_counter(self): ...
+    def calc_counts(self, patterns, out: ndarray | None = None) -> ndarray: ...
+    def calc_counts_pn(
+        self, positive, negative, out: ndarray | None = None
+    ) -> ndarray: ...
+    def read_counts(
+        self, patterns, out: ndarray | None = None
+    ) -> tuple[int, ndarray]: ...
+    async def aread_logic(self) -> int: ...
+    async def aread_counts(
+        self, patterns, out: ndarray | None = None
+    ) -> tuple[int, ndarray]: ...
     def set_output_width(self, width: int): ...
     def set_output_pattern(self, output: int, positive: int, negative: int): ...
     def set_output_event_count(self, events: int): ...
+
+class TagStream:
+    """
+    Acquire timetags on a native background thread.
+
+    The thread repeatedly calls ``CTimeTag_readTags`` without holding the GIL
+    and copies every batch into a preallocated ring of channels and
+    timestamps. Python consumes the ring whenever it is ready, either as
+    zero-copy views with :meth:`peek` and :meth:`release` or as copies with
+    :meth:`read`.
+    """
+    def __init__(
+        self,
+        uqd_logic16: UQDLogic16,
+        capacity: int = ...,
+        min_poll: float = 50e-6,
+        max_poll: float = 10e-3,
+    ) -> None: ...
+    def __enter__(self) -> TagStream: ...
+    def __exit__(self, exc_type, exc_value, traceback) -> None: ...
+    def start(self) -> None: ...
+    def stop(self) -> None: ...
+    @property
+    def is_running(self) -> bool: ...
+    @property
+    def capacity(self) -> int: ...
+    @property
+    def available(self) -> int: ...
+    @property
+    def total_tags(self) -> int: ...
+    @property
+    def dropped_tags(self) -> int: ...
+    @property
+    def batches(self) -> int: ...
+    @property
+    def poll_interval(self) -> float: ...
+    def error_flags(self) -> int: ...
+    def peek(self, max_tags: int = 0) -> tuple[int, ndarray, ndarray]: ...
+    def release(self, count: int) -> None: ...
+    def read(self, max_tags: int = 0) -> tuple[int, ndarray, ndarray]: ...
+
+class TagBatch:
+    """
+    A batch of tags held in a buffer borrowed from a :class:`TagBufferPool`.
+    """
+
+    count: int
+    released: bool
+    def __init__(self, pool: TagBufferPool, batch_size: int) -> None: ...
+    def __enter__(self) -> TagBatch: ...
+    def __exit__(self, exc_type, exc_value, traceback) -> None: ...
+    def __len__(self) -> int: ...
+    @property
+    def channels(self) -> ndarray: ...
+    @property
+    def timestamps(self) -> ndarray: ...
+    @property
+    def channels_buffer(self) -> ndarray: ...
+    @property
+    def timestamps_buffer(self) -> ndarray: ...
+    def release(self) -> None: ...
+
+class TagBufferPool:
+    """
+    Fixed set of reusable tag buffers.
+    """
+    def __init__(self, buffers: int = 8, batch_size: int = ...) -> None: ...
+    @property
+    def batch_size(self) -> int: ...
+    @property
+    def buffers(self) -> int: ...
+    @property
+    def free(self) -> int: ...
+    def acquire(self) -> TagBatch: ...
+    def read(self, uqd_logic16) -> TagBatch: ...
+
+class LogicSampler:
+    """
+    Record the logic counters at a fixed interval on a native thread.
+    """
+    def __init__(
+        self,
+        logic_mode: LogicMode,
+        patterns,
+        interval: float = 1e-3,
+        capacity: int = ...,
+    ) -> None: ...
+    def __enter__(self) -> LogicSampler: ...
+    def __exit__(self, exc_type, exc_value, traceback) -> None: ...
+    def start(self) -> None: ...
+    def stop(self) -> None: ...
+    @property
+    def is_running(self) -> bool: ...
+    @property
+    def patterns(self) -> ndarray: ...
+    @property
+    def interval(self) -> float: ...
+    @property
+    def capacity(self) -> int: ...
+    @property
+    def samples(self) -> int: ...
+    @property
+    def overruns(self) -> int: ...
+    def latest(self, max_samples: int = -1) -> tuple[ndarray, ndarray]: ...
+    def averages(self, window: int = -1) -> ndarray: ...
+    def rates(self, window: int = -1) -> ndarray: ...
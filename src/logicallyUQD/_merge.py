@@ -0,0 +1,331 @@
+import cython
+from typing import Tuple
+from numpy import (
+    ndarray,
+    zeros,
+    empty,
+    full,
+    concatenate,
+    searchsorted,
+    uint8,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+
+# Latest timestamp of a stream that has produced nothing yet
+NOTHING = -(2**63)
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _remap(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    channel_offset: cython.int,
+    time_offset: cython.longlong,
+    channels_out: cython.uchar[::1],
+    timestamps_out: cython.longlong[::1],
+) -> cython.void:
+    i: cython.Py_ssize_t
+    for i in range(timestamps.shape[0]):
+        channels_out[i] = channels[i] + channel_offset
+        timestamps_out[i] = timestamps[i] + time_offset
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _merge(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    offsets: cython.const[cython.longlong][::1],
+    positions: cython.longlong[::1],
+    channels_out: cython.uchar[::1],
+    timestamps_out: cython.longlong[::1],
+) -> cython.void:
+    # k way merge of the sorted segments offsets[s]:offsets[s + 1]. With the
+    # few streams of a multi-device setup a linear scan of the heads beats a
+    # heap. Ties go to the lower stream.
+    k: cython.Py_ssize_t = offsets.shape[0] - 1
+    s: cython.Py_ssize_t
+    best: cython.Py_ssize_t
+    i: cython.Py_ssize_t
+    t: cython.longlong = 0
+    for s in range(k):
+        positions[s] = offsets[s]
+    for i in range(timestamps_out.shape[0]):
+        best = -1
+        for s in range(k):
+            if positions[s] < offsets[s + 1]:
+                if (best < 0) or (timestamps[positions[s]] < t):
+                    best = s
+                    t = timestamps[positions[s]]
+        channels_out[i] = channels[positions[best]]
+        timestamps_out[i] = t
+        positions[best] += 1
+
+
+@cython.cclass
+class TagMerger:
+    """
+    Merge the sorted tag streams of several devices into one.
+
+    Each stream's channels are shifted by its channel offset and its
+    timestamps by its time offset as they are pushed. :meth:`pop` returns,
+    in time order, every buffered tag no later than the watermark, the
+    earliest of the streams' latest timestamps, since no stream can still
+    deliver an earlier tag. A stream that stays silent holds the watermark
+    back, so once more than ``max_buffered`` tags are waiting every buffered
+    tag is returned regardless. Tags a stream delivers after later ones
+    have been returned are counted in :attr:`late_tags`.
+
+    Args:
+        channel_offsets (Sequence[int]): number added to the channels of
+            each stream, e.g. 0, 16, 32 for three 16 channel devices
+        time_offsets (Sequence[int], optional): bins added to the
+            timestamps of each stream to align the devices' clocks
+        max_buffered (int): tags buffered before the watermark is ignored
+    """
+
+    _channel_offsets: ndarray
+    _time_offsets: ndarray
+    _channels: list
+    _timestamps: list
+    _starts: ndarray
+    _ends: ndarray
+    _latest: ndarray
+    _positions: ndarray
+    _max_buffered: cython.longlong
+    _emitted: cython.longlong
+    _late_tags: cython.longlong
+
+    def __init__(
+        self, channel_offsets, time_offsets=None, max_buffered: int = 2**22
+    ):
+        self._channel_offsets = zeros(len(channel_offsets), dtype=int64)
+        self._channel_offsets[:] = channel_offsets
+        k = self._channel_offsets.shape[0]
+        if k < 1:
+            raise ValueError('At least one stream is required')
+        if ((self._channel_offsets < 0) | (self._channel_offsets > 255)).any():
+            raise ValueError('channel_offsets must be between 0 and 255')
+        self._time_offsets = zeros(k, dtype=int64)
+        if time_offsets is not None:
+            if len(time_offsets) != k:
+                raise ValueError(f'time_offsets must have {k} entries')
+            self._time_offsets[:] = time_offsets
+        if max_buffered < 1:
+            raise ValueError('max_buffered must be >= 1')
+
+        self._max_buffered = max_buffered
+        self._channels = [zeros(1024, dtype=uint8) for _ in range(k)]
+        self._timestamps = [zeros(1024, dtype=int64) for _ in range(k)]
+        self._starts = zeros(k, dtype=int64)
+        self._ends = zeros(k, dtype=int64)
+        self._latest = full(k, NOTHING, dtype=int64)
+        self._positions = zeros(k, dtype=int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Drop every buffered tag and forget the streams' times
+        """
+        self._starts[:] = 0
+        self._ends[:] = 0
+        self._latest[:] = NOTHING
+        self._emitted = NOTHING
+        self._late_tags = 0
+
+    @property
+    def number_of_streams(self) -> int:
+        """
+        Number of streams merged
+
+        Returns:
+            (int): number of streams
+        """
+        return self._channel_offsets.shape[0]
+
+    @property
+    def buffered(self) -> ndarray:
+        """
+        Number of tags waiting in each stream
+
+        Returns:
+            (ndarray): int64 array with one entry per stream
+        """
+        return self._ends - self._starts
+
+    @property
+    def latest(self) -> ndarray:
+        """
+        Latest time each stream is known to have reached, after its offset
+
+        Returns:
+            (ndarray): int64 array with one entry per stream, ``NOTHING``
+            for streams that have delivered nothing
+        """
+        return self._latest.copy()
+
+    @property
+    def watermark(self) -> int:
+        """
+        Time up to which every stream has delivered its tags
+
+        Returns:
+            (int): earliest latest time of the streams
+        """
+        return int(self._latest.min())
+
+    @property
+    def late_tags(self) -> int:
+        """
+        Number of tags delivered after later tags had been returned
+
+        Returns:
+            (int): tags returned out of order
+        """
+        return self._late_tags
+
+    @cython.ccall
+    def push(self, stream: cython.int, channels, timestamps):
+        """
+        Add the next batch of one stream
+
+        Args:
+            stream (int): index of the stream
+            channels (ndarray): channel of each tag, in the device's numbering
+            timestamps (ndarray): timestamp of each tag in bins, sorted
+        """
+        if (stream < 0) or (stream >= self._channel_offsets.shape[0]):
+            raise ValueError('stream out of range')
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+        if n == 0:
+            return
+
+        start: cython.Py_ssize_t = self._starts[stream]
+        end: cython.Py_ssize_t = self._ends[stream]
+        buffer_channels = self._channels[stream]
+        buffer_timestamps = self._timestamps[stream]
+        if end + n > buffer_timestamps.shape[0]:
+            # Move the waiting tags to the front, growing if that is not
+            # enough room
+            size = max(buffer_timestamps.shape[0], 2 * (end - start + n))
+            if size > buffer_timestamps.shape[0]:
+                grown_channels = empty(size, dtype=uint8)
+                grown_timestamps = empty(size, dtype=int64)
+            else:
+                grown_channels = buffer_channels
+                grown_timestamps = buffer_timestamps
+            grown_channels[: end - start] = buffer_channels[start:end]
+            grown_timestamps[: end - start] = buffer_timestamps[start:end]
+            buffer_channels = grown_channels
+            buffer_timestamps = grown_timestamps
+            self._channels[stream] = buffer_channels
+            self._timestamps[stream] = buffer_timestamps
+            end -= start
+            start = 0
+            self._starts[stream] = 0
+
+        channels_view: cython.uchar[::1] = buffer_channels
+        timestamps_view: cython.longlong[::1] = buffer_timestamps
+        _remap(
+            channels,
+            timestamps,
+            self._channel_offsets[stream],
+            self._time_offsets[stream],
+            channels_view[end : end + n],
+            timestamps_view[end : end + n],
+        )
+        if timestamps_view[end] < self._emitted:
+            self._late_tags += searchsorted(
+                buffer_timestamps[end : end + n], self._emitted
+            )
+        self._ends[stream] = end + n
+        self._latest[stream] = max(
+            self._latest[stream], timestamps_view[end + n - 1]
+        )
+
+    def advance(self, stream: int, time: int):
+        """
+        Declare that a stream has no more tags before ``time``
+
+        Lets the watermark move on while a device sees no tags, if its time
+        is known some other way.
+
+        Args:
+            stream (int): index of the stream
+            time (int): time in bins, before the stream's time offset
+        """
+        time += int(self._time_offsets[stream])
+        self._latest[stream] = max(self._latest[stream], time)
+
+    @cython.ccall
+    def pop(self, flush: cython.bint = False) -> Tuple[ndarray, ndarray]:
+        """
+        Remove the tags that can be returned in time order
+
+        Args:
+            flush (bool): return every buffered tag, e.g. once all devices
+                have stopped
+
+        Returns:
+            (Tuple[ndarray, ndarray]): merged uint8 channels and int64
+            timestamps
+        """
+        k: cython.Py_ssize_t = self._channel_offsets.shape[0]
+        waiting = self._ends - self._starts
+        watermark: cython.longlong = self._latest.min()
+        if flush or (waiting.sum() > self._max_buffered):
+            watermark = 2**63 - 1
+
+        counts = zeros(k, dtype=int64)
+        s: cython.Py_ssize_t
+        for s in range(k):
+            if waiting[s] > 0:
+                counts[s] = searchsorted(
+                    self._timestamps[s][self._starts[s] : self._ends[s]],
+                    watermark,
+                    side='right',
+                )
+
+        total = int(counts.sum())
+        channels_out = empty(total, dtype=uint8)
+        timestamps_out = empty(total, dtype=int64)
+        if total == 0:
+            return channels_out, timestamps_out
+
+        offsets = zeros(k + 1, dtype=int64)
+        offsets[1:] = counts.cumsum()
+        packed_channels = concatenate([
+            self._channels[s][self._starts[s] : self._starts[s] + counts[s]]
+            for s in range(k)
+        ])
+        packed_timestamps = concatenate([
+            self._timestamps[s][self._starts[s] : self._starts[s] + counts[s]]
+            for s in range(k)
+        ])
+        _merge(
+            packed_channels,
+            packed_timestamps,
+            offsets,
+            self._positions,
+            channels_out,
+            timestamps_out,
+        )
+        self._starts += counts
+        empty_streams = self._starts == self._ends
+        self._starts[empty_streams] = 0
+        self._ends[empty_streams] = 0
+        self._emitted = max(self._emitted, timestamps_out[total - 1])
+        return channels_out, timestamps_out
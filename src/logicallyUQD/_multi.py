@@ -0,0 +1,282 @@
+import threading
+import time
+from collections import deque
+from typing import Sequence, Tuple
+from numpy import ndarray, array, cumsum, full, int64
+
+from ._merge import NOTHING, TagMerger
+
+
+class MultiDeviceSession:
+    """
+    Several devices acquired as one instrument with more channels.
+
+    The devices are started together and each is read on its own thread,
+    ``read_tags`` releases the GIL so the reads run in parallel. Their
+    batches are merged by a :class:`TagMerger` into one time ordered stream
+    in which device ``i`` has the channels from ``channel_offsets[i]``, the
+    total channel count of the devices before it.
+
+    For the timestamps of different devices to be comparable their clocks
+    must be locked, by default every device is switched to the external
+    10 MHz reference. The devices still start counting at slightly different
+    times, ``time_offsets`` are added to each device's timestamps to line
+    them up, measured for example with a correlation of a signal split to
+    both devices.
+
+    If reading a device fails every reader stops, and the error is raised by
+    the next :meth:`read`. Devices the session opened from ids are closed by
+    :meth:`close`, which leaving the ``with`` block calls, devices passed in
+    open are left to the caller.
+
+    Args:
+        devices (Sequence): open ``UQDLogic16`` or ``SimulatedUQDLogic16``,
+            or device ids to open
+        time_offsets (Sequence[int], optional): bins added to each device's
+            timestamps
+        external_10MHz_reference (bool): lock every device to its 10 MHz
+            input
+        max_buffered (int): tags buffered while waiting for a silent
+            device, see :class:`TagMerger`
+        poll_interval (float): time a reader waits after an empty read in
+            seconds
+    """
+
+    def __init__(
+        self,
+        devices: Sequence,
+        time_offsets=None,
+        external_10MHz_reference: bool = True,
+        max_buffered: int = 2**22,
+        poll_interval: float = 1e-3,
+    ):
+        if len(devices) < 1:
+            raise ValueError('At least one device is required')
+
+        opened = []
+        self._owned = []
+        for device in devices:
+            if isinstance(device, int):
+                # Imported here so sessions of simulated devices work without
+                # the vendor library
+                from ._lib import UQDLogic16
+
+                device = UQDLogic16(device)
+                self._owned.append(device)
+            opened.append(device)
+        self._devices = opened
+
+        channels = array([d.number_of_channels for d in opened], dtype=int64)
+        if channels.sum() > 256:
+            for device in self._owned:
+                device.__close__()
+            raise ValueError('The devices have more than 256 channels')
+        self._channel_offsets = cumsum(channels) - channels
+        self._number_of_channels = int(channels.sum())
+
+        if external_10MHz_reference:
+            for device in opened:
+                device.external_10MHz_reference = True
+
+        self._merger = TagMerger(
+            self._channel_offsets, time_offsets, max_buffered
+        )
+        self._poll_interval = poll_interval
+        self._queues = [deque() for _ in opened]
+        self._reads = [0] * len(opened)
+        self._errors = [None] * len(opened)
+        self._threads = []
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def devices(self) -> list:
+        """
+        Devices of the session
+
+        Returns:
+            (list): devices in channel order
+        """
+        return list(self._devices)
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Total number of channels of every device
+
+        Returns:
+            (int): number of channels
+        """
+        return self._number_of_channels
+
+    @property
+    def channel_offsets(self) -> ndarray:
+        """
+        First merged channel of each device
+
+        Returns:
+            (ndarray): int64 array with one entry per device
+        """
+        return self._channel_offsets.copy()
+
+    @property
+    def resolution(self) -> float:
+        """
+        Bin width of the merged timestamps
+
+        Returns:
+            (float): resolution in seconds of the first device
+        """
+        return self._devices[0].resolution
+
+    @property
+    def merger(self) -> TagMerger:
+        """
+        Merger of the devices' streams
+
+        Returns:
+            (TagMerger): merger
+        """
+        return self._merger
+
+    @property
+    def is_running(self) -> bool:
+        """
+        Whether the devices are being read
+
+        Returns:
+            (bool): True between start and stop
+        """
+        return len(self._threads) > 0
+
+    def _read_device(self, index: int):
+        device = self._devices[index]
+        queue = self._queues[index]
+        try:
+            while not self._stop.is_set():
+                count, channels, timestamps = device.read_tags()
+                self._reads[index] += 1
+                if count > 0:
+                    # The views are only valid until the next read
+                    queue.append((channels.copy(), timestamps.copy()))
+                else:
+                    time.sleep(self._poll_interval)
+        except Exception as error:
+            # A merged stream missing a device is wrong, so every reader
+            # stops and read() raises the error
+            self._stop.set()
+            self._errors[index] = error
+
+    def start(self):
+        """
+        Start every device and its reader thread
+        """
+        if self.is_running:
+            return
+        self._merger.reset()
+        self._stop.clear()
+        for device in self._devices:
+            device.start_timetags()
+        self._threads = [
+            threading.Thread(target=self._read_device, args=(i,), daemon=True)
+            for i in range(len(self._devices))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """
+        Stop the reader threads and every device
+
+        Tags still buffered are returned by :meth:`read` with ``flush``.
+        """
+        if not self.is_running:
+            return
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        for device in self._devices:
+            device.stop_timetags()
+
+    def close(self):
+        """
+        Stop the session and close the devices it opened from ids
+        """
+        self.stop()
+        owned = self._owned
+        self._owned = []
+        for device in owned:
+            device.__close__()
+
+    def _drain(self):
+        for index, queue in enumerate(self._queues):
+            if self._errors[index] is not None:
+                error = self._errors[index]
+                self._errors[index] = None
+                raise error
+            while queue:
+                channels, timestamps = queue.popleft()
+                self._merger.push(index, channels, timestamps)
+
+    def read(self, flush: bool = False) -> Tuple[int, ndarray, ndarray]:
+        """
+        Merged tags of every device that are ready
+
+        Args:
+            flush (bool): also return the tags held back waiting for other
+                devices, e.g. after :meth:`stop`
+
+        Returns:
+            (Tuple[int, ndarray, ndarray]): (count, channels, timestamps) as
+            ``read_tags`` but owned, with uint8 merged channels and int64
+            timestamps
+        """
+        self._drain()
+        channels, timestamps = self._merger.pop(flush)
+        return channels.shape[0], channels, timestamps
+
+    def lag(self) -> ndarray:
+        """
+        How far each device's stream is behind the most advanced one
+
+        Returns:
+            (ndarray): int64 lag of each device in bins, zero for the
+            device furthest ahead and -1 for devices that have not
+            delivered any tags
+        """
+        self._drain()
+        latest = self._merger.latest
+        started = latest != NOTHING
+        lag = full(latest.shape[0], -1, dtype=int64)
+        if started.any():
+            lag[started] = latest[started].max() - latest[started]
+        return lag
+
+    def buffered(self) -> ndarray:
+        """
+        Tags of each device waiting to be merged
+
+        Returns:
+            (ndarray): int64 count per device, including batches read but
+            not yet handed to the merger
+        """
+        waiting = self._merger.buffered
+        for index, queue in enumerate(self._queues):
+            waiting[index] += sum(c.shape[0] for c, _ in list(queue))
+        return waiting
+
+    def reads(self) -> list:
+        """
+        Number of ``read_tags`` calls made on each device
+
+        Returns:
+            (List[int]): calls per device
+        """
+        return list(self._reads)
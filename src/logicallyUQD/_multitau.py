@@ -0,0 +1,350 @@
+import cython
+from cython.parallel import prange
+from numpy import (
+    ndarray,
+    zeros,
+    array,
+    arange,
+    bincount,
+    concatenate,
+    tile,
+    float64,
+    uint8,
+    uint64,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+from ._parallel import get_num_threads
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _multi_tau(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    start: cython.uchar,
+    stop: cython.uchar,
+    bin_width: cython.longlong,
+    starts: cython.longlong[:, ::1],
+    stops: cython.longlong[::1],
+    current: cython.longlong[::1],
+    histogram: cython.ulonglong[:, ::1],
+) -> cython.void:
+    # Level l counts tags in bins of bin_width << l. starts[l] is a ring of
+    # the start counts of its last P bins, P a power of two, stops[l] the
+    # stop count of its current bin current[l]. When a level moves to a new
+    # bin the finished one is correlated with the ring and added to the next
+    # level, so each tag only touches level 0 and the levels whose bin it
+    # changes.
+    n_levels: cython.Py_ssize_t = starts.shape[0]
+    p: cython.Py_ssize_t = starts.shape[1]
+    half: cython.Py_ssize_t = p // 2
+    mask: cython.longlong = p - 1
+    i: cython.Py_ssize_t
+    k: cython.Py_ssize_t
+    level: cython.Py_ssize_t
+    first: cython.Py_ssize_t
+    gap: cython.longlong
+    t: cython.longlong
+    b: cython.longlong
+    now: cython.longlong
+    s: cython.longlong
+    c: cython.uchar
+    ring: cython.longlong[::1]
+
+    for i in range(timestamps.shape[0]):
+        c = channels[i]
+        if (c != start) and (c != stop):
+            continue
+        t = timestamps[i] // bin_width
+        level = 0
+        while level < n_levels:
+            b = t >> level
+            now = current[level]
+            # Coarser levels are in the same bin if this one is
+            if b == now:
+                break
+
+            ring = starts[level]
+            s = stops[level]
+            if s > 0:
+                first = 1 if level == 0 else half
+                for k in range(first, p):
+                    histogram[level, k] += s * ring[(now - k) & mask]
+            if level + 1 < n_levels:
+                starts[level + 1, (now >> 1) & mask] += ring[now & mask]
+                stops[level + 1] += s
+
+            gap = b - now
+            if gap > p:
+                gap = p
+            for k in range(1, gap + 1):
+                ring[(now + k) & mask] = 0
+            current[level] = b
+            stops[level] = 0
+            level += 1
+
+        if c == start:
+            starts[0, t & mask] += 1
+        if c == stop:
+            stops[0] += 1
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _multi_tau_pairs(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    pairs: cython.const[cython.uchar][:, ::1],
+    bin_width: cython.longlong,
+    starts: cython.longlong[:, :, ::1],
+    stops: cython.longlong[:, ::1],
+    current: cython.longlong[:, ::1],
+    histograms: cython.ulonglong[:, :, ::1],
+    threads: cython.int,
+) -> cython.void:
+    # Every pair has its own state, so each thread takes whole pairs
+    p: cython.Py_ssize_t
+    for p in prange(pairs.shape[0], nogil=True, num_threads=threads):
+        _multi_tau(
+            channels,
+            timestamps,
+            pairs[p, 0],
+            pairs[p, 1],
+            bin_width,
+            starts[p],
+            stops[p],
+            current[p],
+            histograms[p],
+        )
+
+
+@cython.cclass
+class MultiTauCorrelator:
+    """
+    Streaming multi-tau correlation of channel pairs, e.g. for FCS.
+
+    The tags are counted in bins of ``bin_width`` and correlated at
+    ``points`` lags, then at each of the further ``levels - 1`` levels the
+    bins are merged in pairs and correlated at lags ``points // 2`` to
+    ``points - 1`` of the wider bins. The lags grow geometrically from
+    ``bin_width`` to ``(points - 1) * bin_width * 2**(levels - 1)``, 10 ns to
+    over a second with the defaults, while the state of each pair is a few
+    arrays of ``levels * points``. The bins are filled directly from the
+    timestamps and only bins holding tags are visited, so the cost per tag
+    does not depend on the shortest lag.
+
+    Every level carries its bins between batches, so the correlation does
+    not depend on how the stream is split. The bins a level is still
+    filling are counted once the stream moves past them.
+
+    Args:
+        pairs (Sequence[Tuple[int, int]]): (start, stop) tag channels, equal
+            channels for an autocorrelation
+        bin_width (int): shortest bin width in bins of
+            ``UQDLogic16.resolution``
+        levels (int): number of levels, each doubling the bin width
+        points (int): lags per level, a power of two
+    """
+
+    _pairs: list
+    _pair_channels: ndarray
+    _bin_width: cython.longlong
+    _levels: cython.Py_ssize_t
+    _points: cython.Py_ssize_t
+    _starts: ndarray
+    _stops: ndarray
+    _current: ndarray
+    _counts: ndarray
+    _levels_index: ndarray
+    _points_index: ndarray
+    _tag_counts: ndarray
+    _first: cython.longlong
+    _last: cython.longlong
+    _started: cython.bint
+
+    def __init__(
+        self,
+        pairs,
+        bin_width: int = 128,
+        levels: int = 24,
+        points: int = 16,
+    ):
+        if bin_width < 1:
+            raise ValueError('bin_width must be >= 1')
+        if not (1 <= levels <= 48):
+            raise ValueError('levels must be between 1 and 48')
+        if (points < 4) or (points & (points - 1) != 0):
+            raise ValueError('points must be a power of two >= 4')
+
+        self._pairs = [(int(a), int(b)) for a, b in pairs]
+        if len(self._pairs) == 0:
+            raise ValueError('At least one channel pair is required')
+        for a, b in self._pairs:
+            if not ((0 <= a < 256) and (0 <= b < 256)):
+                raise ValueError('channels must be in range 0 <= channel < 256')
+
+        self._pair_channels = array(self._pairs, dtype=uint8)
+        self._bin_width = bin_width
+        self._levels = levels
+        self._points = points
+        n = len(self._pairs)
+        self._starts = zeros((n, levels, points), dtype=int64)
+        self._stops = zeros((n, levels), dtype=int64)
+        self._current = zeros((n, levels), dtype=int64)
+        self._counts = zeros((n, levels, points), dtype=uint64)
+
+        # Level 0 has lags 1 to points - 1, the others the upper half
+        half = points // 2
+        self._levels_index = concatenate((
+            zeros(points - 1, dtype=int64),
+            arange(1, levels, dtype=int64).repeat(points - half),
+        ))
+        self._points_index = concatenate((
+            arange(1, points, dtype=int64),
+            tile(arange(half, points, dtype=int64), levels - 1),
+        ))
+        self.reset()
+
+    @property
+    def pairs(self) -> list:
+        """
+        Channel pairs being correlated
+
+        Returns:
+            (List[Tuple[int, int]]): (start, stop) channels
+        """
+        return list(self._pairs)
+
+    @property
+    def lags(self) -> ndarray:
+        """
+        Lag of each point of the correlation
+
+        Returns:
+            (ndarray): int64 lags in bins of ``UQDLogic16.resolution``
+        """
+        return self._points_index * self.bin_widths
+
+    @property
+    def bin_widths(self) -> ndarray:
+        """
+        Width of the bins each point of the correlation is computed from
+
+        Returns:
+            (ndarray): int64 widths in bins of ``UQDLogic16.resolution``
+        """
+        return self._bin_width << self._levels_index
+
+    @property
+    def histograms(self) -> ndarray:
+        """
+        Products of the start and stop counts summed at each lag, the
+        number of tag pairs whose bins are that many bins apart
+
+        Returns:
+            (ndarray): uint64 array of shape (pairs, lags)
+        """
+        return self._counts[:, self._levels_index, self._points_index]
+
+    @property
+    def duration(self) -> int:
+        """
+        Time spanned by the tags processed so far in bins
+
+        Returns:
+            (int): last minus first timestamp
+        """
+        if not self._started:
+            return 0
+        return self._last - self._first
+
+    def reset(self):
+        """
+        Clear the correlations and the bins carried between batches
+        """
+        self._starts[:] = 0
+        self._stops[:] = 0
+        self._current[:] = 0
+        self._counts[:] = 0
+        self._tag_counts = zeros(256, dtype=int64)
+        self._first = 0
+        self._last = 0
+        self._started = False
+
+    @cython.ccall
+    def process(self, channels, timestamps):
+        """
+        Add a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins, sorted
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+        if n == 0:
+            return
+
+        if not self._started:
+            self._first = timestamps[0]
+            self._started = True
+            # Start every level in the bin of the first tag
+            self._current[:] = (timestamps[0] // self._bin_width) >> arange(
+                self._levels, dtype=int64
+            )
+        self._last = timestamps[n - 1]
+        self._tag_counts += bincount(channels, minlength=256)
+
+        _multi_tau_pairs(
+            channels,
+            timestamps,
+            self._pair_channels,
+            self._bin_width,
+            self._starts,
+            self._stops,
+            self._current,
+            self._counts,
+            get_num_threads(),
+        )
+
+    def normalised(self) -> ndarray:
+        """
+        Correlations divided by the products expected for uncorrelated
+        channels
+
+        For each lag the expected value accounts for the finite duration of
+        the measurement, so for Poissonian sources this is g(2) of each
+        pair, G(tau) + 1 in the FCS convention.
+
+        Returns:
+            (ndarray): float64 array of shape (pairs, lags), zero for lags
+            longer than the measurement
+        """
+        histograms = self.histograms
+        result = zeros(histograms.shape, dtype=float64)
+        duration = self.duration
+        if duration <= 0:
+            return result
+
+        lags = self.lags
+        inside = lags < duration
+        overlap = self.bin_widths[inside] * (duration - lags[inside])
+        p: cython.Py_ssize_t
+        for p in range(len(self._pairs)):
+            a, b = self._pairs[p]
+            n_ab = float(self._tag_counts[a]) * float(self._tag_counts[b])
+            if n_ab > 0:
+                expected = n_ab * overlap / (float(duration) ** 2)
+                result[p, inside] = histograms[p, inside] / expected
+        return result
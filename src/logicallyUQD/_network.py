@@ -0,0 +1,633 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+from typing import Iterator, Optional, Tuple, Union
+from numpy import ndarray, dtype, zeros, empty, frombuffer, uint8, int64
+
+from ._tags import as_channels, as_timestamps
+from ._codec import encode_tags, decode_tags
+
+# A connection starts with HELLO_DTYPE from the server, then every batch is
+# BATCH_DTYPE followed by ``size`` bytes of payload, ``count`` little-endian
+# int64 timestamps then ``count`` uint8 channels, or an ``encode_tags`` frame.
+
+HELLO_MAGIC = b'UQDN'
+PROTOCOL_VERSION = 1
+
+HELLO_DTYPE = dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('number_of_channels', '<u4'),
+    ('reserved', 'S4'),
+    ('resolution', '<f8'),
+    ('sequence', '<u8'),
+])
+
+BATCH_DTYPE = dtype([
+    ('size', '<u8'),
+    ('sequence', '<u8'),
+    ('count', '<u8'),
+    ('dropped', '<u8'),
+    ('error_flags', '<u4'),
+    ('encoding', 'u1'),
+    ('reserved', 'S3'),
+])
+
+RAW = 0
+ENCODED = 1
+
+Address = Union[str, Tuple[str, int]]
+
+
+def _socket_family(address: Address) -> int:
+    # Strings are Unix socket paths, (host, port) tuples TCP addresses
+    if isinstance(address, str):
+        return socket.AF_UNIX
+    return socket.AF_INET
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> Optional[bytearray]:
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            return None
+        received += n
+    return buffer
+
+
+class _Connection:
+    # A subscriber of the server and the batches waiting to be sent to it
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.queue = deque()
+        self.ready = threading.Condition()
+        self.dropped = 0
+        self.dropped_total = 0
+        self.closed = False
+        self.thread = None
+
+
+class TagServer:
+    """
+    Serve tag batches to clients over TCP or a Unix socket.
+
+    Every connected :class:`TagClient` receives each published batch as a
+    length prefixed binary frame with the channel and timestamp columns,
+    the batch's sequence number and the device's error flags. Each client
+    has its own sender thread and a queue of at most ``max_queued``
+    batches. When a client falls behind, ``policy`` decides what happens:
+    ``'drop'`` skips batches for that client and reports the number of tags
+    lost with the next batch it gets, ``'block'`` makes :meth:`publish` wait
+    so the device's own buffer absorbs the backlog. Batches waiting for the
+    same client are sent together, so slow links take fewer, larger
+    writes.
+
+    :meth:`poll` and :meth:`run` read a device and coalesce its reads,
+    publishing once ``min_batch`` tags are waiting or the oldest has waited
+    ``max_delay`` seconds, so the batch size follows the tag rate.
+
+    Args:
+        uqd_logic16 (UQDLogic16, optional): device read by :meth:`poll` and
+            :meth:`run`
+        address (str | Tuple[str, int]): path of a Unix socket, or (host,
+            port) to listen on, port 0 for any free port
+        max_queued (int): batches queued per client
+        policy (str): ``'drop'`` or ``'block'`` when a client's queue is
+            full
+        min_batch (int): tags collected before :meth:`poll` publishes
+        max_delay (float): longest time :meth:`poll` holds tags in seconds
+        compress (bool): send batches encoded with ``encode_tags``
+        resolution (float, optional): bin width sent to clients, by default
+            the device's
+        number_of_channels (int, optional): number of channels sent to
+            clients, by default the device's, 0 if unknown
+    """
+
+    def __init__(
+        self,
+        uqd_logic16=None,
+        address: Address = ('127.0.0.1', 0),
+        max_queued: int = 64,
+        policy: str = 'drop',
+        min_batch: int = 2**16,
+        max_delay: float = 10e-3,
+        compress: bool = False,
+        resolution: Optional[float] = None,
+        number_of_channels: Optional[int] = None,
+    ):
+        if max_queued < 1:
+            raise ValueError('max_queued must be >= 1')
+        if policy not in ('drop', 'block'):
+            raise ValueError("policy must be 'drop' or 'block'")
+        if min_batch < 1:
+            raise ValueError('min_batch must be >= 1')
+        if resolution is None:
+            resolution = getattr(uqd_logic16, 'resolution', 0.0)
+        if number_of_channels is None:
+            number_of_channels = getattr(uqd_logic16, 'number_of_channels', 0)
+
+        self._uqd_logic16 = uqd_logic16
+        self._max_queued = max_queued
+        self._block = policy == 'block'
+        self._min_batch = min_batch
+        self._max_delay = max_delay
+        self._compress = compress
+        # channel_bits for encode_tags, enough for every channel, or for any
+        # uint8 channel when the number of channels is unknown
+        if number_of_channels > 0:
+            self._channel_bits = max(1, (number_of_channels - 1).bit_length())
+        else:
+            self._channel_bits = 8
+
+        hello = zeros(1, dtype=HELLO_DTYPE)
+        hello['magic'] = HELLO_MAGIC
+        hello['version'] = PROTOCOL_VERSION
+        hello['number_of_channels'] = number_of_channels
+        hello['resolution'] = resolution
+        self._hello = hello
+
+        family = _socket_family(address)
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            # A socket file left by a server that did not close
+            if os.path.exists(address):
+                os.unlink(address)
+        else:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind(address)
+        self._listener.listen()
+        self._listener.settimeout(0.1)
+        self._address = self._listener.getsockname()
+
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._sequence = 0
+        self._pending = []
+        self._pending_tags = 0
+        self._pending_since = 0.0
+        self._error_flags = 0
+        self._accept_thread = threading.Thread(target=self._accept, daemon=True)
+        self._accept_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def address(self) -> Address:
+        """
+        Address clients connect to
+
+        Returns:
+            (str | Tuple[str, int]): socket path or (host, port)
+        """
+        return self._address
+
+    @property
+    def sequence(self) -> int:
+        """
+        Sequence number the next batch will get
+
+        Returns:
+            (int): number of batches published so far
+        """
+        return self._sequence
+
+    @property
+    def clients(self) -> int:
+        """
+        Number of connected clients
+
+        Returns:
+            (int): clients
+        """
+        with self._lock:
+            return sum(not c.closed for c in self._connections)
+
+    @property
+    def dropped(self) -> int:
+        """
+        Tags dropped for clients that fell behind
+
+        Returns:
+            (int): tags not sent, summed over clients
+        """
+        with self._lock:
+            return sum(c.dropped_total for c in self._connections)
+
+    def _accept(self):
+        while not self._closed.is_set():
+            try:
+                sock, _ = self._listener.accept()
+            except TimeoutError:
+                continue
+            except OSError:
+                return
+            sock.settimeout(None)
+            if sock.family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _Connection(sock)
+            hello = self._hello.copy()
+            with self._lock:
+                # The client gets every batch from this sequence number on,
+                # batches published meanwhile wait in its queue
+                hello['sequence'] = self._sequence
+                self._connections.append(connection)
+            try:
+                sock.sendall(hello.tobytes())
+            except OSError:
+                with connection.ready:
+                    connection.closed = True
+                sock.close()
+                continue
+            connection.thread = threading.Thread(
+                target=self._send, args=(connection,), daemon=True
+            )
+            connection.thread.start()
+
+    def _send(self, connection: _Connection):
+        header = zeros(1, dtype=BATCH_DTYPE)
+        try:
+            while True:
+                with connection.ready:
+                    while (not connection.queue) and (
+                        not self._closed.is_set()
+                    ):
+                        connection.ready.wait()
+                    batches = list(connection.queue)
+                    connection.queue.clear()
+                    if (not batches) and (connection.dropped > 0):
+                        # On close, report the batches dropped after the
+                        # last one sent
+                        end = (self._sequence, 0, 0, RAW, b'')
+                        batches = [(end, connection.dropped)]
+                        connection.dropped = 0
+                    connection.ready.notify_all()
+
+                parts = []
+                for batch, dropped in batches:
+                    sequence, count, flags, encoding, payload = batch
+                    header['size'] = len(payload)
+                    header['sequence'] = sequence
+                    header['count'] = count
+                    header['dropped'] = dropped
+                    header['error_flags'] = flags
+                    header['encoding'] = encoding
+                    parts.append(header.tobytes())
+                    parts.append(payload)
+                if parts:
+                    # One write for everything that was waiting
+                    connection.sock.sendall(b''.join(parts))
+                elif self._closed.is_set():
+                    return
+        except OSError:
+            pass
+        finally:
+            with connection.ready:
+                connection.closed = True
+                connection.queue.clear()
+                connection.ready.notify_all()
+            connection.sock.close()
+
+    def publish(self, channels, timestamps, error_flags: int = 0):
+        """
+        Send a batch to every client
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+            error_flags (int): device error flags to send with the batch
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+        if self._closed.is_set():
+            raise ValueError('Server is closed')
+        if n == 0:
+            return
+
+        if self._compress:
+            payload = encode_tags(channels, timestamps, self._channel_bits)
+            encoding = ENCODED
+        else:
+            payload = timestamps.astype('<i8').tobytes() + channels.tobytes()
+            encoding = RAW
+        with self._lock:
+            batch = (self._sequence, n, error_flags, encoding, payload)
+            self._sequence += 1
+            connections = list(self._connections)
+        for connection in connections:
+            with connection.ready:
+                if self._block:
+                    while (
+                        len(connection.queue) >= self._max_queued
+                        and not connection.closed
+                    ):
+                        connection.ready.wait()
+                if connection.closed:
+                    continue
+                if len(connection.queue) >= self._max_queued:
+                    connection.dropped += n
+                    connection.dropped_total += n
+                    continue
+                # Tags dropped since the previous batch are reported with
+                # this one, so they always precede its sequence number
+                connection.queue.append((batch, connection.dropped))
+                connection.dropped = 0
+                connection.ready.notify_all()
+
+    def _publish_pending(self):
+        if self._pending_tags == 0:
+            return
+        if len(self._pending) == 1:
+            channels, timestamps = self._pending[0]
+        else:
+            channels = empty(self._pending_tags, dtype=uint8)
+            timestamps = empty(self._pending_tags, dtype=int64)
+            position = 0
+            for c, t in self._pending:
+                channels[position : position + c.shape[0]] = c
+                timestamps[position : position + c.shape[0]] = t
+                position += c.shape[0]
+        flags = self._error_flags
+        self._pending = []
+        self._pending_tags = 0
+        self._error_flags = 0
+        self.publish(channels, timestamps, flags)
+
+    def poll(self) -> int:
+        """
+        Read tags from the device and publish them once enough have
+        collected
+
+        Returns:
+            (int): number of tags read
+        """
+        count, channels, timestamps = self._uqd_logic16.read_tags()
+        read_error_flags = getattr(self._uqd_logic16, 'read_error_flags', None)
+        if read_error_flags is not None:
+            self._error_flags |= read_error_flags()
+        if count > 0:
+            if self._pending_tags == 0:
+                self._pending_since = time.monotonic()
+            # The views are only valid until the next read
+            self._pending.append((
+                as_channels(channels[:count]).copy(),
+                as_timestamps(timestamps[:count]).copy(),
+            ))
+            self._pending_tags += count
+        if (self._pending_tags >= self._min_batch) or (
+            (self._pending_tags > 0)
+            and (time.monotonic() - self._pending_since >= self._max_delay)
+        ):
+            self._publish_pending()
+        return max(count, 0)
+
+    def run(self, stop=None, poll_interval: float = 1e-3):
+        """
+        Publish the device's tags until ``stop`` is set
+
+        Args:
+            stop (threading.Event, optional): event ending the loop, by
+                default it runs until interrupted
+            poll_interval (float): time to wait after an empty read in
+                seconds
+        """
+        while (stop is None) or (not stop.is_set()):
+            if self.poll() == 0:
+                time.sleep(poll_interval)
+        self._publish_pending()
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """
+        Send the batches still queued, then disconnect every client
+
+        Args:
+            timeout (float, optional): seconds to wait for each client to
+                take its queued batches before it is cut off, None to wait
+                as long as it takes
+        """
+        if self._closed.is_set():
+            return
+        self._publish_pending()
+        self._closed.set()
+        self._accept_thread.join()
+        self._listener.close()
+        with self._lock:
+            # Connections whose hello failed never had a sender
+            connections = [c for c in self._connections if c.thread is not None]
+        for connection in connections:
+            with connection.ready:
+                connection.ready.notify_all()
+        for connection in connections:
+            connection.thread.join(timeout)
+            if connection.thread.is_alive():
+                # A client that stopped reading would block sendall forever
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+                connection.thread.join()
+        if isinstance(self._address, str) and os.path.exists(self._address):
+            os.unlink(self._address)
+
+
+class TagClient:
+    """
+    Receive the batches of a :class:`TagServer`.
+
+    Batches are returned in order as owned arrays. Batches the server
+    dropped because this client fell behind show up as gaps in the
+    sequence numbers, counted in :attr:`lost_batches`, and their tags in
+    :attr:`dropped_tags`.
+
+    Args:
+        address (str | Tuple[str, int]): :attr:`TagServer.address`
+        timeout (float, optional): seconds to wait for data before
+            ``TimeoutError`` is raised, by default wait forever
+    """
+
+    def __init__(self, address: Address, timeout: Optional[float] = None):
+        self._sock = socket.socket(_socket_family(address), socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(address)
+        hello = _recv_exactly(self._sock, HELLO_DTYPE.itemsize)
+        if hello is None:
+            raise ConnectionError('Server closed the connection')
+        hello = frombuffer(hello, dtype=HELLO_DTYPE, count=1)[0]
+        if hello['magic'] != HELLO_MAGIC:
+            raise ValueError(f'{address} is not a tag server')
+        if hello['version'] != PROTOCOL_VERSION:
+            raise ValueError(
+                f'Unsupported protocol version {int(hello["version"])}'
+            )
+        self._resolution = float(hello['resolution'])
+        self._number_of_channels = int(hello['number_of_channels'])
+        # Batches published before the connection are not counted as lost
+        self._next = int(hello['sequence'])
+        self._sequence = -1
+        self._error_flags = 0
+        self._lost_batches = 0
+        self._dropped_tags = 0
+        self._received = 0
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def resolution(self) -> float:
+        """
+        Bin width of the served timestamps
+
+        Returns:
+            (float): resolution in seconds
+        """
+        return self._resolution
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of channels of the served device
+
+        Returns:
+            (int): number of channels
+        """
+        return self._number_of_channels
+
+    @property
+    def sequence(self) -> int:
+        """
+        Sequence number of the last batch read
+
+        Returns:
+            (int): sequence number, -1 before the first batch
+        """
+        return self._sequence
+
+    @property
+    def error_flags(self) -> int:
+        """
+        Device error flags of the last batch read
+
+        Returns:
+            (int): error bit set
+        """
+        return self._error_flags
+
+    @property
+    def lost_batches(self) -> int:
+        """
+        Number of batches the server did not send to this client
+
+        Returns:
+            (int): gaps in the sequence numbers
+        """
+        return self._lost_batches
+
+    @property
+    def dropped_tags(self) -> int:
+        """
+        Number of tags the server did not send to this client
+
+        Returns:
+            (int): tags in the lost batches
+        """
+        return self._dropped_tags
+
+    @property
+    def received(self) -> int:
+        """
+        Number of batches read
+
+        Returns:
+            (int): batches read
+        """
+        return self._received
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether the server has closed the connection
+
+        Returns:
+            (bool): True once no more batches will arrive
+        """
+        return self._closed
+
+    def read(self) -> Optional[Tuple[ndarray, ndarray]]:
+        """
+        Next batch, waiting for it to arrive
+
+        Returns:
+            (Tuple[ndarray, ndarray] | None): uint8 channels and int64
+            timestamps, None once the server has closed
+        """
+        while not self._closed:
+            data = _recv_exactly(self._sock, BATCH_DTYPE.itemsize)
+            if data is None:
+                self._closed = True
+                return None
+            header = frombuffer(data, dtype=BATCH_DTYPE, count=1)[0]
+            size = int(header['size'])
+            payload = _recv_exactly(self._sock, size) if size > 0 else b''
+            if payload is None:
+                self._closed = True
+                return None
+
+            self._dropped_tags += int(header['dropped'])
+            count = int(header['count'])
+            sequence = int(header['sequence'])
+            self._lost_batches += sequence - self._next
+            if count == 0:
+                # Only reports the batches dropped before ``sequence``
+                self._next = sequence
+                continue
+            self._next = sequence + 1
+            self._sequence = sequence
+            self._error_flags = int(header['error_flags'])
+            self._received += 1
+
+            if header['encoding'] == ENCODED:
+                return decode_tags(payload)
+            timestamps = frombuffer(payload, dtype='<i8', count=count)
+            timestamps = timestamps.astype(int64, copy=False)
+            channels = frombuffer(
+                payload, dtype=uint8, count=count, offset=8 * count
+            )
+            return channels, timestamps
+        return None
+
+    def batches(self) -> Iterator[Tuple[ndarray, ndarray]]:
+        """
+        Yield every batch until the server closes
+
+        Yields:
+            Tuple[ndarray, ndarray]: (channels, timestamps)
+        """
+        while True:
+            batch = self.read()
+            if batch is None:
+                return
+            yield batch
+
+    def close(self):
+        """
+        Disconnect from the server
+        """
+        self._closed = True
+        self._sock.close()
@@ -0,0 +1,214 @@
+import os
+import cython
+from cython.parallel import prange
+from typing import List
+from numpy import (
+    ndarray,
+    zeros,
+    asarray,
+    ascontiguousarray,
+    uint8,
+    uint16,
+    int64,
+)
+
+# Smallest share of a batch worth handing to another thread
+MIN_CHUNK = 2**16
+
+# Error flags reported by read_error_flags, bit: (name, description)
+UQD_ERROR_FLAG = {
+    1: (
+        'DataOverflow',
+        'An overflow in the 512 k values SRAM FIFO has been detected. \
+        The time-tag generation rate is higher than the USB transmission rate.',
+    ),
+    2: ('NegFifoOverflow', 'Internal reason, should never occur'),
+    4: ('PosFifoOverflow', 'Internal reason, should never occur'),
+    8: (
+        'DoubleError',
+        'One input had two pulses within the coincidence window.',
+    ),
+    16: (
+        'InputFifoOverflow',
+        'More than 1024 successive tags were detected with a rate greater 100 MHz',
+    ),
+    32: (
+        '10MHzHardError',
+        'The 10 MHz input is not connected or connected to a wrong type of signal.',
+    ),
+    64: (
+        '10MHzSoftError',
+        'The 10 MHz input is connected, but the frequency is not 10 MHz.',
+    ),
+    128: ('OutFifoOverflow', 'Internal error, should never occur'),
+    256: (
+        'OutDoublePulse',
+        'An output pulse was generated, while another pulse was still present \
+        on the same output. The pulse length is too long for the given rate.',
+    ),
+    512: (
+        'OutTooLate',
+        'The internal processing was too slow. This is because the output \
+        event queue is too small for the given rate. Increase the value with \
+        SetOutputEventQueue()',
+    ),
+}
+
+_num_threads = max(1, int(os.environ.get('LOGICALLYUQD_NUM_THREADS', '1')))
+
+
+def set_num_threads(threads: int):
+    """
+    Set the number of threads the analysis kernels may use
+
+    Kernels split their work across channel pairs, coincidence windows or
+    chunks of a batch. Keep the default of 1 while acquiring, so the
+    analysis does not compete with the device reads, and raise it for
+    offline reprocessing. The default can also be set with the
+    ``LOGICALLYUQD_NUM_THREADS`` environment variable.
+
+    Args:
+        threads (int): number of threads, 0 for one per CPU
+    """
+    global _num_threads
+    if threads < 0:
+        raise ValueError('threads must be >= 0')
+    if threads == 0:
+        threads = os.cpu_count() or 1
+    _num_threads = threads
+
+
+def get_num_threads() -> int:
+    """
+    Number of threads the analysis kernels may use
+
+    Returns:
+        (int): threads set by :func:`set_num_threads`
+    """
+    return _num_threads
+
+
+def chunks(n: int) -> int:
+    """
+    Number of chunks to split ``n`` tags into
+
+    Args:
+        n (int): number of tags
+
+    Returns:
+        (int): between 1 and the number of threads, with no chunk smaller
+        than ``MIN_CHUNK`` tags
+    """
+    return max(1, min(_num_threads, n // MIN_CHUNK))
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _unpack_bits(
+    values: cython.const[cython.ulonglong][::1],
+    bits: cython.int,
+    reverse: cython.bint,
+    weighted: cython.bint,
+    out: cython.ushort[:, ::1],
+    threads: cython.int,
+) -> cython.void:
+    # out[i, b] is bit b of values[i], counted from the end if reversed, as
+    # 1 or as its value 2**b if weighted
+    i: cython.Py_ssize_t
+    b: cython.int
+    column: cython.int
+    for i in prange(values.shape[0], num_threads=threads):
+        for b in range(bits):
+            column = (bits - 1 - b) if reverse else b
+            if (values[i] >> b) & 1:
+                out[i, column] = (1 << b) if weighted else 1
+            else:
+                out[i, column] = 0
+
+
+def errors_from_bit_sets(bit_sets) -> ndarray:
+    """
+    ``error_from_bit_set`` for an array of error flag sets
+
+    Args:
+        bit_sets (ndarray): error flags as returned by ``read_error_flags``
+
+    Returns:
+        (ndarray): uint16 array of shape (n, 16), row ``i`` holding
+        ``error_from_bit_set(bit_sets[i])``
+    """
+    values = ascontiguousarray(bit_sets, dtype=int64).reshape(-1)
+    out = zeros((values.shape[0], 16), dtype=uint16)
+    _unpack_bits(values.view('u8'), 16, True, True, out, _num_threads)
+    return out
+
+
+@cython.ccall
+def pattern_from_channels(input_channels: List[int]) -> int:
+    """
+    Calculate a bitmask for TCSPC device based on input channels.
+
+    Args:
+        input_channels: List of integers representing channel numbers
+
+    Returns:
+        Integer representing the pattern (bitmask) where each bit corresponds
+            to an input channel
+    """
+    pattern = 0
+
+    for channel in input_channels:
+        # Set the bit at position (channel-1)
+        # For example: channel 1 sets bit 0, channel 2 sets bit 1, etc.
+        pattern |= 1 << (channel - 1)
+
+    return pattern
+
+
+def channels_from_patterns(patterns, number_of_channels: int = 16) -> ndarray:
+    """
+    Channels set in each of an array of patterns
+
+    The inverse of ``pattern_from_channels`` for many patterns, e.g. the
+    indices of ``CoincidenceCounter.counts`` or of a logic mode pattern
+    list.
+
+    Args:
+        patterns (ndarray): bitmasks with bit ``i`` for channel ``i + 1``
+        number_of_channels (int): number of bits to unpack
+
+    Returns:
+        (ndarray): uint8 array of shape (n, number_of_channels), 1 where
+        channel ``c + 1`` is in the pattern
+    """
+    if (number_of_channels < 1) or (number_of_channels > 64):
+        raise ValueError('number_of_channels must be between 1 and 64')
+    values = ascontiguousarray(patterns, dtype=int64).reshape(-1)
+    out = zeros((values.shape[0], number_of_channels), dtype=uint16)
+    _unpack_bits(
+        values.view('u8'), number_of_channels, False, False, out, _num_threads
+    )
+    return out.astype(uint8)
+
+
+def patterns_from_channels(selected) -> ndarray:
+    """
+    ``pattern_from_channels`` for many channel selections at once
+
+    Args:
+        selected (ndarray): array of shape (n, number_of_channels), non
+            zero where channel ``c + 1`` is part of the pattern
+
+    Returns:
+        (ndarray): int64 pattern of each row
+    """
+    selected = asarray(selected) != 0
+    if selected.ndim != 2:
+        raise ValueError('selected must be two dimensional')
+    if selected.shape[1] > 63:
+        raise ValueError('At most 63 channels fit in a pattern')
+    weights = asarray([1 << c for c in range(selected.shape[1])], dtype=int64)
+    return selected.astype(int64) @ weights
@@ -0,0 +1,568 @@
+from __future__ import annotations
+
+import cython
+import time
+from cython.parallel import prange
+from typing import Optional, Sequence, Tuple
+from numpy import (
+    ndarray,
+    zeros,
+    empty,
+    arange,
+    asarray,
+    concatenate,
+    argsort,
+    cumsum,
+    searchsorted,
+    uint8,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+from ._telemetry import Telemetry
+from ._parallel import chunks
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _filter(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    keep: cython.const[cython.uchar][::1],
+    delays: cython.const[cython.longlong][::1],
+    channels_out: cython.uchar[::1],
+    timestamps_out: cython.longlong[::1],
+) -> cython.Py_ssize_t:
+    # Copy the tags of the kept channels with their delay added, returning
+    # the number written
+    i: cython.Py_ssize_t
+    kept: cython.Py_ssize_t = 0
+    c: cython.uchar
+    for i in range(timestamps.shape[0]):
+        c = channels[i]
+        if keep[c]:
+            channels_out[kept] = c
+            timestamps_out[kept] = timestamps[i] + delays[c]
+            kept += 1
+    return kept
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _count_kept(
+    channels: cython.const[cython.uchar][::1],
+    keep: cython.const[cython.uchar][::1],
+    bounds: cython.const[cython.longlong][::1],
+    kept: cython.longlong[::1],
+) -> cython.void:
+    # Number of tags kept from each chunk bounds[j]:bounds[j + 1]
+    j: cython.Py_ssize_t
+    i: cython.Py_ssize_t
+    k: cython.Py_ssize_t = bounds.shape[0] - 1
+    for j in prange(k, nogil=True, num_threads=k):
+        for i in range(bounds[j], bounds[j + 1]):
+            kept[j] += keep[channels[i]]
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.exceptval(check=False)
+def _filter_chunks(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    keep: cython.const[cython.uchar][::1],
+    delays: cython.const[cython.longlong][::1],
+    bounds: cython.const[cython.longlong][::1],
+    starts: cython.const[cython.longlong][::1],
+    channels_out: cython.uchar[::1],
+    timestamps_out: cython.longlong[::1],
+) -> cython.void:
+    # _filter of each chunk in parallel, chunk j writing from starts[j]
+    j: cython.Py_ssize_t
+    k: cython.Py_ssize_t = bounds.shape[0] - 1
+    for j in prange(k, nogil=True, num_threads=k):
+        _filter(
+            channels[bounds[j] : bounds[j + 1]],
+            timestamps[bounds[j] : bounds[j + 1]],
+            keep,
+            delays,
+            channels_out[starts[j] : starts[j + 1]],
+            timestamps_out[starts[j] : starts[j + 1]],
+        )
+
+
+@cython.cclass
+class TagFilter:
+    """
+    Select channels and shift their timestamps in one pass.
+
+    Tags of the selected channels are copied with their channel's delay
+    added into buffers owned by the filter, so a filter costs no allocation
+    once the buffers have grown to the batch size. Large batches are split
+    into chunks filtered by separate threads, see ``set_num_threads``. The
+    arrays returned by :meth:`process` are views of those buffers, valid
+    until the next call.
+
+    Delays can reorder the tags, so with delays the tags after the last
+    timestamp of the batch are held back and returned, in order, with the
+    next batch or by :meth:`flush`. Only relative delays matter, negative
+    delays are shifted so the smallest is zero.
+
+    Args:
+        channels (Sequence[int], optional): channels to keep, by default
+            every channel
+        delays (Sequence[int], optional): delay in bins added to each
+            channel, indexed from channel 0
+    """
+
+    _keep: ndarray
+    _delays: ndarray
+    _has_delays: cython.bint
+    _channels_out: ndarray
+    _timestamps_out: ndarray
+    _carry_channels: ndarray
+    _carry_timestamps: ndarray
+
+    def __init__(
+        self,
+        channels: Optional[Sequence[int]] = None,
+        delays: Optional[Sequence[int]] = None,
+    ):
+        self._keep = zeros(256, dtype=uint8)
+        if channels is None:
+            self._keep[:] = 1
+        else:
+            selected = asarray(channels, dtype=int64).reshape(-1)
+            if ((selected < 0) | (selected > 255)).any():
+                raise ValueError('channels must be in range 0 <= channel < 256')
+            self._keep[selected] = 1
+
+        self._delays = zeros(256, dtype=int64)
+        if (delays is not None) and (len(delays) > 0):
+            delays = asarray(delays, dtype=int64).reshape(-1)
+            if delays.shape[0] > 256:
+                raise ValueError('delays must have at most 256 entries')
+            # Keeping them >= 0 means a tag can never move ahead of the last
+            # raw timestamp seen
+            self._delays[: delays.shape[0]] = delays - min(delays.min(), 0)
+        self._has_delays = bool(self._delays.any())
+
+        self._channels_out = empty(0, dtype=uint8)
+        self._timestamps_out = empty(0, dtype=int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Drop the tags held back by delays
+        """
+        self._carry_channels = zeros(0, dtype=uint8)
+        self._carry_timestamps = zeros(0, dtype=int64)
+
+    @property
+    def channels(self) -> list:
+        """
+        Channels kept
+
+        Returns:
+            (List[int]): selected channels
+        """
+        return [int(c) for c in self._keep.nonzero()[0]]
+
+    @property
+    def delays(self) -> ndarray:
+        """
+        Delay added to each channel
+
+        Returns:
+            (ndarray): int64 delay in bins for all 256 channels
+        """
+        return self._delays.copy()
+
+    def then(self, other: TagFilter) -> TagFilter:
+        """
+        One filter doing this filter's work and then the other's
+
+        Args:
+            other (TagFilter): filter applied after this one
+
+        Returns:
+            (TagFilter): filter keeping the channels both keep, with the
+            sum of both delays
+        """
+        channels = set(self.channels) & set(other.channels)
+        return TagFilter(sorted(channels), self.delays + other.delays)
+
+    @cython.ccall
+    def process(self, channels, timestamps) -> Tuple[ndarray, ndarray]:
+        """
+        Filter a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+
+        Returns:
+            (Tuple[ndarray, ndarray]): uint8 channels and int64 timestamps
+            of the tags kept, valid until the next call
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+
+        if n > self._timestamps_out.shape[0]:
+            size = max(n, 2 * self._timestamps_out.shape[0])
+            self._channels_out = empty(size, dtype=uint8)
+            self._timestamps_out = empty(size, dtype=int64)
+        kept: cython.Py_ssize_t
+        k = chunks(n)
+        if k == 1:
+            kept = _filter(
+                channels,
+                timestamps,
+                self._keep,
+                self._delays,
+                self._channels_out,
+                self._timestamps_out,
+            )
+        else:
+            bounds = arange(k + 1, dtype=int64) * n // k
+            counts = zeros(k, dtype=int64)
+            _count_kept(channels, self._keep, bounds, counts)
+            starts = zeros(k + 1, dtype=int64)
+            cumsum(counts, out=starts[1:])
+            _filter_chunks(
+                channels,
+                timestamps,
+                self._keep,
+                self._delays,
+                bounds,
+                starts,
+                self._channels_out,
+                self._timestamps_out,
+            )
+            kept = starts[k]
+        channels_out = self._channels_out[:kept]
+        timestamps_out = self._timestamps_out[:kept]
+        if (not self._has_delays) or (n == 0):
+            return channels_out, timestamps_out
+
+        if self._carry_timestamps.shape[0] > 0:
+            channels_out = concatenate((self._carry_channels, channels_out))
+            timestamps_out = concatenate((
+                self._carry_timestamps,
+                timestamps_out,
+            ))
+        # The stream is sorted per channel, so this is close to linear
+        order = argsort(timestamps_out, kind='stable')
+        channels_out = channels_out[order]
+        timestamps_out = timestamps_out[order]
+
+        cut = searchsorted(timestamps_out, timestamps[n - 1], side='right')
+        self._carry_channels = channels_out[cut:]
+        self._carry_timestamps = timestamps_out[cut:]
+        return channels_out[:cut], timestamps_out[:cut]
+
+    def flush(self) -> Tuple[ndarray, ndarray]:
+        """
+        Tags held back by delays, after the final batch
+
+        Returns:
+            (Tuple[ndarray, ndarray]): uint8 channels and int64 timestamps
+        """
+        channels = self._carry_channels
+        timestamps = self._carry_timestamps
+        self.reset()
+        return channels, timestamps
+
+
+class _Stage:
+    # A stage with the name its timings are recorded under. Transforms
+    # return the tags passed on, sinks return None.
+
+    def __init__(self, name: str, stage):
+        self.name = name
+        self.stage = stage
+        if hasattr(stage, 'process'):
+            self.call = stage.process
+        elif hasattr(stage, 'write'):
+            self.call = stage.write
+        elif callable(stage):
+            self.call = stage
+        else:
+            raise TypeError(
+                f'{stage!r} has no process or write method and is not callable'
+            )
+
+    def flush(self):
+        flush = getattr(self.stage, 'flush', None)
+        if flush is None:
+            return None
+        return flush()
+
+
+def _is_batch(result) -> bool:
+    return (
+        isinstance(result, tuple)
+        and (len(result) == 2)
+        and isinstance(result[0], ndarray)
+        and isinstance(result[1], ndarray)
+    )
+
+
+class Pipeline:
+    """
+    A chain of stages run over every batch of tags.
+
+    Stages are given once and each batch is passed through them in order.
+    A stage is any object with a ``process(channels, timestamps)`` or
+    ``write(channels, timestamps)`` method, or such a callable. Stages
+    returning ``(channels, timestamps)``, such as :class:`TagFilter`,
+    :class:`HeraldedGate` or another pipeline, replace the tags seen by the
+    stages after them. The others, such as :class:`CoincidenceCounter`,
+    :class:`Correlator`, :class:`RateBinner` or :class:`TagRecorder`, only
+    consume them.
+
+    Adjacent :class:`TagFilter` stages are fused into one, so selecting
+    channels and shifting delays costs a single pass over the batch. The
+    time spent in each stage is recorded in :attr:`telemetry` under the
+    stage's name, as is every read made by :meth:`run`.
+
+    Args:
+        stages (Sequence): stages in the order they are run
+        names (Sequence[str], optional): name of each stage in the
+            timings, by default its position and class name
+    """
+
+    def __init__(self, stages: Sequence, names: Optional[Sequence[str]] = None):
+        stages = list(stages)
+        if names is None:
+            names = [
+                f'{i}:{type(stage).__name__}' for i, stage in enumerate(stages)
+            ]
+        names = list(names)
+        if len(names) != len(stages):
+            raise ValueError('names must have one entry per stage')
+
+        fused = []
+        for name, stage in zip(names, stages):
+            if (
+                isinstance(stage, TagFilter)
+                and (len(fused) > 0)
+                and isinstance(fused[-1].stage, TagFilter)
+            ):
+                fused[-1] = _Stage(
+                    f'{fused[-1].name}+{name}', fused[-1].stage.then(stage)
+                )
+            else:
+                fused.append(_Stage(name, stage))
+        self._stages = fused
+        self._telemetry = Telemetry()
+        self._batches = 0
+        self._tags = 0
+
+    @property
+    def stages(self) -> list:
+        """
+        Stages as run, after fusing
+
+        Returns:
+            (list): stage objects
+        """
+        return [s.stage for s in self._stages]
+
+    @property
+    def names(self) -> list:
+        """
+        Name of each stage as run
+
+        Returns:
+            (List[str]): names used in the timings
+        """
+        return [s.name for s in self._stages]
+
+    @property
+    def telemetry(self) -> Telemetry:
+        """
+        Time spent in each stage and reads made by :meth:`run`
+
+        Returns:
+            (Telemetry): stage times are recorded as calls by stage name
+        """
+        return self._telemetry
+
+    @property
+    def batches(self) -> int:
+        """
+        Number of batches processed
+
+        Returns:
+            (int): calls to :meth:`process`
+        """
+        return self._batches
+
+    @property
+    def tags(self) -> int:
+        """
+        Number of tags processed
+
+        Returns:
+            (int): tags given to :meth:`process`
+        """
+        return self._tags
+
+    def timings(self) -> dict:
+        """
+        Summary of the time spent in each stage
+
+        Returns:
+            (dict): :meth:`LogHistogram.summary` in nanoseconds per call, by
+            stage name, for the stages that have run
+        """
+        timings = {}
+        for stage in self._stages:
+            try:
+                histogram = self._telemetry.histogram(stage.name)
+            except KeyError:
+                continue
+            timings[stage.name] = histogram.summary()
+        return timings
+
+    def _run_stages(self, first: int, channels, timestamps):
+        telemetry = self._telemetry
+        for stage in self._stages[first:]:
+            start = time.perf_counter_ns()
+            result = stage.call(channels, timestamps)
+            telemetry.record_call(stage.name, time.perf_counter_ns() - start)
+            if _is_batch(result):
+                channels, timestamps = result
+        return channels, timestamps
+
+    def process(self, channels, timestamps) -> Tuple[ndarray, ndarray]:
+        """
+        Run a batch of tags, as returned by ``read_tags``, through every
+        stage
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+
+        Returns:
+            (Tuple[ndarray, ndarray]): tags left after the last stage that
+            passes tags on, possibly views only valid until the next call
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        if channels.shape[0] != timestamps.shape[0]:
+            raise ValueError('channels and timestamps must be the same length')
+        self._batches += 1
+        self._tags += timestamps.shape[0]
+        return self._run_stages(0, channels, timestamps)
+
+    def flush(self) -> Tuple[ndarray, ndarray]:
+        """
+        Flush every stage after the final batch
+
+        Tags a stage held back are run through the stages after it, then
+        stages with a ``flush`` method, such as :class:`CoincidenceCounter`
+        or :class:`TagRecorder`, are flushed in order.
+
+        Returns:
+            (Tuple[ndarray, ndarray]): tags left after the last stage that
+            passes tags on
+        """
+        channels = [zeros(0, dtype=uint8)]
+        timestamps = [zeros(0, dtype=int64)]
+        for i, stage in enumerate(self._stages):
+            result = stage.flush()
+            if _is_batch(result) and (result[1].shape[0] > 0):
+                # Later stages see the held back tags before being flushed,
+                # copied as they may be views of a later filter's buffers
+                c, t = self._run_stages(i + 1, result[0], result[1])
+                channels.append(c.copy())
+                timestamps.append(t.copy())
+        if len(timestamps) == 1:
+            return channels[0], timestamps[0]
+        # Each flushing stage holds back the latest tags it saw, so the
+        # batches overlap in time
+        channels = concatenate(channels)
+        timestamps = concatenate(timestamps)
+        order = argsort(timestamps, kind='stable')
+        return channels[order], timestamps[order]
+
+    def run(
+        self,
+        source,
+        duration: Optional[float] = None,
+        max_batches: Optional[int] = None,
+        stop=None,
+        poll_interval: float = 1e-3,
+        flush: bool = True,
+    ) -> int:
+        """
+        Run every batch of a source through the stages
+
+        ``source`` is a device with ``read_tags``, such as ``UQDLogic16`` or
+        ``SimulatedUQDLogic16``, a :class:`TagReader` or any iterable of
+        (channels, timestamps) batches. Devices are read until ``duration``,
+        ``max_batches`` or ``stop`` ends the run, the others, and simulated
+        devices replaying a recording, until they are exhausted.
+
+        Args:
+            source: device, recording or iterable of batches
+            duration (float, optional): seconds to run for
+            max_batches (int, optional): batches to process
+            stop (threading.Event, optional): event ending the run
+            poll_interval (float): time to wait after an empty device read
+                in seconds
+            flush (bool): call :meth:`flush` at the end
+
+        Returns:
+            (int): number of tags processed
+        """
+        if hasattr(source, 'read_tags'):
+            batches = self._device_batches(source, poll_interval)
+        elif hasattr(source, 'batches'):
+            batches = source.batches()
+        else:
+            batches = iter(source)
+
+        end = None if duration is None else time.monotonic() + duration
+        processed = 0
+        tags = 0
+        for channels, timestamps in batches:
+            if timestamps.shape[0] > 0:
+                tags += timestamps.shape[0]
+                self.process(channels, timestamps)
+                processed += 1
+            if (max_batches is not None) and (processed >= max_batches):
+                break
+            if (end is not None) and (time.monotonic() >= end):
+                break
+            if (stop is not None) and stop.is_set():
+                break
+        if flush:
+            self.flush()
+        return tags
+
+    def _device_batches(self, uqd_logic16, poll_interval: float):
+        telemetry = self._telemetry
+        while True:
+            start = time.perf_counter_ns()
+            count, channels, timestamps = uqd_logic16.read_tags()
+            telemetry.record_read(count, start, time.perf_counter_ns())
+            if count > 0:
+                yield channels[:count], timestamps[:count]
+            elif getattr(uqd_logic16, 'exhausted', False):
+                return
+            else:
+                time.sleep(poll_interval)
+                # Lets the run end while no tags arrive
+                yield channels[:0], timestamps[:0]
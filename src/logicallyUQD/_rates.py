@@ -0,0 +1,440 @@
+import cython
+from typing import Tuple
+from numpy import ndarray, zeros, arange, int64
+
+from ._tags import as_channels, as_timestamps
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _emit(
+    level: cython.int,
+    rings: cython.longlong[:, :, ::1],
+    accumulators: cython.longlong[:, ::1],
+    accumulated: cython.longlong[::1],
+    written: cython.longlong[::1],
+    decimation: cython.longlong,
+) -> cython.void:
+    # Push the accumulator of a level as its next bin, adding it to the
+    # accumulator of the level above, which completes every decimation bins
+    c: cython.Py_ssize_t
+    column: cython.Py_ssize_t
+    levels: cython.int = rings.shape[0]
+    channels: cython.Py_ssize_t = rings.shape[1]
+    while True:
+        column = written[level] % rings.shape[2]
+        for c in range(channels):
+            rings[level, c, column] = accumulators[level, c]
+        written[level] += 1
+
+        if level + 1 < levels:
+            for c in range(channels):
+                accumulators[level + 1, c] += accumulators[level, c]
+            accumulated[level + 1] += 1
+        for c in range(channels):
+            accumulators[level, c] = 0
+
+        if (level + 1 >= levels) or (accumulated[level + 1] < decimation):
+            return
+        accumulated[level + 1] = 0
+        level += 1
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _emit_empty(
+    count: cython.longlong,
+    rings: cython.longlong[:, :, ::1],
+    accumulators: cython.longlong[:, ::1],
+    accumulated: cython.longlong[::1],
+    written: cython.longlong[::1],
+    decimation: cython.longlong,
+) -> cython.void:
+    # Push count empty level 0 bins, costing at most one pass over each ring
+    # however long the gap. The level 0 accumulator must be empty.
+    level: cython.int = 0
+    levels: cython.int = rings.shape[0]
+    capacity: cython.longlong = rings.shape[2]
+    c: cython.Py_ssize_t
+    j: cython.longlong
+    column: cython.Py_ssize_t
+    needed: cython.longlong
+
+    while count > 0:
+        for j in range(
+            written[level] + max(count - capacity, 0), written[level] + count
+        ):
+            column = j % capacity
+            for c in range(rings.shape[1]):
+                rings[level, c, column] = 0
+        written[level] += count
+
+        if level + 1 >= levels:
+            return
+        needed = decimation - accumulated[level + 1]
+        if count < needed:
+            accumulated[level + 1] += count
+            return
+        # The first empty bins complete the partly accumulated bin above,
+        # every further decimation of them is an empty bin above
+        accumulated[level + 1] = 0
+        _emit(level + 1, rings, accumulators, accumulated, written, decimation)
+        count -= needed
+        accumulated[level + 1] = count % decimation
+        count //= decimation
+        level += 1
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _close_bins(
+    target: cython.longlong,
+    current: cython.longlong,
+    rings: cython.longlong[:, :, ::1],
+    accumulators: cython.longlong[:, ::1],
+    accumulated: cython.longlong[::1],
+    written: cython.longlong[::1],
+    decimation: cython.longlong,
+) -> cython.void:
+    # Complete the current bin and every empty bin before target
+    _emit(0, rings, accumulators, accumulated, written, decimation)
+    _emit_empty(
+        target - current - 1,
+        rings,
+        accumulators,
+        accumulated,
+        written,
+        decimation,
+    )
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _bin_tags(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    number_of_channels: cython.int,
+    bin_width: cython.longlong,
+    current: cython.longlong,
+    rings: cython.longlong[:, :, ::1],
+    accumulators: cython.longlong[:, ::1],
+    accumulated: cython.longlong[::1],
+    written: cython.longlong[::1],
+    decimation: cython.longlong,
+) -> cython.longlong:
+    # Returns the index of the bin still open after the batch. Tags before
+    # the open bin are counted in it.
+    i: cython.Py_ssize_t
+    t: cython.longlong
+    k: cython.longlong
+    end: cython.longlong = (current + 1) * bin_width
+    for i in range(timestamps.shape[0]):
+        t = timestamps[i]
+        if t >= end:
+            k = t // bin_width
+            _close_bins(
+                k,
+                current,
+                rings,
+                accumulators,
+                accumulated,
+                written,
+                decimation,
+            )
+            current = k
+            end = (current + 1) * bin_width
+        if channels[i] < number_of_channels:
+            accumulators[0, channels[i]] += 1
+    return current
+
+
+@cython.cclass
+class RateBinner:
+    """
+    Per channel count rate traces from a stream of tag batches.
+
+    Tags are counted in bins of ``bin_width`` aligned to the bin holding the
+    first tag. A bin is open until a tag at or after its end arrives, or
+    :meth:`advance` is called past its end, so bins spanning two batches are
+    counted whole. Completed bins go to a ring buffer holding the last
+    ``capacity`` bins of every channel.
+
+    With ``levels`` above one, every ``decimation`` bins of a level are
+    summed into one bin of the next level, each level with its own ring, so a
+    display can show seconds at level 0 and hours at the coarsest level
+    without rebinning. Long gaps without tags cost at most one pass over each
+    ring.
+
+    Args:
+        bin_width (int): bin width in bins of ``UQDLogic16.resolution``
+        number_of_channels (int): number of channels to count, tags of
+            higher channels are ignored
+        capacity (int): number of bins kept at each level
+        levels (int): number of decimation levels
+        decimation (int): level 0 bins in a bin of the next level
+    """
+
+    _bin_width: cython.longlong
+    _number_of_channels: cython.int
+    _decimation: cython.longlong
+    _rings: ndarray
+    _accumulators: ndarray
+    _accumulated: ndarray
+    _written: ndarray
+    _origin: cython.longlong
+    _current: cython.longlong
+    _started: cython.bint
+
+    def __init__(
+        self,
+        bin_width: int,
+        number_of_channels: int = 16,
+        capacity: int = 4096,
+        levels: int = 1,
+        decimation: int = 10,
+    ):
+        if bin_width < 1:
+            raise ValueError('bin_width must be >= 1')
+        if (number_of_channels < 1) or (number_of_channels > 256):
+            raise ValueError('number_of_channels must be between 1 and 256')
+        if capacity < 1:
+            raise ValueError('capacity must be >= 1')
+        if levels < 1:
+            raise ValueError('levels must be >= 1')
+        if decimation < 2:
+            raise ValueError('decimation must be >= 2')
+
+        self._bin_width = bin_width
+        self._number_of_channels = number_of_channels
+        self._decimation = decimation
+        self._rings = zeros((levels, number_of_channels, capacity), dtype=int64)
+        self._accumulators = zeros((levels, number_of_channels), dtype=int64)
+        self._accumulated = zeros(levels, dtype=int64)
+        self._written = zeros(levels, dtype=int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Remove every bin and forget the time origin
+        """
+        self._rings[:] = 0
+        self._accumulators[:] = 0
+        self._accumulated[:] = 0
+        self._written[:] = 0
+        self._origin = 0
+        self._current = 0
+        self._started = False
+
+    @property
+    def bin_width(self) -> int:
+        """
+        Width of a level 0 bin
+
+        Returns:
+            (int): bin width in bins
+        """
+        return self._bin_width
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of channels counted
+
+        Returns:
+            (int): number of channels
+        """
+        return self._number_of_channels
+
+    @property
+    def capacity(self) -> int:
+        """
+        Number of bins kept at each level
+
+        Returns:
+            (int): capacity of the rings
+        """
+        return self._rings.shape[2]
+
+    @property
+    def levels(self) -> int:
+        """
+        Number of decimation levels
+
+        Returns:
+            (int): levels
+        """
+        return self._rings.shape[0]
+
+    @property
+    def decimation(self) -> int:
+        """
+        Bins of a level summed into one bin of the next
+
+        Returns:
+            (int): decimation factor
+        """
+        return self._decimation
+
+    @property
+    def partial(self) -> ndarray:
+        """
+        Counts of the bin still open
+
+        Returns:
+            (ndarray): int64 count of each channel
+        """
+        return self._accumulators[0].copy()
+
+    def level_width(self, level: int = 0) -> int:
+        """
+        Width of the bins of a level
+
+        Args:
+            level (int): decimation level
+
+        Returns:
+            (int): bin width in bins
+        """
+        self._check_level(level)
+        return self._bin_width * self._decimation**level
+
+    def bins(self, level: int = 0) -> int:
+        """
+        Number of bins completed at a level, including those no longer kept
+
+        Args:
+            level (int): decimation level
+
+        Returns:
+            (int): completed bins
+        """
+        self._check_level(level)
+        return int(self._written[level])
+
+    def _check_level(self, level: int):
+        if (level < 0) or (level >= self._rings.shape[0]):
+            raise ValueError(
+                f'level must be in range 0 <= level < {self._rings.shape[0]}'
+            )
+
+    @cython.ccall
+    def process(self, channels, timestamps):
+        """
+        Add a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+        if n == 0:
+            return
+
+        if not self._started:
+            self._current = timestamps[0] // self._bin_width
+            self._origin = self._current
+            self._started = True
+
+        self._current = _bin_tags(
+            channels,
+            timestamps,
+            self._number_of_channels,
+            self._bin_width,
+            self._current,
+            self._rings,
+            self._accumulators,
+            self._accumulated,
+            self._written,
+            self._decimation,
+        )
+
+    @cython.ccall
+    def advance(self, time: cython.longlong):
+        """
+        Complete every bin ending at or before ``time``
+
+        Lets bins close while no tags arrive, for example with the time of
+        the device read from ``LogicMode.get_time_counter``.
+
+        Args:
+            time (int): time in bins up to which every tag has been processed
+        """
+        if not self._started:
+            return
+        k: cython.longlong = time // self._bin_width
+        if k > self._current:
+            _close_bins(
+                k,
+                self._current,
+                self._rings,
+                self._accumulators,
+                self._accumulated,
+                self._written,
+                self._decimation,
+            )
+            self._current = k
+
+    def trace(
+        self, level: int = 0, max_bins: int = -1
+    ) -> Tuple[ndarray, ndarray]:
+        """
+        Most recent completed bins of a level, oldest first
+
+        Args:
+            level (int): decimation level
+            max_bins (int): number of bins to return, -1 for every bin kept
+
+        Returns:
+            (Tuple[ndarray, ndarray]): (times, counts), the start of each bin
+            in bins and the int64 counts of shape (channels, bins)
+        """
+        self._check_level(level)
+        capacity = self._rings.shape[2]
+        written = int(self._written[level])
+        count = min(written, capacity)
+        if max_bins >= 0:
+            count = min(count, max_bins)
+
+        columns = arange(written - count, written, dtype=int64)
+        width = self.level_width(level)
+        times = self._origin * self._bin_width + columns * width
+        return times, self._rings[level][:, columns % capacity]
+
+    def rates(
+        self, resolution: float, level: int = 0, max_bins: int = -1
+    ) -> Tuple[ndarray, ndarray]:
+        """
+        Most recent completed bins of a level as count rates
+
+        Args:
+            resolution (float): seconds per bin, ``UQDLogic16.resolution``
+            level (int): decimation level
+            max_bins (int): number of bins to return, -1 for every bin kept
+
+        Returns:
+            (Tuple[ndarray, ndarray]): (times, rates), the start of each bin
+            in seconds and the float64 rates in Hz of shape (channels, bins)
+        """
+        times, counts = self.trace(level, max_bins)
+        width = self.level_width(level) * resolution
+        return times * resolution, counts / width
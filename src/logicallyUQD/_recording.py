@@ -0,0 +1,515 @@
+import json
+import time
+from contextlib import ExitStack
+from typing import Iterator, Optional, Sequence, Tuple
+from numpy import (
+    ndarray,
+    dtype,
+    zeros,
+    empty,
+    memmap,
+    frombuffer,
+    concatenate,
+    searchsorted,
+    asarray,
+    uint8,
+    int64,
+)
+
+from ._tags import as_channels, as_timestamps
+
+# File layout, all values little endian:
+#
+#   header  MAGIC, u32 version, u32 metadata length, JSON metadata, padding
+#   chunk   CHUNK_DTYPE, int64 timestamps[count], uint8 channels[count],
+#           padding (repeated)
+#   index   INDEX_MAGIC, u64 entries, INDEX_DTYPE[entries]
+#   footer  END_MAGIC, u64 offset of the index
+#
+# Every section starts on an 8 byte boundary so the columns can be mapped
+# directly. The index and footer are written by TagRecorder.close(), if they
+# are missing the reader rebuilds the index from the chunk headers.
+
+MAGIC = b'UQDTAGS\x00'
+VERSION = 1
+CHUNK_MAGIC = b'CHNK'
+INDEX_MAGIC = b'INDX\x00\x00\x00\x00'
+END_MAGIC = b'UQDEND\x00\x00'
+
+CHUNK_DTYPE = dtype([
+    ('magic', 'S4'),
+    ('reserved', '<u4'),
+    ('count', '<u8'),
+    ('first', '<i8'),
+    ('last', '<i8'),
+])
+
+INDEX_DTYPE = dtype([
+    ('offset', '<u8'),
+    ('count', '<u8'),
+    ('first', '<i8'),
+    ('last', '<i8'),
+    ('start', '<u8'),
+])
+
+
+def _padding(length: int) -> int:
+    return -length % 8
+
+
+class TagRecorder:
+    """
+    Append timetag batches to a chunked binary file.
+
+    Batches are gathered into chunks of ``chunk_size`` tags, each written as
+    a timestamp column followed by a channel column. The header stores the
+    device's resolution, channel count and thresholds, and every chunk's time
+    range is added to a sparse index written on :meth:`close`, which
+    :class:`TagReader` uses to seek by time.
+
+    Args:
+        path (str): file to create, an existing file is overwritten
+        resolution (float): timestamp resolution of the device
+        number_of_channels (int): number of input channels
+        thresholds (Sequence[float], optional): input threshold of each
+            channel
+        metadata (dict, optional): extra JSON serialisable values to store
+        chunk_size (int): number of tags per chunk
+    """
+
+    def __init__(
+        self,
+        path: str,
+        resolution: float,
+        number_of_channels: int,
+        thresholds: Optional[Sequence[float]] = None,
+        metadata: Optional[dict] = None,
+        chunk_size: int = 2**20,
+    ):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be >= 1')
+
+        self._path = path
+        self._chunk_size = chunk_size
+        self._channels = empty(chunk_size, dtype=uint8)
+        self._timestamps = empty(chunk_size, dtype=int64)
+        self._pending = 0
+        self._count = 0
+        self._index = []
+
+        self._metadata = {
+            'resolution': float(resolution),
+            'number_of_channels': int(number_of_channels),
+            'thresholds': (
+                None if thresholds is None else [float(t) for t in thresholds]
+            ),
+            'created': time.time(),
+            'metadata': metadata if metadata is not None else {},
+        }
+        encoded = json.dumps(self._metadata).encode('utf-8')
+
+        # The file stays open until close(), it is only closed here if the
+        # header cannot be written
+        with ExitStack() as stack:
+            self._file = stack.enter_context(open(path, 'wb'))
+            self._file.write(MAGIC)
+            self._file.write(asarray([VERSION, len(encoded)], dtype='<u4'))
+            self._file.write(encoded)
+            self._file.write(bytes(_padding(len(encoded))))
+            stack.pop_all()
+
+    @classmethod
+    def for_device(cls, path: str, uqd_logic16, **kwargs) -> 'TagRecorder':
+        """
+        Create a recorder with the header filled in from a device
+
+        Args:
+            path (str): file to create
+            uqd_logic16 (UQDLogic16): device the tags are read from
+            **kwargs: passed on to :class:`TagRecorder`
+
+        Returns:
+            (TagRecorder): open recorder
+        """
+        return cls(
+            path,
+            uqd_logic16.resolution,
+            uqd_logic16.number_of_channels,
+            thresholds=list(uqd_logic16.input_threshold),
+            **kwargs,
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def path(self) -> str:
+        """
+        File being written
+
+        Returns:
+            (str): path of the recording
+        """
+        return self._path
+
+    @property
+    def count(self) -> int:
+        """
+        Number of tags recorded, including those not yet flushed
+
+        Returns:
+            (int): total tags
+        """
+        return self._count + self._pending
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether the recording has been finalised
+
+        Returns:
+            (bool): True after :meth:`close`
+        """
+        return self._file.closed
+
+    def write(self, channels, timestamps):
+        """
+        Append a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag, in increasing order
+        """
+        if self._file.closed:
+            raise ValueError('Recording is closed')
+
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+
+        done = 0
+        while done < n:
+            take = min(n - done, self._chunk_size - self._pending)
+            end = self._pending + take
+            self._channels[self._pending : end] = channels[done : done + take]
+            self._timestamps[self._pending : end] = timestamps[
+                done : done + take
+            ]
+            self._pending = end
+            done += take
+            if self._pending == self._chunk_size:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        n = self._pending
+        if n == 0:
+            return
+
+        header = zeros(1, dtype=CHUNK_DTYPE)
+        header['magic'] = CHUNK_MAGIC
+        header['count'] = n
+        header['first'] = self._timestamps[0]
+        header['last'] = self._timestamps[n - 1]
+
+        offset = self._file.tell()
+        self._file.write(header)
+        self._file.write(self._timestamps[:n].astype('<i8', copy=False))
+        self._file.write(self._channels[:n])
+        self._file.write(bytes(_padding(n)))
+
+        self._index.append((
+            offset,
+            n,
+            self._timestamps[0],
+            self._timestamps[n - 1],
+            self._count,
+        ))
+        self._count += n
+        self._pending = 0
+
+    def flush(self):
+        """
+        Write any buffered tags as a (possibly short) chunk
+        """
+        self._write_chunk()
+        self._file.flush()
+
+    def close(self):
+        """
+        Flush buffered tags and write the index, finalising the file
+        """
+        if self._file.closed:
+            return
+
+        self._write_chunk()
+        index = asarray(self._index, dtype=INDEX_DTYPE)
+        offset = self._file.tell()
+        self._file.write(INDEX_MAGIC)
+        self._file.write(asarray([index.shape[0]], dtype='<u8'))
+        self._file.write(index)
+        self._file.write(END_MAGIC)
+        self._file.write(asarray([offset], dtype='<u8'))
+        self._file.close()
+
+
+class TagReader:
+    """
+    Read a recording made by :class:`TagRecorder` without loading it.
+
+    The file is memory mapped, queries by time use the chunk index and a
+    binary search within the chunks they touch, so only the pages holding
+    the requested tags are read from disk.
+
+    Args:
+        path (str): recording to open
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._map = memmap(path, dtype=uint8, mode='r')
+
+        if bytes(self._map[:8]) != MAGIC:
+            raise ValueError(f'{path} is not a tag recording')
+        version, length = frombuffer(self._map[8:16], dtype='<u4')
+        if version != VERSION:
+            raise ValueError(f'Unsupported recording version {version}')
+        self._metadata = json.loads(bytes(self._map[16 : 16 + length]))
+        self._data_offset = 16 + int(length) + _padding(int(length))
+
+        self._index = self._read_index()
+        if self._index.shape[0] > 0:
+            last = self._index[-1]
+            self._count = int(last['start'] + last['count'])
+        else:
+            self._count = 0
+
+    def _read_index(self) -> ndarray:
+        size = self._map.shape[0]
+        if (size >= self._data_offset + 16) and (
+            bytes(self._map[size - 16 : size - 8]) == END_MAGIC
+        ):
+            offset = int(frombuffer(self._map[size - 8 : size], '<u8')[0])
+            if bytes(self._map[offset : offset + 8]) == INDEX_MAGIC:
+                entries = int(
+                    frombuffer(self._map[offset + 8 : offset + 16], '<u8')[0]
+                )
+                start = offset + 16
+                stop = start + entries * INDEX_DTYPE.itemsize
+                return frombuffer(self._map[start:stop], dtype=INDEX_DTYPE)
+
+        # Recording was not closed, walk the chunk headers instead
+        entries = []
+        offset = self._data_offset
+        total = 0
+        while offset + CHUNK_DTYPE.itemsize <= size:
+            header = frombuffer(
+                self._map[offset : offset + CHUNK_DTYPE.itemsize],
+                dtype=CHUNK_DTYPE,
+            )[0]
+            if header['magic'] != CHUNK_MAGIC:
+                break
+            n = int(header['count'])
+            end = offset + CHUNK_DTYPE.itemsize + 9 * n + _padding(n)
+            if end > size:
+                break
+            entries.append((offset, n, header['first'], header['last'], total))
+            total += n
+            offset = end
+        return asarray(entries, dtype=INDEX_DTYPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """
+        Drop the reader's reference to the memory map
+
+        The file is unmapped once any arrays returned by the reader have
+        also been released.
+        """
+        self._map = None
+
+    @property
+    def path(self) -> str:
+        """
+        File being read
+
+        Returns:
+            (str): path of the recording
+        """
+        return self._path
+
+    @property
+    def metadata(self) -> dict:
+        """
+        Everything stored in the file header
+
+        Returns:
+            (dict): header values
+        """
+        return dict(self._metadata)
+
+    @property
+    def resolution(self) -> float:
+        """
+        Timestamp resolution of the recording device
+
+        Returns:
+            (float): resolution
+        """
+        return self._metadata['resolution']
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of input channels of the recording device
+
+        Returns:
+            (int): number of channels
+        """
+        return self._metadata['number_of_channels']
+
+    @property
+    def thresholds(self) -> Optional[list]:
+        """
+        Input thresholds when the recording was made
+
+        Returns:
+            (List[float] | None): threshold of each channel, if recorded
+        """
+        return self._metadata['thresholds']
+
+    @property
+    def index(self) -> ndarray:
+        """
+        Sparse time index with one entry per chunk
+
+        Returns:
+            (ndarray): structured array of offset, count, first, last and
+                start (tag number of the first tag in the chunk)
+        """
+        return self._index
+
+    @property
+    def count(self) -> int:
+        """
+        Number of tags in the recording
+
+        Returns:
+            (int): total tags
+        """
+        return self._count
+
+    @property
+    def time_range(self) -> Tuple[int, int]:
+        """
+        First and last timestamp in the recording
+
+        Returns:
+            Tuple[int, int]: (first, last) timestamps
+        """
+        if self._index.shape[0] == 0:
+            return (0, 0)
+        return (int(self._index['first'][0]), int(self._index['last'][-1]))
+
+    def chunk(self, i: int) -> Tuple[ndarray, ndarray]:
+        """
+        Memory mapped columns of a single chunk
+
+        Args:
+            i (int): chunk number
+
+        Returns:
+            Tuple[ndarray, ndarray]: (channels, timestamps) views of the file
+        """
+        entry = self._index[i]
+        start = int(entry['offset']) + CHUNK_DTYPE.itemsize
+        n = int(entry['count'])
+        timestamps = self._map[start : start + 8 * n].view('<i8')
+        channels = self._map[start + 8 * n : start + 9 * n]
+        return channels, timestamps
+
+    def batches(
+        self,
+        t0: Optional[int] = None,
+        t1: Optional[int] = None,
+        channels: Optional[Sequence[int]] = None,
+    ) -> Iterator[Tuple[ndarray, ndarray]]:
+        """
+        Iterate over the recording one chunk at a time
+
+        Args:
+            t0 (int, optional): first timestamp to include
+            t1 (int, optional): timestamp to stop before
+            channels (Sequence[int], optional): only include these channels
+
+        Yields:
+            Tuple[ndarray, ndarray]: (channels, timestamps), views of the
+                file when no channel selection is made
+        """
+        first = 0
+        last = self._index.shape[0]
+        if t0 is not None:
+            first = int(searchsorted(self._index['last'], t0, side='left'))
+        if t1 is not None:
+            last = int(searchsorted(self._index['first'], t1, side='left'))
+
+        keep = None
+        if channels is not None:
+            keep = zeros(256, dtype=bool)
+            keep[asarray(channels, dtype=int64)] = True
+
+        for i in range(first, last):
+            chunk_channels, chunk_timestamps = self.chunk(i)
+            lo = 0
+            hi = chunk_timestamps.shape[0]
+            if (t0 is not None) and (self._index['first'][i] < t0):
+                lo = int(searchsorted(chunk_timestamps, t0, side='left'))
+            if (t1 is not None) and (self._index['last'][i] >= t1):
+                hi = int(searchsorted(chunk_timestamps, t1, side='left'))
+            chunk_channels = chunk_channels[lo:hi]
+            chunk_timestamps = chunk_timestamps[lo:hi]
+
+            if keep is not None:
+                mask = keep[chunk_channels]
+                chunk_channels = chunk_channels[mask]
+                chunk_timestamps = chunk_timestamps[mask]
+
+            if chunk_timestamps.shape[0] > 0:
+                yield chunk_channels, chunk_timestamps
+
+    def read(
+        self,
+        t0: Optional[int] = None,
+        t1: Optional[int] = None,
+        channels: Optional[Sequence[int]] = None,
+    ) -> Tuple[ndarray, ndarray]:
+        """
+        Load the tags in a time range into memory
+
+        Args:
+            t0 (int, optional): first timestamp to include
+            t1 (int, optional): timestamp to stop before
+            channels (Sequence[int], optional): only include these channels
+
+        Returns:
+            Tuple[ndarray, ndarray]: (channels, timestamps) arrays
+        """
+        parts = list(self.batches(t0, t1, channels))
+        if len(parts) == 0:
+            return zeros(0, dtype=uint8), zeros(0, dtype=int64)
+        return (
+            concatenate([p[0] for p in parts]),
+            concatenate([p[1] for p in parts]),
+        )
@@ -0,0 +1,435 @@
+import atexit
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterator, Optional, Tuple
+from numpy import ndarray, frombuffer, float64, int64, uint8
+
+from ._tags import as_channels, as_timestamps
+
+MAGIC = 0x55514454414753  # 'UQDTAGS'
+
+# Layout of the int64 header at the start of the block
+_MAGIC = 0
+_SLOTS = 1
+_SLOT_CAPACITY = 2
+_HEAD = 3
+_CLOSED = 4
+_CHANNELS = 5
+_RESOLUTION = 6
+_HEADER_SIZE = 8
+
+# Swapping resource_tracker.register is process wide, attaches from several
+# threads must not interleave
+_register_lock = threading.Lock()
+
+# Blocks released while views of them were still held. They stay mapped
+# until the views are dropped and are closed by a later release or at exit.
+_in_use = []
+_in_use_lock = threading.Lock()
+
+
+def _layout(slots: int, slot_capacity: int) -> Tuple[int, int, int, int]:
+    # Offsets of the slot headers, timestamps and channels, and the size
+    # of the block. Timestamps come before channels to stay 8 byte aligned.
+    slot_headers = _HEADER_SIZE * 8
+    timestamps = slot_headers + slots * 2 * 8
+    channels = timestamps + slots * slot_capacity * 8
+    return slot_headers, timestamps, channels, channels + slots * slot_capacity
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # Before Python 3.13 attaching registers the block with the resource
+    # tracker, which unlinks it when the subscriber exits. Unregistering
+    # afterwards is no better, a tracker shared with the publisher would
+    # forget the publisher's registration, so skip the registration.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    with _register_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
+def _close_unused():
+    # Close the released blocks no view refers to any more
+    with _in_use_lock:
+        for block in list(_in_use):
+            try:
+                block.close()
+            except BufferError:
+                continue
+            _in_use.remove(block)
+
+
+atexit.register(_close_unused)
+
+
+class _Ring:
+    # Numpy views of a block, shared by publisher and subscriber
+
+    def __init__(self, block: shared_memory.SharedMemory):
+        self.block = block
+        self.header = frombuffer(block.buf, dtype=int64, count=_HEADER_SIZE)
+        if self.header[_MAGIC] != MAGIC:
+            raise ValueError(f'{block.name} is not a tag ring')
+        slots = int(self.header[_SLOTS])
+        capacity = int(self.header[_SLOT_CAPACITY])
+        slot_headers, timestamps, channels, _ = _layout(slots, capacity)
+        slot_header = frombuffer(
+            block.buf, dtype=int64, count=slots * 2, offset=slot_headers
+        ).reshape(slots, 2)
+        self.sequences = slot_header[:, 0]
+        self.counts = slot_header[:, 1]
+        self.timestamps = frombuffer(
+            block.buf, dtype=int64, count=slots * capacity, offset=timestamps
+        ).reshape(slots, capacity)
+        self.channels = frombuffer(
+            block.buf, dtype=uint8, count=slots * capacity, offset=channels
+        ).reshape(slots, capacity)
+
+    def release(self):
+        # Views must be dropped before the block can be closed
+        self.header = None
+        self.sequences = None
+        self.counts = None
+        self.timestamps = None
+        self.channels = None
+        with _in_use_lock:
+            _in_use.append(self.block)
+        _close_unused()
+
+
+class TagPublisher:
+    """
+    Fan out tag batches to other processes through shared memory.
+
+    Batches are written into a ring of ``slots`` fixed size slots in a
+    ``multiprocessing.shared_memory`` block, each stamped with a sequence
+    number. Any number of :class:`TagSubscriber` in other processes on the
+    same machine attach to the block by its :attr:`name` and read the
+    batches as numpy views, without pickling or copying. The publisher
+    never waits for subscribers, one that falls more than ``slots`` batches
+    behind loses the oldest batches and counts them in its
+    :attr:`TagSubscriber.overruns`.
+
+    Args:
+        uqd_logic16 (UQDLogic16, optional): device read by :meth:`poll` and
+            :meth:`run`
+        slots (int): number of batches held
+        slot_capacity (int): number of tags in a slot, larger batches take
+            several slots
+        name (str, optional): name of the shared memory block, by default
+            a unique name is chosen
+        resolution (float, optional): bin width published to subscribers,
+            by default the device's
+        number_of_channels (int, optional): number of channels published to
+            subscribers, by default the device's
+    """
+
+    def __init__(
+        self,
+        uqd_logic16=None,
+        slots: int = 64,
+        slot_capacity: int = 2**20,
+        name: Optional[str] = None,
+        resolution: Optional[float] = None,
+        number_of_channels: Optional[int] = None,
+    ):
+        if slots < 2:
+            raise ValueError('slots must be >= 2')
+        if slot_capacity < 1:
+            raise ValueError('slot_capacity must be >= 1')
+        if resolution is None:
+            resolution = getattr(uqd_logic16, 'resolution', 0.0)
+        if number_of_channels is None:
+            number_of_channels = getattr(uqd_logic16, 'number_of_channels', 0)
+
+        self._uqd_logic16 = uqd_logic16
+        size = _layout(slots, slot_capacity)[3]
+        block = shared_memory.SharedMemory(name, create=True, size=size)
+        header = frombuffer(block.buf, dtype=int64, count=_HEADER_SIZE)
+        header[:] = 0
+        header[_SLOTS] = slots
+        header[_SLOT_CAPACITY] = slot_capacity
+        header[_CHANNELS] = number_of_channels
+        header[_RESOLUTION : _RESOLUTION + 1].view(float64)[0] = resolution
+        header[_MAGIC] = MAGIC
+        del header
+        self._ring = _Ring(block)
+        self._ring.sequences[:] = -1
+        self._sequence = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def name(self) -> str:
+        """
+        Name subscribers attach to
+
+        Returns:
+            (str): name of the shared memory block
+        """
+        return self._ring.block.name
+
+    @property
+    def sequence(self) -> int:
+        """
+        Sequence number the next batch will get
+
+        Returns:
+            (int): number of slots written so far
+        """
+        return self._sequence
+
+    def publish(self, channels, timestamps) -> int:
+        """
+        Write a batch for the subscribers
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+
+        Returns:
+            (int): number of slots written
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+
+        ring = self._ring
+        slots, capacity = ring.timestamps.shape
+        written = 0
+        for start in range(0, n, capacity):
+            stop = min(start + capacity, n)
+            slot = self._sequence % slots
+            # A slot is marked as being written first so a subscriber still
+            # reading it can tell its views were overwritten
+            ring.sequences[slot] = -1
+            ring.timestamps[slot, : stop - start] = timestamps[start:stop]
+            ring.channels[slot, : stop - start] = channels[start:stop]
+            ring.counts[slot] = stop - start
+            ring.sequences[slot] = self._sequence
+            self._sequence += 1
+            ring.header[_HEAD] = self._sequence
+            written += 1
+        return written
+
+    def poll(self) -> int:
+        """
+        Read tags from the device and publish them
+
+        Returns:
+            (int): number of tags published
+        """
+        count, channels, timestamps = self._uqd_logic16.read_tags()
+        if count > 0:
+            self.publish(channels[:count], timestamps[:count])
+        return max(count, 0)
+
+    def run(self, stop=None, poll_interval: float = 1e-3):
+        """
+        Publish every batch read from the device until ``stop`` is set
+
+        Args:
+            stop (threading.Event, optional): event ending the loop, by
+                default it runs until interrupted
+            poll_interval (float): time to wait after an empty read in
+                seconds
+        """
+        while (stop is None) or (not stop.is_set()):
+            if self.poll() == 0:
+                time.sleep(poll_interval)
+
+    def close(self):
+        """
+        Tell the subscribers no more batches follow and free the block
+        """
+        if self._ring.header is None:
+            return
+        self._ring.header[_CLOSED] = 1
+        block = self._ring.block
+        self._ring.release()
+        block.unlink()
+
+
+class TagSubscriber:
+    """
+    Read the batches of a :class:`TagPublisher` in another process.
+
+    Batches are returned in order as views of the shared memory. A view
+    stays valid until the publisher wraps round the ring and reuses its
+    slot, which :meth:`valid` checks after the batch has been processed.
+
+    Args:
+        name (str): :attr:`TagPublisher.name` of the publisher
+        latest (bool): start from the next batch published instead of the
+            oldest one still held
+    """
+
+    def __init__(self, name: str, latest: bool = False):
+        self._ring = _Ring(_attach(name))
+        header = self._ring.header
+        self._slots = int(header[_SLOTS])
+        self._number_of_channels = int(header[_CHANNELS])
+        self._resolution = float(
+            header[_RESOLUTION : _RESOLUTION + 1].view(float64)[0]
+        )
+        head = int(header[_HEAD])
+        self._next = head if latest else max(0, head - self._slots)
+        self._current = -1
+        self._overruns = 0
+        self._received = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def resolution(self) -> float:
+        """
+        Bin width of the published timestamps
+
+        Returns:
+            (float): resolution in seconds
+        """
+        return self._resolution
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of channels of the published device
+
+        Returns:
+            (int): number of channels
+        """
+        return self._number_of_channels
+
+    @property
+    def lag(self) -> int:
+        """
+        Number of published batches not read yet
+
+        Returns:
+            (int): batches behind the publisher
+        """
+        return int(self._ring.header[_HEAD]) - self._next
+
+    @property
+    def overruns(self) -> int:
+        """
+        Number of batches overwritten before they were read
+
+        Returns:
+            (int): batches lost
+        """
+        return self._overruns
+
+    @property
+    def received(self) -> int:
+        """
+        Number of batches read
+
+        Returns:
+            (int): batches read
+        """
+        return self._received
+
+    @property
+    def closed(self) -> bool:
+        """
+        Whether the publisher has closed
+
+        Returns:
+            (bool): True once no more batches will be published
+        """
+        return self._ring.header[_CLOSED] != 0
+
+    def read(self) -> Optional[Tuple[ndarray, ndarray]]:
+        """
+        Next batch, without waiting
+
+        Returns:
+            (Tuple[ndarray, ndarray] | None): (channels, timestamps) views
+            of the shared memory, None if no batch is waiting
+        """
+        ring = self._ring
+        while True:
+            head = int(ring.header[_HEAD])
+            if self._next >= head:
+                return None
+            if head - self._next > self._slots:
+                self._overruns += head - self._slots - self._next
+                self._next = head - self._slots
+
+            slot = self._next % self._slots
+            count = int(ring.counts[slot])
+            if ring.sequences[slot] != self._next:
+                # Overwritten while we looked, skip to the next one
+                self._overruns += 1
+                self._next += 1
+                continue
+
+            self._current = self._next
+            self._next += 1
+            self._received += 1
+            return ring.channels[slot, :count], ring.timestamps[slot, :count]
+
+    def valid(self) -> bool:
+        """
+        Whether the last batch read is still intact
+
+        Returns:
+            (bool): False if the publisher has since reused its slot
+        """
+        if self._current < 0:
+            return False
+        slot = self._current % self._slots
+        return self._ring.sequences[slot] == self._current
+
+    def batches(
+        self, poll_interval: float = 1e-3
+    ) -> Iterator[Tuple[ndarray, ndarray]]:
+        """
+        Yield every batch until the publisher closes
+
+        Args:
+            poll_interval (float): time to wait when no batch is waiting in
+                seconds
+
+        Yields:
+            Tuple[ndarray, ndarray]: (channels, timestamps) views
+        """
+        while True:
+            # Checked before reading so the last batches are not missed
+            closed = self.closed
+            batch = self.read()
+            if batch is not None:
+                yield batch
+            elif closed:
+                return
+            else:
+                time.sleep(poll_interval)
+
+    def close(self):
+        """
+        Detach from the shared memory
+
+        Views returned earlier stay readable while they are held, but no
+        longer follow the ring, copy batches that must outlive the
+        subscriber.
+        """
+        if self._ring.header is not None:
+            self._ring.release()
@@ -0,0 +1,1028 @@
+import time
+import threading
+from typing import Optional, Sequence, Tuple
+from numpy import (
+    ndarray,
+    zeros,
+    ones,
+    empty,
+    arange,
+    array,
+    asarray,
+    repeat,
+    argsort,
+    bincount,
+    concatenate,
+    cumsum,
+    diff,
+    maximum,
+    rint,
+    searchsorted,
+    float64,
+    uint8,
+    uint64,
+    int64,
+)
+from numpy.random import default_rng
+
+from ._tags import as_channels, as_timestamps
+from ._coincidence import CoincidenceCounter
+from ._recording import TagReader
+from ._aio import device_executor, run_blocking, read_tags_copy, stream_tags
+from ._telemetry import Telemetry
+from ._calibration import CalibrationCache, warn_calibration_reused
+from ._config import DeviceConfig, channel_mask, MAX_DELAY_BINS
+from ._config import config_changes, apply_changes
+from ._parallel import UQD_ERROR_FLAG
+
+# Period of the logic mode time counter in seconds
+TIME_COUNTER_PERIOD = 5e-9
+
+
+def _sort_tags(
+    channels: ndarray, timestamps: ndarray
+) -> Tuple[ndarray, ndarray]:
+    order = argsort(timestamps, kind='stable')
+    return channels[order], timestamps[order]
+
+
+class PoissonSource:
+    """
+    Independent Poissonian tags on every channel.
+
+    Args:
+        rates (Sequence[float]): count rate of each channel in Hz, channel
+            ``i`` of the tags is ``rates[i]``
+        seed (int, optional): seed for the random number generator
+    """
+
+    def __init__(self, rates: Sequence[float], seed: Optional[int] = None):
+        self._rates = asarray(rates, dtype=float64)
+        if (self._rates < 0).any():
+            raise ValueError('rates must be >= 0')
+        self._rng = default_rng(seed)
+
+    @property
+    def rates(self) -> ndarray:
+        """
+        Count rate of each channel
+
+        Returns:
+            (ndarray): rates in Hz
+        """
+        return self._rates.copy()
+
+    def generate(
+        self, t0: int, t1: int, resolution: float
+    ) -> Tuple[ndarray, ndarray]:
+        """
+        Tags arriving in ``[t0, t1)``
+
+        Args:
+            t0 (int): start of the interval in bins
+            t1 (int): end of the interval in bins
+            resolution (float): bin width in seconds
+
+        Returns:
+            Tuple[ndarray, ndarray]: time ordered (channels, timestamps)
+        """
+        if t1 <= t0:
+            return zeros(0, dtype=uint8), zeros(0, dtype=int64)
+
+        counts = self._rng.poisson(self._rates * (t1 - t0) * resolution)
+        channels = repeat(arange(counts.shape[0], dtype=uint8), counts)
+        timestamps = self._rng.integers(t0, t1, channels.shape[0], dtype=int64)
+        return _sort_tags(channels, timestamps)
+
+
+class CorrelatedSource:
+    """
+    Events that are each detected on several channels, e.g. photon pairs.
+
+    Every event produces a tag on each of ``channels`` with probability
+    ``efficiency``, offset by that channel's delay and Gaussian timing
+    jitter. Uncorrelated background can be added with a
+    :class:`PoissonSource`.
+
+    Args:
+        channels (Sequence[int]): tag channels each event is detected on
+        rate (float): event rate in Hz
+        delays (Sequence[float], optional): delay of each channel in seconds
+        jitter (float): standard deviation of the timing jitter in seconds
+        efficiency (float): detection probability on each channel
+        background (PoissonSource, optional): uncorrelated tags to add
+        seed (int, optional): seed for the random number generator
+    """
+
+    def __init__(
+        self,
+        channels: Sequence[int],
+        rate: float,
+        delays: Optional[Sequence[float]] = None,
+        jitter: float = 0.0,
+        efficiency: float = 1.0,
+        background: Optional[PoissonSource] = None,
+        seed: Optional[int] = None,
+    ):
+        self._channels = asarray(channels, dtype=uint8)
+        if delays is None:
+            delays = zeros(self._channels.shape[0])
+        self._delays = asarray(delays, dtype=float64)
+        if self._delays.shape[0] != self._channels.shape[0]:
+            raise ValueError('delays must have one entry per channel')
+        if (self._delays < 0).any():
+            raise ValueError('delays must be >= 0')
+        if rate < 0:
+            raise ValueError('rate must be >= 0')
+        if not (0 <= efficiency <= 1):
+            raise ValueError('efficiency must be between 0 and 1')
+
+        self._rate = rate
+        self._jitter = jitter
+        self._efficiency = efficiency
+        self._background = background
+        self._rng = default_rng(seed)
+
+    def generate(
+        self, t0: int, t1: int, resolution: float
+    ) -> Tuple[ndarray, ndarray]:
+        """
+        Tags from events occurring in ``[t0, t1)``
+
+        Delays and jitter can move tags past ``t1``, but never before ``t0``.
+
+        Args:
+            t0 (int): start of the interval in bins
+            t1 (int): end of the interval in bins
+            resolution (float): bin width in seconds
+
+        Returns:
+            Tuple[ndarray, ndarray]: time ordered (channels, timestamps)
+        """
+        if t1 <= t0:
+            return zeros(0, dtype=uint8), zeros(0, dtype=int64)
+
+        n = self._rng.poisson(self._rate * (t1 - t0) * resolution)
+        events = self._rng.integers(t0, t1, n, dtype=int64)
+
+        channels = [zeros(0, dtype=uint8)]
+        timestamps = [zeros(0, dtype=int64)]
+        for channel, delay in zip(self._channels, self._delays):
+            detected = events[self._rng.random(n) < self._efficiency]
+            offset = delay + self._rng.normal(
+                0.0, self._jitter, detected.shape[0]
+            )
+            tags = detected + rint(offset / resolution).astype(int64)
+            channels.append(repeat(channel, tags.shape[0]).astype(uint8))
+            timestamps.append(maximum(tags, t0))
+
+        if self._background is not None:
+            extra = self._background.generate(t0, t1, resolution)
+            channels.append(extra[0])
+            timestamps.append(extra[1])
+
+        return _sort_tags(concatenate(channels), concatenate(timestamps))
+
+
+class ReplaySource:
+    """
+    Tags replayed from a recording made with ``TagRecorder``.
+
+    Device time zero corresponds to the first tag of the recording.
+
+    Args:
+        recording (str | TagReader): recording to replay
+    """
+
+    def __init__(self, recording):
+        if isinstance(recording, TagReader):
+            self._reader = recording
+        else:
+            self._reader = TagReader(recording)
+        self._first, self._last = self._reader.time_range
+
+    @property
+    def resolution(self) -> float:
+        """
+        Resolution of the device the recording was made with
+
+        Returns:
+            (float): bin width in seconds
+        """
+        return self._reader.resolution
+
+    @property
+    def number_of_channels(self) -> int:
+        """
+        Number of channels of the device the recording was made with
+
+        Returns:
+            (int): number of channels
+        """
+        return self._reader.number_of_channels
+
+    @property
+    def duration(self) -> int:
+        """
+        Time spanned by the recording
+
+        Returns:
+            (int): duration in bins
+        """
+        return self._last - self._first + 1
+
+    def exhausted(self, t: int) -> bool:
+        """
+        Whether the recording ends before device time ``t``
+
+        Args:
+            t (int): device time in bins
+
+        Returns:
+            (bool): True once every tag has been replayed
+        """
+        return t >= self.duration
+
+    def generate(
+        self, t0: int, t1: int, resolution: float
+    ) -> Tuple[ndarray, ndarray]:
+        """
+        Recorded tags in ``[t0, t1)`` of device time
+
+        Args:
+            t0 (int): start of the interval in bins
+            t1 (int): end of the interval in bins
+            resolution (float): ignored, the recording's resolution is used
+
+        Returns:
+            Tuple[ndarray, ndarray]: time ordered (channels, timestamps)
+        """
+        channels, timestamps = self._reader.read(
+            self._first + t0, self._first + t1
+        )
+        return channels, timestamps - self._first
+
+
+class SimulatedUQDLogic16:
+    """
+    Stand-in for ``UQDLogic16`` that needs no hardware.
+
+    Tags come from a source such as :class:`PoissonSource`,
+    :class:`CorrelatedSource` or :class:`ReplaySource`, and pass through a
+    model of the device's input stage: inverted channels trigger
+    ``pulse_width`` later, ``input_delay`` shifts each channel and the group
+    filter set by ``filter_min_count``/``filter_max_time`` drops groups that
+    are too small unless their channel is in ``exclusion``.
+
+    With ``speed`` set, each read returns the tags for the wall clock time
+    elapsed since the previous read multiplied by ``speed``, with ``speed``
+    of ``None`` every read advances by ``step`` seconds of device time as
+    fast as it is called.
+
+    Args:
+        device_id (int): kept for compatibility, must be >= 1
+        calibrate (bool): kept for compatibility
+        source (optional): tag source, by default 1 kHz Poissonian tags on
+            every channel
+        number_of_channels (int, optional): number of input channels, by
+            default the source's channel count or 16
+        resolution (float, optional): bin width in seconds, by default the
+            source's resolution or 78.125 ps
+        speed (float, optional): device seconds per wall clock second
+        step (float): device seconds per read when ``speed`` is ``None``
+        pulse_width (float): input pulse length in seconds, the delay seen by
+            inverted channels
+        calibration_cache (CalibrationCache | bool, optional): consulted as
+            by ``UQDLogic16``
+    """
+
+    def __init__(
+        self,
+        device_id: int = 1,
+        calibrate: bool = True,
+        source=None,
+        number_of_channels: Optional[int] = None,
+        resolution: Optional[float] = None,
+        speed: Optional[float] = 1.0,
+        step: float = 10e-3,
+        pulse_width: float = 5e-9,
+        calibration_cache=None,
+    ):
+        if device_id < 1:
+            raise ValueError('device_id must be >= 1')
+
+        if resolution is None:
+            resolution = getattr(source, 'resolution', 78.125e-12)
+        if number_of_channels is None:
+            number_of_channels = getattr(source, 'number_of_channels', 16)
+        if source is None:
+            source = PoissonSource([1e3] * number_of_channels)
+
+        self._device_id = device_id
+        self._source = source
+        self._number_of_channels = number_of_channels
+        self._resolution = resolution
+        self._speed = speed
+        self._step = step
+        self._pulse_width = pulse_width
+        self._open = True
+
+        self._led_brightness = 0
+        self._filter_min_count = 1
+        self._filter_max_time = 0.0
+        self._input_thresholds = zeros(number_of_channels, dtype=float64)
+        self._inversion = zeros(number_of_channels, dtype=uint8)
+        self._inversion_mask = 0
+        self._input_delay = zeros(number_of_channels, dtype=float64)
+        self._exclusion = zeros(number_of_channels, dtype=uint8)
+        self._exclusion_mask = 0
+        self._10MHz = False
+        self._level_gate = False
+        self._config_known = False
+
+        self._running = False
+        self._logic_mode = False
+        self._time = 0
+        self._wall = time.perf_counter()
+        self._carry_channels = zeros(0, dtype=uint8)
+        self._carry_timestamps = zeros(0, dtype=int64)
+        self._pending_channels = zeros(0, dtype=uint8)
+        self._pending_timestamps = zeros(0, dtype=int64)
+        self._executor = None
+        self._telemetry = None
+        self._poll_errors = False
+        self._error_flags = 0
+        self._calibration_reused = False
+
+        if calibration_cache is True:
+            calibration_cache = CalibrationCache()
+        if calibrate is True:
+            if (calibration_cache is not None) and calibration_cache.is_valid(
+                device_id, self.identity
+            ):
+                self._calibration_reused = True
+                warn_calibration_reused(calibration_cache, device_id)
+            else:
+                self.calibrate()
+                if calibration_cache is not None:
+                    calibration_cache.store(device_id, self.identity)
+
+    def is_open(self) -> bool:
+        return self._open
+
+    def __close__(self):
+        self._open = False
+
+    def __exit__(self):
+        self._open = False
+
+    def calibrate(self):
+        return
+
+    @property
+    def identity(self) -> dict:
+        return {
+            'device_id': self._device_id,
+            'fpga_version': self.fpga_version,
+            'number_of_channels': self._number_of_channels,
+            'resolution': self._resolution,
+        }
+
+    @property
+    def calibration_reused(self) -> bool:
+        return self._calibration_reused
+
+    @property
+    def source(self):
+        """
+        Source of the simulated tags
+
+        Returns:
+            source passed on construction
+        """
+        return self._source
+
+    @property
+    def led_brightness(self) -> int:
+        return self._led_brightness
+
+    @led_brightness.setter
+    def led_brightness(self, percent: int):
+        if (percent < 0) or (percent > 100):
+            raise ValueError(
+                'led_brightness must be in an integer between 0 and 100'
+            )
+        self._led_brightness = percent
+
+    @property
+    def fpga_version(self) -> int:
+        return 0
+
+    @property
+    def resolution(self) -> float:
+        return self._resolution
+
+    @property
+    def number_of_channels(self) -> int:
+        return self._number_of_channels
+
+    @property
+    def input_threshold(self) -> ndarray:
+        return self._input_thresholds
+
+    @input_threshold.setter
+    def input_threshold(self, value: Tuple[int, float]):
+        n = self._number_of_channels
+        channel = value[0]
+        if (channel < 1) or (channel > n):
+            raise ValueError(f'channel must be in range 0 <= channel < {n}')
+
+        voltage = value[1]
+        if abs(voltage) > 2:
+            raise ValueError('abs(voltage) must be <= 2V')
+        self._input_thresholds[channel - 1] = voltage
+
+    @property
+    def inversion(self) -> ndarray:
+        return self._inversion
+
+    @inversion.setter
+    def inversion(self, invert: Tuple[int, int]):
+        n = self._number_of_channels
+        channel = invert[0]
+        if (channel < 0) or (channel >= n):
+            raise ValueError(f'channel must be in range 0 <= channel < {n}')
+        self._inversion[channel] = invert[1]
+
+    def inversion_apply(self):
+        self._inversion_mask = channel_mask(self._inversion)
+
+    @property
+    def input_delay(self) -> ndarray:
+        return self._input_delay
+
+    @input_delay.setter
+    def input_delay(self, value: Tuple[int, float]):
+        n = self._number_of_channels
+        channel = value[0]
+        if (channel < 0) or (channel >= n):
+            raise ValueError(f'channel must be in range 0 <= channel < {n}')
+
+        max_delay = MAX_DELAY_BINS * self._resolution
+        delay = value[1]
+        if (delay < 0) or (delay > max_delay):
+            raise ValueError(
+                f'Delay is out of range, must be >= 0 or < {max_delay}s'
+            )
+        self._input_delay[channel] = delay
+
+    @property
+    def external_10MHz_reference(self) -> bool:
+        return self._10MHz
+
+    @external_10MHz_reference.setter
+    def external_10MHz_reference(self, value: bool):
+        self._10MHz = value is True
+
+    @property
+    def filter_min_count(self) -> int:
+        return self._filter_min_count
+
+    @filter_min_count.setter
+    def filter_min_count(self, count: int):
+        if (count < 1) or (count > 10):
+            raise ValueError('Count filter must be between 1 and 10')
+        self._filter_min_count = count
+
+    @property
+    def filter_max_time(self) -> float:
+        return self._filter_max_time
+
+    @filter_max_time.setter
+    def filter_max_time(self, max_time: float):
+        self._filter_max_time = max_time
+
+    @property
+    def exclusion(self) -> ndarray:
+        return self._exclusion
+
+    @exclusion.setter
+    def exclusion(self, value: Tuple[int, int]):
+        n = self._number_of_channels
+        channel = value[0]
+        if (channel < 0) or (channel >= n):
+            raise ValueError(f'channel must be in range 0 <= channel < {n}')
+        self._exclusion[channel] = value[1]
+
+    def exclusion_apply(self):
+        self._exclusion_mask = channel_mask(self._exclusion)
+
+    @property
+    def level_gate(self) -> bool:
+        return self._level_gate
+
+    @level_gate.setter
+    def level_gate(self, value: bool):
+        self._level_gate = value is True
+
+    @property
+    def config(self) -> DeviceConfig:
+        return DeviceConfig(
+            self._number_of_channels,
+            self._input_thresholds,
+            self._input_delay,
+            self._inversion,
+            self._exclusion,
+            self._filter_min_count,
+            self._filter_max_time,
+            self._led_brightness,
+            self._10MHz,
+            self._level_gate,
+        )
+
+    def _applied_config(self) -> Optional[DeviceConfig]:
+        if not self._config_known:
+            return None
+        config = self.config
+        n = self._number_of_channels
+        config.inversion[:] = (self._inversion_mask >> arange(n)) & 1
+        config.exclusion[:] = (self._exclusion_mask >> arange(n)) & 1
+        return config
+
+    def apply_config(self, config: DeviceConfig, force: bool = False) -> int:
+        # No registers to write, the model reads the settings directly
+        changes = config_changes(self, config, self._applied_config(), force)
+        writes = apply_changes(self, config, changes)
+        self._config_known = True
+        return writes
+
+    @property
+    def time(self) -> int:
+        """
+        Current simulated device time
+
+        Returns:
+            (int): time in bins
+        """
+        return self._time
+
+    @property
+    def exhausted(self) -> bool:
+        """
+        Whether a :class:`ReplaySource` has been played to its end
+
+        Reads return no more tags once this is True, :meth:`stream` and
+        ``Pipeline.run`` stop reading a device that is exhausted. Sources
+        that never end are never exhausted.
+
+        Returns:
+            (bool): True once every tag of the recording has been read
+        """
+        exhausted = getattr(self._source, 'exhausted', None)
+        return (
+            (exhausted is not None)
+            and exhausted(self._time)
+            and (self._carry_timestamps.shape[0] == 0)
+            and (self._pending_timestamps.shape[0] == 0)
+        )
+
+    def start_timetags(self):
+        """
+        Start transmitting timetags from the device to the host computer
+        """
+        start = time.perf_counter_ns()
+        self._advance()
+        self._running = True
+        if self._telemetry is not None:
+            self._telemetry.record_call(
+                'start_timetags', time.perf_counter_ns() - start
+            )
+
+    def stop_timetags(self):
+        """
+        Stop transmitting timetags from the device to the host computer
+        """
+        start = time.perf_counter_ns()
+        self._running = False
+        if self._telemetry is not None:
+            self._telemetry.record_call(
+                'stop_timetags', time.perf_counter_ns() - start
+            )
+
+    def _advance(self) -> Tuple[int, int]:
+        # Move device time forward, returning the interval covered
+        now = time.perf_counter()
+        if self._speed is None:
+            elapsed = self._step
+        else:
+            elapsed = (now - self._wall) * self._speed
+        self._wall = now
+
+        t0 = self._time
+        self._time = t0 + int(elapsed / self._resolution)
+        return t0, self._time
+
+    def _delays(self, channels: ndarray, extra: Optional[ndarray]) -> ndarray:
+        delays = zeros(256, dtype=int64)
+        n = self._number_of_channels
+        delays[:n] = rint(self._input_delay / self._resolution).astype(int64)
+        inverted = (self._inversion_mask >> arange(n)) & 1
+        pulse = int(round(self._pulse_width / self._resolution))
+        delays[:n] += inverted * pulse
+        if extra is not None:
+            delays[:n] += extra
+        return delays[channels]
+
+    def _filter(self, channels: ndarray, timestamps: ndarray) -> ndarray:
+        # Groups are runs of tags no more than filter_max_time apart, groups
+        # smaller than filter_min_count are dropped except on excluded
+        # channels
+        if (self._filter_min_count <= 1) or (timestamps.shape[0] == 0):
+            return ones(timestamps.shape[0], dtype=bool)
+
+        max_time = int(self._filter_max_time / self._resolution)
+        starts = concatenate(([True], diff(timestamps) > max_time))
+        group = cumsum(starts) - 1
+        sizes = bincount(group)
+        excluded = ((self._exclusion_mask >> channels.astype(int64)) & 1) == 1
+        return (sizes[group] >= self._filter_min_count) | excluded
+
+    def _acquire(
+        self, extra_delays: Optional[ndarray] = None
+    ) -> Tuple[ndarray, ndarray, int, int]:
+        t0, t1 = self._advance()
+        channels, timestamps = self._source.generate(t0, t1, self._resolution)
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+
+        keep = channels < self._number_of_channels
+        channels = channels[keep]
+        timestamps = timestamps[keep] + self._delays(channels, extra_delays)
+
+        # Tags delayed past the end of this interval belong to the next read
+        channels, timestamps = _sort_tags(
+            concatenate((self._carry_channels, channels)),
+            concatenate((self._carry_timestamps, timestamps)),
+        )
+        cut = searchsorted(timestamps, t1)
+        self._carry_channels = channels[cut:]
+        self._carry_timestamps = timestamps[cut:]
+        channels = channels[:cut]
+        timestamps = timestamps[:cut]
+
+        keep = self._filter(channels, timestamps)
+        return channels[keep], timestamps[keep], t0, t1
+
+    def read_tags(self) -> Tuple[int, ndarray, ndarray]:
+        """
+        Read the tags generated since the previous read
+
+        Returns:
+            Tuple[int, ndarray, ndarray]: (count, channels, timestamps)
+        """
+        self._pending_channels = zeros(0, dtype=uint8)
+        self._pending_timestamps = zeros(0, dtype=int64)
+        telemetry = self._telemetry
+        if telemetry is not None:
+            start = time.perf_counter_ns()
+
+        if (not self._running) or self._logic_mode:
+            self._advance()
+            result = (0, array([], dtype=uint8), array([], dtype=uint64))
+        else:
+            channels, timestamps, _, _ = self._acquire()
+            result = (channels.shape[0], channels, timestamps.view(uint64))
+
+        if telemetry is not None:
+            end = time.perf_counter_ns()
+            telemetry.record_call('read_tags', end - start)
+            telemetry.record_read(result[0], start, end)
+            if self._poll_errors:
+                self.read_error_flags()
+        return result
+
+    def read_tags_into(
+        self, channels_out: ndarray, timestamps_out: ndarray
+    ) -> int:
+        """
+        Read tags into caller owned arrays, as ``UQDLogic16.read_tags_into``
+
+        Args:
+            channels_out (ndarray): uint8 array to receive channels
+            timestamps_out (ndarray): int64 array to receive timestamps
+
+        Returns:
+            (int): number of tags written to the arrays
+        """
+        space = min(channels_out.shape[0], timestamps_out.shape[0])
+        if space <= 0:
+            return 0
+
+        if self._pending_timestamps.shape[0] == 0:
+            count, channels, timestamps = self.read_tags()
+            if count == 0:
+                return 0
+            self._pending_channels = channels
+            self._pending_timestamps = timestamps.view(int64)
+
+        n = min(space, self._pending_timestamps.shape[0])
+        channels_out[:n] = self._pending_channels[:n]
+        timestamps_out[:n] = self._pending_timestamps[:n]
+        self._pending_channels = self._pending_channels[n:]
+        self._pending_timestamps = self._pending_timestamps[n:]
+        return n
+
+    @property
+    def pending_tags(self) -> int:
+        return self._pending_timestamps.shape[0]
+
+    @property
+    def telemetry(self):
+        return self._telemetry
+
+    def enable_telemetry(self, poll_errors: bool = True) -> Telemetry:
+        if self._telemetry is None:
+            self._telemetry = Telemetry({
+                bit: name for bit, (name, _) in UQD_ERROR_FLAG.items()
+            })
+        self._poll_errors = poll_errors
+        return self._telemetry
+
+    def disable_telemetry(self):
+        self._telemetry = None
+        self._poll_errors = False
+
+    def inject_error_flags(self, flags: int):
+        """
+        Make the next :meth:`read_error_flags` report ``flags``
+
+        Args:
+            flags (int): error bit set, as the keys of ``UQD_ERROR_FLAG``
+        """
+        self._error_flags |= flags
+
+    def read_error_flags(self) -> int:
+        flags = self._error_flags
+        self._error_flags = 0
+        if self._telemetry is not None:
+            self._telemetry.record_error_flags(flags, time.perf_counter_ns())
+        return flags
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = device_executor()
+        return self._executor
+
+    async def acalibrate(self):
+        await run_blocking(self.executor, self.calibrate)
+
+    async def aread_tags(self) -> Tuple[int, ndarray, ndarray]:
+        return await run_blocking(self.executor, read_tags_copy, self)
+
+    def stream(self, poll_interval: float = 1e-3):
+        return stream_tags(self, poll_interval)
+
+
+class SimulatedLogicMode:
+    """
+    Stand-in for ``LogicMode`` on a :class:`SimulatedUQDLogic16`.
+
+    Each :meth:`read_logic` groups the tags generated since the previous read
+    with the window from :meth:`set_window_width`, after the device's input
+    delays and the logic mode delays from :meth:`set_delay`, and the counters
+    are then read with :meth:`calc_count_pos` and :meth:`calc_count`.
+
+    Args:
+        uqd_logic16 (SimulatedUQDLogic16): simulated device
+    """
+
+    def __init__(self, uqd_logic16: SimulatedUQDLogic16):
+        self._uqd_logic16 = uqd_logic16
+        self._window = 0
+        self._delays = zeros(uqd_logic16.number_of_channels, dtype=int64)
+        self._counter = CoincidenceCounter(
+            0, number_of_channels=uqd_logic16.number_of_channels
+        )
+        self._time_counter = 0
+        self._output_width = 0
+        self._output_patterns = {}
+        self._output_event_count = 0
+        self.switch_logic_mode()
+
+    def switch_logic_mode(self):
+        device = self._uqd_logic16
+        device._logic_mode = not device._logic_mode
+        device._advance()
+
+    def set_window_width(self, window: int):
+        self._window = window
+
+    def set_window_width_ex(self, index: int, window: int):
+        raise NotImplementedError(
+            'The simulated device has a single window, use set_window_width'
+        )
+
+    def set_delay(self, channel: int, delay: int):
+        self._delays[channel] = delay
+
+    def read_logic(self) -> int:
+        telemetry = self._uqd_logic16._telemetry
+        if telemetry is not None:
+            start = time.perf_counter_ns()
+
+        channels, timestamps, t0, t1 = self._uqd_logic16._acquire(
+            self._delays - self._delays.min()
+        )
+        self._counter = CoincidenceCounter(
+            self._window,
+            number_of_channels=self._uqd_logic16.number_of_channels,
+        )
+        self._counter.process(channels, timestamps)
+        self._counter.flush()
+
+        duration = (t1 - t0) * self._uqd_logic16.resolution
+        self._time_counter = int(duration / TIME_COUNTER_PERIOD)
+
+        if telemetry is not None:
+            telemetry.record_call('read_logic', time.perf_counter_ns() - start)
+        return self._time_counter
+
+    def calc_count_pos(self, pattern: int) -> int:
+        return self.calc_count(pattern, 0)
+
+    def calc_count(self, positive: int, negative: int) -> int:
+        return self._counter.count(positive, negative)
+
+    def get_time_counter(self) -> int:
+        return self._time_counter
+
+    def calc_counts(self, patterns, out=None) -> ndarray:
+        patterns = asarray(patterns, dtype=int64).reshape(-1)
+        counts_pos = self._counter.counts_pos()
+        if out is None:
+            out = empty(patterns.shape[0], dtype=uint64)
+        out[: patterns.shape[0]] = counts_pos[patterns]
+        return out
+
+    def calc_counts_pn(self, positive, negative, out=None) -> ndarray:
+        positive = asarray(positive, dtype=int64).reshape(-1)
+        negative = asarray(negative, dtype=int64).reshape(-1)
+        if positive.shape[0] != negative.shape[0]:
+            raise ValueError('positive and negative must be the same length')
+        if out is None:
+            out = empty(positive.shape[0], dtype=uint64)
+        for i in range(positive.shape[0]):
+            out[i] = self._counter.count(positive[i], negative[i])
+        return out
+
+    def read_counts(self, patterns, out=None) -> Tuple[int, ndarray]:
+        time_counter = self.read_logic()
+        return time_counter, self.calc_counts(patterns, out)
+
+    async def aread_logic(self) -> int:
+        return await run_blocking(self._uqd_logic16.executor, self.read_logic)
+
+    async def aread_counts(self, patterns, out=None) -> Tuple[int, ndarray]:
+        return await run_blocking(
+            self._uqd_logic16.executor, self.read_counts, patterns, out
+        )
+
+    def set_output_width(self, width: int):
+        self._output_width = width
+
+    def set_output_pattern(self, output: int, positive: int, negative: int):
+        self._output_patterns[output] = (positive, negative)
+
+    def set_output_event_count(self, events: int):
+        self._output_event_count = events
+
+
+class SimulatedLogicSampler:
+    """
+    Stand-in for ``LogicSampler`` on a :class:`SimulatedLogicMode`.
+
+    Samples are taken on a Python thread with the same fixed cadence and ring
+    layout as the native sampler, cadence is only as steady as the GIL allows.
+
+    Args:
+        logic_mode (SimulatedLogicMode): simulated logic mode to sample
+        patterns (Sequence[int]): patterns to record, as from
+            ``pattern_from_channels``
+        interval (float): time between samples in seconds
+        capacity (int): number of samples the ring can hold
+    """
+
+    def __init__(
+        self,
+        logic_mode: SimulatedLogicMode,
+        patterns,
+        interval: float = 1e-3,
+        capacity: int = 2**16,
+    ):
+        if capacity < 2:
+            raise ValueError('capacity must be >= 2')
+        if interval < 1e-6:
+            raise ValueError('interval must be at least 1 us')
+
+        self._patterns = asarray(patterns, dtype=int64).reshape(-1)
+        if self._patterns.shape[0] == 0:
+            raise ValueError('At least one pattern is required')
+
+        self._logic_mode = logic_mode
+        self._interval = interval
+        self._capacity = capacity
+        self._time_counters = zeros(capacity, dtype=int64)
+        self._counts = zeros((capacity, self._patterns.shape[0]), dtype=uint64)
+        self._samples = 0
+        self._overruns = 0
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        if self._running.is_set():
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        next_sample = time.perf_counter() + self._interval
+        self._logic_mode.read_logic()
+        while self._running.is_set():
+            delay = next_sample - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            time_counter, counts = self._logic_mode.read_counts(self._patterns)
+            with self._lock:
+                slot = self._samples % self._capacity
+                self._time_counters[slot] = time_counter
+                self._counts[slot] = counts
+                self._samples += 1
+
+            next_sample += self._interval
+            now = time.perf_counter()
+            if now > next_sample:
+                self._overruns += 1
+                next_sample = now + self._interval
+
+    @property
+    def is_running(self) -> bool:
+        return self._running.is_set()
+
+    @property
+    def patterns(self) -> ndarray:
+        return self._patterns.copy()
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def samples(self) -> int:
+        return self._samples
+
+    @property
+    def overruns(self) -> int:
+        return self._overruns
+
+    def latest(self, max_samples: int = -1) -> Tuple[ndarray, ndarray]:
+        with self._lock:
+            count = min(self._samples, self._capacity - 1)
+            if 0 <= max_samples < count:
+                count = max_samples
+            slots = arange(self._samples - count, self._samples)
+            slots %= self._capacity
+            return self._time_counters[slots], self._counts[slots]
+
+    def averages(self, window: int = -1) -> ndarray:
+        _, counts = self.latest(window)
+        if counts.shape[0] == 0:
+            return zeros(self._patterns.shape[0], dtype=float64)
+        return counts.mean(axis=0)
+
+    def rates(self, window: int = -1) -> ndarray:
+        time_counters, counts = self.latest(window)
+        duration = time_counters.sum() * TIME_COUNTER_PERIOD
+        if duration <= 0:
+            return zeros(self._patterns.shape[0], dtype=float64)
+        return counts.sum(axis=0) / duration
@@ -0,0 +1,33 @@
+from numpy import ndarray, asarray, ascontiguousarray, uint8, uint64, int64
+
+
+def as_channels(channels) -> ndarray:
+    """
+    Channels of a batch as a contiguous uint8 array, copying only if needed
+
+    Args:
+        channels: channels as returned by ``read_tags``
+
+    Returns:
+        (ndarray): uint8 channels
+    """
+    return ascontiguousarray(channels, dtype=uint8)
+
+
+def as_timestamps(timestamps) -> ndarray:
+    """
+    Timestamps of a batch as a contiguous int64 array, copying only if needed
+
+    ``read_tags`` returns uint64 views of the library's ``long long``
+    timestamps, these are reinterpreted as int64 without a copy.
+
+    Args:
+        timestamps: timestamps as returned by ``read_tags``
+
+    Returns:
+        (ndarray): int64 timestamps
+    """
+    timestamps = asarray(timestamps)
+    if timestamps.dtype == uint64:
+        timestamps = timestamps.view(int64)
+    return ascontiguousarray(timestamps, dtype=int64)
@@ -0,0 +1,327 @@
+import cython
+from typing import Optional, Sequence
+from numpy import (
+    ndarray,
+    zeros,
+    full,
+    empty,
+    arange,
+    int16,
+    int64,
+    uint8,
+    uint64,
+)
+
+from ._tags import as_channels, as_timestamps
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _tcspc(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    sync: cython.uchar,
+    rows: cython.const[cython.short][::1],
+    bin_width: cython.longlong,
+    histograms: cython.ulonglong[:, ::1],
+    keep_photons: cython.bint,
+    channels_out: cython.uchar[::1],
+    macro_out: cython.longlong[::1],
+    micro_out: cython.longlong[::1],
+    state: cython.longlong[::1],
+) -> cython.Py_ssize_t:
+    # Histogram each photon's delay from the latest sync before it. state
+    # holds the latest sync, whether there is one, and the counts of photons
+    # before the first sync, photons past the histogram, syncs, synced
+    # photons and photons earlier than the latest sync, and is updated for
+    # the next batch. Returns the number of photons written.
+    i: cython.Py_ssize_t
+    kept: cython.Py_ssize_t = 0
+    row: cython.short
+    c: cython.uchar
+    t: cython.longlong
+    delay: cython.longlong
+    k: cython.longlong
+    last_sync: cython.longlong = state[0]
+    synced: cython.bint = state[1] != 0
+    n_bins: cython.longlong = histograms.shape[1]
+
+    for i in range(timestamps.shape[0]):
+        c = channels[i]
+        t = timestamps[i]
+        if c == sync:
+            last_sync = t
+            synced = True
+            state[4] += 1
+            continue
+        row = rows[c]
+        if row < 0:
+            continue
+        if not synced:
+            state[2] += 1
+            continue
+        delay = t - last_sync
+        if delay < 0:
+            # Out of order, e.g. after a restart without reset()
+            state[6] += 1
+            continue
+        state[5] += 1
+        k = delay // bin_width
+        if k < n_bins:
+            histograms[row, k] += 1
+        else:
+            state[3] += 1
+        if keep_photons:
+            channels_out[kept] = c
+            macro_out[kept] = last_sync
+            micro_out[kept] = delay
+            kept += 1
+
+    state[0] = last_sync
+    state[1] = synced
+    return kept
+
+
+@cython.cclass
+class LifetimeHistogrammer:
+    """
+    Streaming TCSPC micro-time histograms against a sync channel.
+
+    Every tag on one of the photon channels is assigned the latest tag on
+    the sync channel before it, usually the laser's sync output, and its
+    delay from that sync, the micro-time, is histogrammed per channel in
+    ``bin_width`` bins. The latest sync is carried to the next batch, so
+    photons at the start of a batch are timed against the end of the one
+    before. Photons before the first sync are counted in :attr:`unsynced`,
+    photons delayed beyond the histogram in :attr:`overflow` and photons
+    earlier than the latest sync, which only out of order tags can be, in
+    :attr:`early`.
+
+    With ``keep_photons`` :meth:`process` also returns every synced photon
+    as (channel, macro-time, micro-time), for lifetime imaging or time
+    gated analysis downstream.
+
+    Args:
+        sync (int): sync channel
+        channels (Sequence[int]): photon channels
+        number_of_bins (int): length of each histogram
+        bin_width (int): histogram bin width in bins of
+            ``UQDLogic16.resolution``
+        keep_photons (bool): return the per photon times from
+            :meth:`process`
+    """
+
+    _sync: cython.uchar
+    _channels: list
+    _rows: ndarray
+    _bin_width: cython.longlong
+    _keep_photons: cython.bint
+    _histograms: ndarray
+    _state: ndarray
+
+    def __init__(
+        self,
+        sync: int,
+        channels: Sequence[int],
+        number_of_bins: int,
+        bin_width: int = 1,
+        keep_photons: bool = False,
+    ):
+        if not (0 <= sync < 256):
+            raise ValueError('sync must be in range 0 <= channel < 256')
+        if number_of_bins < 1:
+            raise ValueError('number_of_bins must be >= 1')
+        if bin_width < 1:
+            raise ValueError('bin_width must be >= 1')
+
+        self._channels = [int(c) for c in channels]
+        if len(self._channels) == 0:
+            raise ValueError('At least one photon channel is required')
+        self._rows = full(256, -1, dtype=int16)
+        for row, c in enumerate(self._channels):
+            if not (0 <= c < 256):
+                raise ValueError('channels must be in range 0 <= channel < 256')
+            if c == sync:
+                raise ValueError('The sync channel cannot be a photon channel')
+            if self._rows[c] >= 0:
+                raise ValueError(f'Channel {c} is given twice')
+            self._rows[c] = row
+
+        self._sync = sync
+        self._bin_width = bin_width
+        self._keep_photons = keep_photons
+        self._histograms = zeros(
+            (len(self._channels), number_of_bins), dtype=uint64
+        )
+        self._state = zeros(7, dtype=int64)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the histograms and counters and forget the latest sync
+        """
+        self._histograms[:] = 0
+        self._state[:] = 0
+
+    @property
+    def sync(self) -> int:
+        """
+        Sync channel
+
+        Returns:
+            (int): channel
+        """
+        return self._sync
+
+    @property
+    def channels(self) -> list:
+        """
+        Photon channels, in the order of the histogram rows
+
+        Returns:
+            (List[int]): channels
+        """
+        return list(self._channels)
+
+    @property
+    def bin_width(self) -> int:
+        """
+        Histogram bin width in bins
+
+        Returns:
+            (int): bin width
+        """
+        return self._bin_width
+
+    @property
+    def bin_edges(self) -> ndarray:
+        """
+        Micro-time at the edges of the histogram bins
+
+        Returns:
+            (ndarray): int64 array of length bins + 1, in bins
+        """
+        return arange(self._histograms.shape[1] + 1, dtype=int64) * (
+            self._bin_width
+        )
+
+    @property
+    def histograms(self) -> ndarray:
+        """
+        Accumulated micro-time histograms, one row per photon channel
+
+        Returns:
+            (ndarray): uint64 array of shape (channels, bins)
+        """
+        return self._histograms
+
+    @property
+    def last_sync(self) -> Optional[int]:
+        """
+        Timestamp of the latest sync
+
+        Returns:
+            (int | None): timestamp in bins, None before the first sync
+        """
+        if self._state[1] == 0:
+            return None
+        return int(self._state[0])
+
+    @property
+    def syncs(self) -> int:
+        """
+        Number of syncs seen
+
+        Returns:
+            (int): sync tags processed
+        """
+        return int(self._state[4])
+
+    @property
+    def photons(self) -> int:
+        """
+        Number of photons timed against a sync
+
+        Returns:
+            (int): photons histogrammed or counted in :attr:`overflow`
+        """
+        return int(self._state[5])
+
+    @property
+    def unsynced(self) -> int:
+        """
+        Number of photons before the first sync
+
+        Returns:
+            (int): photons dropped
+        """
+        return int(self._state[2])
+
+    @property
+    def overflow(self) -> int:
+        """
+        Number of photons delayed beyond the last histogram bin
+
+        Returns:
+            (int): photons not histogrammed
+        """
+        return int(self._state[3])
+
+    @property
+    def early(self) -> int:
+        """
+        Number of photons earlier than the latest sync
+
+        Tags are expected in time order, these come from a device restarted
+        without :meth:`reset` or from late tags of a merged stream.
+
+        Returns:
+            (int): photons dropped
+        """
+        return int(self._state[6])
+
+    @cython.ccall
+    def process(self, channels, timestamps):
+        """
+        Add a batch of tags, as returned by ``read_tags``
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+
+        Returns:
+            (Tuple[ndarray, ndarray, ndarray] | None): with ``keep_photons``
+            the uint8 channel, int64 macro-time and int64 micro-time in bins
+            of every synced photon, where the macro-time is the timestamp of
+            its sync, otherwise None
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+
+        size: cython.Py_ssize_t = n if self._keep_photons else 0
+        channels_out = empty(size, dtype=uint8)
+        macro_out = empty(size, dtype=int64)
+        micro_out = empty(size, dtype=int64)
+        kept: cython.Py_ssize_t = _tcspc(
+            channels,
+            timestamps,
+            self._sync,
+            self._rows,
+            self._bin_width,
+            self._histograms,
+            self._keep_photons,
+            channels_out,
+            macro_out,
+            micro_out,
+            self._state,
+        )
+        if self._keep_photons:
+            return channels_out[:kept], macro_out[:kept], micro_out[:kept]
+        return None
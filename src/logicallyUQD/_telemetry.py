@@ -0,0 +1,368 @@
+import cython
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from numpy import ndarray, zeros, arange, int64
+
+# Bucket b of a LogHistogram holds values v with 2**(b - 1) <= v < 2**b,
+# bucket 0 holds zero
+BUCKETS = 64
+
+
+@cython.cfunc
+@cython.inline
+@cython.exceptval(check=False)
+def _bucket(value: cython.longlong) -> cython.int:
+    b: cython.int = 0
+    while value > 0:
+        value >>= 1
+        b += 1
+    return b
+
+
+@cython.cclass
+class LogHistogram:
+    """
+    Histogram of non-negative integers in power of two buckets.
+
+    Adding a value costs a few shifts, percentiles are resolved to within a
+    factor of two, which is enough to tell a 10 us read from a 1 ms stall.
+    """
+
+    _counts: ndarray
+    _view: cython.longlong[::1]
+    count: cython.longlong
+    total: cython.longlong
+    minimum: cython.longlong
+    maximum: cython.longlong
+
+    def __init__(self):
+        self._counts = zeros(BUCKETS, dtype=int64)
+        self._view = self._counts
+        self.reset()
+
+    def reset(self):
+        """
+        Remove every value from the histogram
+        """
+        self._counts[:] = 0
+        self.count = 0
+        self.total = 0
+        self.minimum = 0
+        self.maximum = 0
+
+    @cython.ccall
+    def add(self, value: cython.longlong):
+        """
+        Add a value, negative values are counted as zero
+
+        Args:
+            value (int): value to add
+        """
+        if value < 0:
+            value = 0
+        self._view[_bucket(value)] += 1
+        if (self.count == 0) or (value < self.minimum):
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.count += 1
+        self.total += value
+
+    @property
+    def counts(self) -> ndarray:
+        """
+        Number of values in each bucket
+
+        Returns:
+            (ndarray): int64 array of length ``BUCKETS``
+        """
+        return self._counts.copy()
+
+    @property
+    def bucket_edges(self) -> ndarray:
+        """
+        Exclusive upper edge of each bucket
+
+        Returns:
+            (ndarray): int64 array of length ``BUCKETS``
+        """
+        edges = zeros(BUCKETS, dtype=int64)
+        edges[: BUCKETS - 1] = 1 << arange(BUCKETS - 1, dtype=int64)
+        edges[BUCKETS - 1] = 2**63 - 1
+        return edges
+
+    def percentile(self, q: float) -> int:
+        """
+        Upper bound of the ``q`` th percentile
+
+        Args:
+            q (float): percentile between 0 and 100
+
+        Returns:
+            (int): upper edge of the bucket holding the percentile, clipped
+            to the largest value seen
+        """
+        if self.count == 0:
+            return 0
+        target: cython.longlong = max(1, int(self.count * q / 100.0 + 0.5))
+        seen: cython.longlong = 0
+        b: cython.int
+        for b in range(BUCKETS):
+            seen += self._view[b]
+            if seen >= target:
+                if b == 0:
+                    return 0
+                edge: cython.ulonglong = cython.cast(cython.ulonglong, 1) << b
+                return min(edge - 1, self.maximum)
+        return self.maximum
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Count, mean, extremes and percentiles of the values
+
+        Returns:
+            (Dict[str, float]): keys ``count``, ``mean``, ``min``, ``max``,
+            ``p50``, ``p90`` and ``p99``
+        """
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count > 0 else 0.0,
+            'min': self.minimum,
+            'max': self.maximum,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+        }
+
+
+@cython.cclass
+class Telemetry:
+    """
+    Counters and latency histograms of an acquisition.
+
+    Devices record into this when telemetry is enabled with
+    ``enable_telemetry``: the latency of each library call by name, the
+    number of tags and the gap between consecutive tag reads, and every error
+    flag reported by the device. :meth:`snapshot` returns the lot as a plain
+    dict that is cheap enough to poll from a UI or a logger.
+
+    All times are taken with ``time.perf_counter_ns``.
+
+    Args:
+        flag_names (Dict[int, str], optional): name of each error flag bit
+            value, as the first entries of ``UQD_ERROR_FLAG``
+        history (int): number of error events kept for :meth:`error_events`
+    """
+
+    _flag_names: dict
+    _calls: dict
+    _tags_per_read: LogHistogram
+    _read_gaps: LogHistogram
+    _flag_counts: ndarray
+    _flag_last: ndarray
+    _events: object
+    _origin: cython.longlong
+    _first_read: cython.longlong
+    _last_read: cython.longlong
+    _reads: cython.longlong
+    _empty_reads: cython.longlong
+    _tags: cython.longlong
+    _recent_rate: cython.double
+
+    def __init__(
+        self, flag_names: Optional[Dict[int, str]] = None, history: int = 1024
+    ):
+        self._flag_names = dict(flag_names) if flag_names is not None else {}
+        self._calls = {}
+        self._tags_per_read = LogHistogram()
+        self._read_gaps = LogHistogram()
+        self._flag_counts = zeros(32, dtype=int64)
+        self._flag_last = zeros(32, dtype=int64)
+        self._events = deque(maxlen=history)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear every counter and restart the clock
+        """
+        self._calls.clear()
+        self._tags_per_read.reset()
+        self._read_gaps.reset()
+        self._flag_counts[:] = 0
+        self._flag_last[:] = -1
+        self._events.clear()
+        self._origin = time.perf_counter_ns()
+        self._first_read = -1
+        self._last_read = -1
+        self._reads = 0
+        self._empty_reads = 0
+        self._tags = 0
+        self._recent_rate = 0.0
+
+    @cython.ccall
+    def record_call(self, name: str, elapsed_ns: cython.longlong):
+        """
+        Add the latency of one library call
+
+        Args:
+            name (str): name of the call, e.g. ``'read_tags'``
+            elapsed_ns (int): time spent in the call in nanoseconds
+        """
+        histogram = self._calls.get(name)
+        if histogram is None:
+            histogram = LogHistogram()
+            self._calls[name] = histogram
+        cython.cast(LogHistogram, histogram).add(elapsed_ns)
+
+    @cython.ccall
+    def record_read(
+        self,
+        tags: cython.longlong,
+        start_ns: cython.longlong,
+        end_ns: cython.longlong,
+    ):
+        """
+        Add one read of tags from the device
+
+        Args:
+            tags (int): number of tags returned
+            start_ns (int): time the read started
+            end_ns (int): time the read returned
+        """
+        if self._last_read >= 0:
+            self._read_gaps.add(start_ns - self._last_read)
+            # Rate since the previous read, smoothed over about ten reads
+            elapsed: cython.longlong = end_ns - self._last_read
+            if elapsed > 0:
+                rate: cython.double = tags * 1e9 / elapsed
+                if self._recent_rate == 0.0:
+                    self._recent_rate = rate
+                else:
+                    self._recent_rate += 0.1 * (rate - self._recent_rate)
+        else:
+            self._first_read = start_ns
+        self._last_read = end_ns
+
+        self._reads += 1
+        if tags <= 0:
+            self._empty_reads += 1
+        self._tags += tags
+        self._tags_per_read.add(tags)
+
+    @cython.ccall
+    def record_error_flags(self, flags: cython.int, time_ns: cython.longlong):
+        """
+        Add the error flags returned by one ``read_error_flags`` call
+
+        Args:
+            flags (int): error bit set, zero if no error occurred
+            time_ns (int): time the flags were read
+        """
+        if flags == 0:
+            return
+        self._events.append(((time_ns - self._origin) * 1e-9, flags))
+        i: cython.int
+        for i in range(32):
+            if (flags >> i) & 1:
+                self._flag_counts[i] += 1
+                self._flag_last[i] = time_ns
+
+    def _flag_name(self, bit: int) -> str:
+        return self._flag_names.get(1 << bit, f'Flag{1 << bit}')
+
+    def error_counts(self) -> Dict[str, int]:
+        """
+        Number of reads that reported each error flag
+
+        Returns:
+            (Dict[str, int]): count by flag name, only flags seen are listed
+        """
+        return {
+            self._flag_name(i): int(self._flag_counts[i])
+            for i in range(32)
+            if self._flag_counts[i] > 0
+        }
+
+    def error_events(self) -> List[Tuple[float, int]]:
+        """
+        Most recent reads that reported errors
+
+        Returns:
+            (List[Tuple[float, int]]): (time in seconds since the telemetry
+            was started or reset, error bit set) oldest first
+        """
+        return list(self._events)
+
+    def histogram(self, name: str) -> LogHistogram:
+        """
+        Latency histogram of a library call
+
+        Args:
+            name (str): name of the call
+
+        Returns:
+            (LogHistogram): latencies in nanoseconds
+        """
+        return self._calls[name]
+
+    @property
+    def tags_per_read(self) -> LogHistogram:
+        """
+        Histogram of the number of tags returned by each read
+
+        Returns:
+            (LogHistogram): tags per read
+        """
+        return self._tags_per_read
+
+    @property
+    def read_gaps(self) -> LogHistogram:
+        """
+        Histogram of the time between the end of one read and the next
+
+        Returns:
+            (LogHistogram): gaps in nanoseconds
+        """
+        return self._read_gaps
+
+    def snapshot(self) -> dict:
+        """
+        Current state of every counter as plain Python values
+
+        Returns:
+            (dict): with keys ``elapsed`` (seconds since start or reset),
+            ``calls`` (latency summary in ns by call name), ``reads`` (read
+            counts, tag rates and the ``tags_per_read`` and ``gap_ns``
+            summaries) and ``errors`` (count and last time seen by flag
+            name)
+        """
+        now = time.perf_counter_ns()
+        duration = self._last_read - self._first_read
+        errors = {}
+        for i in range(32):
+            if self._flag_counts[i] > 0:
+                errors[self._flag_name(i)] = {
+                    'count': int(self._flag_counts[i]),
+                    'last_seen': (self._flag_last[i] - self._origin) * 1e-9,
+                }
+
+        return {
+            'elapsed': (now - self._origin) * 1e-9,
+            'calls': {
+                name: histogram.summary()
+                for name, histogram in self._calls.items()
+            },
+            'reads': {
+                'count': self._reads,
+                'empty': self._empty_reads,
+                'tags': self._tags,
+                'tags_per_second': (
+                    self._tags * 1e9 / duration if duration > 0 else 0.0
+                ),
+                'recent_tags_per_second': self._recent_rate,
+                'tags_per_read': self._tags_per_read.summary(),
+                'gap_ns': self._read_gaps.summary(),
+            },
+            'errors': errors,
+        }
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import cython
+from fractions import Fraction
+from numpy import ndarray, zeros, empty, asarray, rint, float64, int64
+
+from ._tags import as_channels, as_timestamps
+from ._calibration import VendorCalibration
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+@cython.nogil
+@cython.exceptval(check=False)
+def _to_picoseconds(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    numerator: cython.longlong,
+    denominator: cython.longlong,
+    offsets: cython.const[cython.longlong][::1],
+    out: cython.longlong[::1],
+) -> cython.void:
+    # ps = t * numerator / denominator + offset, split so that t * numerator
+    # cannot overflow. Floor division keeps negative timestamps monotonic.
+    i: cython.Py_ssize_t
+    t: cython.longlong
+    q: cython.longlong
+    r: cython.longlong
+    for i in range(timestamps.shape[0]):
+        t = timestamps[i]
+        q = t // denominator
+        r = t % denominator
+        if r < 0:
+            q -= 1
+            r += denominator
+        out[i] = q * numerator + (r * numerator) // denominator
+        out[i] += offsets[channels[i]]
+
+
+@cython.cfunc
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.nogil
+@cython.exceptval(check=False)
+def _to_seconds(
+    channels: cython.const[cython.uchar][::1],
+    timestamps: cython.const[cython.longlong][::1],
+    resolution: cython.double,
+    offsets: cython.const[cython.double][::1],
+    out: cython.double[::1],
+) -> cython.void:
+    i: cython.Py_ssize_t
+    for i in range(timestamps.shape[0]):
+        out[i] = timestamps[i] * resolution + offsets[channels[i]]
+
+
+@cython.cclass
+class TimeConverter:
+    """
+    Convert timetags from bins to calibrated physical time.
+
+    Each tag's timestamp is scaled by the resolution and the delay of its
+    channel is added in a single pass, writing straight into the output so
+    no temporaries are allocated. Picoseconds are computed with exact integer
+    arithmetic, so ``78.125e-12`` resolution gives whole picoseconds for
+    every eighth bin and truncates the rest.
+
+    Passing the int64 timestamps themselves as ``out`` converts a batch in
+    place.
+
+    Args:
+        resolution (float): bin width in seconds, ``UQDLogic16.resolution``
+        delays (Sequence[float], optional): delay in seconds added to each
+            channel, negative values correct for a channel's latency
+        number_of_channels (int): number of channels ``delays`` describes
+    """
+
+    _resolution: cython.double
+    _numerator: cython.longlong
+    _denominator: cython.longlong
+    _number_of_channels: cython.int
+    _delays: ndarray
+    _offsets_ps: ndarray
+    _offsets_s: ndarray
+
+    def __init__(
+        self,
+        resolution: float,
+        delays=None,
+        number_of_channels: int = 16,
+    ):
+        if resolution <= 0:
+            raise ValueError('resolution must be > 0')
+        if (number_of_channels < 1) or (number_of_channels > 256):
+            raise ValueError('number_of_channels must be between 1 and 256')
+
+        self._resolution = resolution
+        ratio = Fraction(resolution * 1e12).limit_denominator(1 << 20)
+        self._numerator = ratio.numerator
+        self._denominator = ratio.denominator
+        self._number_of_channels = number_of_channels
+
+        self._delays = zeros(number_of_channels, dtype=float64)
+        if delays is not None:
+            delays = asarray(delays, dtype=float64).reshape(-1)
+            if delays.shape[0] != number_of_channels:
+                raise ValueError(
+                    f'delays must have {number_of_channels} entries'
+                )
+            self._delays[:] = delays
+
+        # Indexed directly by the uint8 channel so out of range channels
+        # need no special casing
+        self._offsets_s = zeros(256, dtype=float64)
+        self._offsets_s[:number_of_channels] = self._delays
+        self._offsets_ps = zeros(256, dtype=int64)
+        self._offsets_ps[:number_of_channels] = rint(self._delays * 1e12)
+
+    @classmethod
+    def from_calibration(
+        cls, calibration, resolution: float, unit: float = 1e-12
+    ) -> TimeConverter:
+        """
+        Converter that removes the channel delays of a vendor calibration
+
+        Args:
+            calibration (VendorCalibration | str): calibration, or the path
+                of a ``Timetag Calibration Data`` file
+            resolution (float): bin width in seconds
+            unit (float): seconds per unit of the file's delay column
+
+        Returns:
+            (TimeConverter): converter subtracting each channel's delay
+        """
+        if isinstance(calibration, str):
+            calibration = VendorCalibration.load(calibration)
+        return cls(
+            resolution,
+            -calibration.delays(unit),
+            calibration.number_of_channels,
+        )
+
+    @property
+    def resolution(self) -> float:
+        """
+        Bin width of the input timestamps
+
+        Returns:
+            (float): resolution in seconds
+        """
+        return self._resolution
+
+    @property
+    def delays(self) -> ndarray:
+        """
+        Delay added to each channel
+
+        Returns:
+            (ndarray): delays in seconds
+        """
+        return self._delays.copy()
+
+    @cython.ccall
+    def to_picoseconds(self, channels, timestamps, out=None) -> ndarray:
+        """
+        Convert a batch to int64 picoseconds
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+            out (ndarray, optional): int64 array to write to, may be
+                ``timestamps`` to convert in place
+
+        Returns:
+            (ndarray): calibrated time of each tag in picoseconds
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+        if out is None:
+            out = empty(n, dtype=int64)
+        elif out.shape[0] < n:
+            raise ValueError('out must be at least as long as timestamps')
+
+        out_view: cython.longlong[::1] = out
+        _to_picoseconds(
+            channels,
+            timestamps,
+            self._numerator,
+            self._denominator,
+            self._offsets_ps,
+            out_view[:n],
+        )
+        return out[:n]
+
+    @cython.ccall
+    def to_seconds(self, channels, timestamps, out=None) -> ndarray:
+        """
+        Convert a batch to float64 seconds
+
+        Args:
+            channels (ndarray): channel of each tag
+            timestamps (ndarray): timestamp of each tag in bins
+            out (ndarray, optional): float64 array to write to
+
+        Returns:
+            (ndarray): calibrated time of each tag in seconds
+        """
+        channels = as_channels(channels)
+        timestamps = as_timestamps(timestamps)
+        n: cython.Py_ssize_t = timestamps.shape[0]
+        if channels.shape[0] != n:
+            raise ValueError('channels and timestamps must be the same length')
+        if out is None:
+            out = empty(n, dtype=float64)
+        elif out.shape[0] < n:
+            raise ValueError('out must be at least as long as timestamps')
+
+        out_view: cython.double[::1] = out
+        _to_seconds(
+            channels,
+            timestamps,
+            self._resolution,
+            self._offsets_s,
+            out_view[:n],
+        )
+        return out[:n]
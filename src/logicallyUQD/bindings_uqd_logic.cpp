@@ -1,10 +1,14 @@
 #include "bindings_uqd_logic.h"
 #include "CLogic.h"
 #include "CTimeTag.h"
+#include <algorithm>
+#include <atomic>
+#include <chrono>
 #include <cstdio>
 #include <cstring>
 #include <stdexcept>
 #include <stdint.h>
+#include <thread>
 #include <vector>
 
 extern "C" {
@@ -259,3 +263,396 @@ CLogic_setOutputEventCount(CLogic_ptr logic, int events) {
 }
 
 } // extern "C"
+
+namespace {
+
+// Single producer, single consumer ring of timetags filled from a native
+// thread. ``head`` and ``tail`` count tags written and released since the
+// stream was created, their difference is the number of unread tags.
+struct TagStream {
+    TimeTag::CTimeTag* timetag;
+    std::vector<c_ChannelType> channels;
+    std::vector<c_TimeType> times;
+    i64 capacity;
+    int min_poll_us;
+    int max_poll_us;
+
+    std::atomic<i64> head{ 0 };
+    std::atomic<i64> tail{ 0 };
+    std::atomic<i64> dropped{ 0 };
+    std::atomic<i64> batches{ 0 };
+    std::atomic<int> poll_us{ 0 };
+    std::atomic<int> error_flags{ 0 };
+    std::atomic<bool> running{ false };
+    std::thread worker;
+
+    void push(const c_ChannelType* ch, const c_TimeType* tt, i64 count);
+    void run();
+};
+
+void
+TagStream::push(const c_ChannelType* ch, const c_TimeType* tt, i64 count) {
+    i64 h = head.load(std::memory_order_relaxed);
+    i64 space = capacity - (h - tail.load(std::memory_order_acquire));
+
+    // Keep the oldest tags so the ring stays time ordered, the remainder
+    // of the batch is counted as dropped.
+    if (count > space) {
+        dropped.fetch_add(count - space, std::memory_order_relaxed);
+        count = space;
+    }
+    if (count <= 0) {
+        return;
+    }
+
+    i64 start = h % capacity;
+    i64 first = std::min(count, capacity - start);
+    std::memcpy(&channels[start], ch, first * sizeof(c_ChannelType));
+    std::memcpy(&times[start], tt, first * sizeof(c_TimeType));
+    if (count > first) {
+        std::memcpy(
+          &channels[0], ch + first, (count - first) * sizeof(c_ChannelType));
+        std::memcpy(&times[0], tt + first, (count - first) * sizeof(c_TimeType));
+    }
+
+    head.store(h + count, std::memory_order_release);
+}
+
+void
+TagStream::run() {
+    using clock = std::chrono::steady_clock;
+
+    c_ChannelType* ch = nullptr;
+    c_TimeType* tt = nullptr;
+
+    // Aim for each poll to collect about an eighth of the ring, leaving
+    // headroom for bursts while keeping the number of USB reads low.
+    const double target = static_cast<double>(capacity) / 8.0;
+    double rate = 0.0; // smoothed tags per microsecond
+    int interval = min_poll_us;
+    auto last = clock::now();
+
+    while (running.load(std::memory_order_acquire)) {
+        int count = timetag->ReadTags(ch, tt);
+        auto now = clock::now();
+        double elapsed =
+          std::chrono::duration<double, std::micro>(now - last).count();
+        last = now;
+
+        int flags = timetag->ReadErrorFlags();
+        if (flags != 0) {
+            error_flags.fetch_or(flags, std::memory_order_relaxed);
+        }
+
+        if (count > 0) {
+            push(ch, tt, count);
+            batches.fetch_add(1, std::memory_order_relaxed);
+        }
+
+        if (elapsed > 0.0) {
+            double observed = count / elapsed;
+            rate = (rate == 0.0) ? observed : 0.8 * rate + 0.2 * observed;
+        }
+
+        if (rate > 0.0) {
+            double next = target / rate;
+            interval = next > max_poll_us ? max_poll_us : static_cast<int>(next);
+        } else {
+            interval = interval * 2;
+        }
+        interval = std::max(min_poll_us, std::min(max_poll_us, interval));
+        poll_us.store(interval, std::memory_order_relaxed);
+
+        std::this_thread::sleep_for(std::chrono::microseconds(interval));
+    }
+}
+
+} // namespace
+
+extern "C" {
+
+TagStream_ptr
+TagStream_create(CTimeTag_ptr timetag,
+                 i64 capacity,
+                 int min_poll_us,
+                 int max_poll_us) {
+    auto stream = new TagStream();
+    stream->timetag = reinterpret_cast<TimeTag::CTimeTag*>(timetag);
+    stream->capacity = capacity;
+    stream->channels.resize(capacity);
+    stream->times.resize(capacity);
+    stream->min_poll_us = min_poll_us;
+    stream->max_poll_us = max_poll_us;
+    stream->poll_us.store(min_poll_us);
+    return stream;
+}
+
+void
+TagStream_destroy(TagStream_ptr stream) {
+    TagStream_stop(stream);
+    delete reinterpret_cast<TagStream*>(stream);
+}
+
+int
+TagStream_start(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    if (ptr->running.exchange(true)) {
+        return 0;
+    }
+    ptr->worker = std::thread(&TagStream::run, ptr);
+    return 1;
+}
+
+void
+TagStream_stop(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    ptr->running.store(false, std::memory_order_release);
+    if (ptr->worker.joinable()) {
+        ptr->worker.join();
+    }
+}
+
+int
+TagStream_isRunning(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    return ptr->running.load() ? 1 : 0;
+}
+
+i64
+TagStream_available(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    return ptr->head.load(std::memory_order_acquire) -
+           ptr->tail.load(std::memory_order_relaxed);
+}
+
+i64
+TagStream_peek(TagStream_ptr stream,
+               c_ChannelType** channel_ret,
+               c_TimeType** time_ret,
+               i64 max_count) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    i64 t = ptr->tail.load(std::memory_order_relaxed);
+    i64 count = ptr->head.load(std::memory_order_acquire) - t;
+    i64 start = t % ptr->capacity;
+
+    // Only hand out the contiguous part, the wrapped remainder is returned
+    // by the next call.
+    count = std::min(count, ptr->capacity - start);
+    if ((max_count > 0) && (count > max_count)) {
+        count = max_count;
+    }
+
+    *channel_ret = &ptr->channels[start];
+    *time_ret = &ptr->times[start];
+    return count;
+}
+
+void
+TagStream_release(TagStream_ptr stream, i64 count) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    i64 t = ptr->tail.load(std::memory_order_relaxed);
+    i64 h = ptr->head.load(std::memory_order_acquire);
+    count = std::max(static_cast<i64>(0), std::min(count, h - t));
+    ptr->tail.store(t + count, std::memory_order_release);
+}
+
+i64
+TagStream_capacity(TagStream_ptr stream) {
+    return reinterpret_cast<TagStream*>(stream)->capacity;
+}
+
+i64
+TagStream_totalTags(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    return ptr->head.load(std::memory_order_relaxed);
+}
+
+i64
+TagStream_droppedTags(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    return ptr->dropped.load(std::memory_order_relaxed);
+}
+
+i64
+TagStream_batches(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    return ptr->batches.load(std::memory_order_relaxed);
+}
+
+int
+TagStream_pollInterval(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    return ptr->poll_us.load(std::memory_order_relaxed);
+}
+
+int
+TagStream_takeErrorFlags(TagStream_ptr stream) {
+    auto ptr = reinterpret_cast<TagStream*>(stream);
+    return ptr->error_flags.exchange(0);
+}
+
+} // extern "C"
+
+namespace {
+
+// Periodic snapshot of the logic counters taken from a native thread. The
+// ring arrays are owned by the caller, ``head`` counts samples written since
+// the sampler was created and the oldest samples are overwritten once the
+// ring is full.
+struct LogicSampler {
+    TimeTag::CLogic* logic;
+    std::vector<int> patterns;
+    i64 capacity;
+    int interval_us;
+    i64* time_counters;
+    u64* counts;
+
+    std::atomic<i64> head{ 0 };
+    std::atomic<i64> overruns{ 0 };
+    std::atomic<bool> running{ false };
+    std::thread worker;
+
+    void run();
+};
+
+void
+LogicSampler::run() {
+    using clock = std::chrono::steady_clock;
+
+    const auto interval = std::chrono::microseconds(interval_us);
+    const size_t n = patterns.size();
+    auto next = clock::now() + interval;
+
+    // Discard the counts accumulated before the first interval
+    logic->ReadLogic();
+
+    while (running.load(std::memory_order_acquire)) {
+        std::this_thread::sleep_until(next);
+
+        logic->ReadLogic();
+        i64 h = head.load(std::memory_order_relaxed);
+        i64 slot = h % capacity;
+        time_counters[slot] = logic->GetTimeCounter();
+        for (size_t p = 0; p < n; p++) {
+            counts[slot * n + p] =
+              static_cast<u64>(logic->CalcCountPos(patterns[p]));
+        }
+        head.store(h + 1, std::memory_order_release);
+
+        // Keep the cadence fixed, if a deadline was missed start again from
+        // now rather than sampling in a burst to catch up.
+        next += interval;
+        auto now = clock::now();
+        if (now > next) {
+            overruns.fetch_add(1, std::memory_order_relaxed);
+            next = now + interval;
+        }
+    }
+}
+
+} // namespace
+
+extern "C" {
+
+LogicSampler_ptr
+LogicSampler_create(CLogic_ptr logic,
+                    const int* patterns,
+                    int pattern_count,
+                    i64 capacity,
+                    int interval_us,
+                    i64* time_counters,
+                    u64* counts) {
+    auto sampler = new LogicSampler();
+    sampler->logic = reinterpret_cast<TimeTag::CLogic*>(logic);
+    sampler->patterns.assign(patterns, patterns + pattern_count);
+    sampler->capacity = capacity;
+    sampler->interval_us = interval_us;
+    sampler->time_counters = time_counters;
+    sampler->counts = counts;
+    return sampler;
+}
+
+void
+LogicSampler_destroy(LogicSampler_ptr sampler) {
+    LogicSampler_stop(sampler);
+    delete reinterpret_cast<LogicSampler*>(sampler);
+}
+
+int
+LogicSampler_start(LogicSampler_ptr sampler) {
+    auto ptr = reinterpret_cast<LogicSampler*>(sampler);
+    if (ptr->running.exchange(true)) {
+        return 0;
+    }
+    ptr->worker = std::thread(&LogicSampler::run, ptr);
+    return 1;
+}
+
+void
+LogicSampler_stop(LogicSampler_ptr sampler) {
+    auto ptr = reinterpret_cast<LogicSampler*>(sampler);
+    ptr->running.store(false, std::memory_order_release);
+    if (ptr->worker.joinable()) {
+        ptr->worker.join();
+    }
+}
+
+int
+LogicSampler_isRunning(LogicSampler_ptr sampler) {
+    auto ptr = reinterpret_cast<LogicSampler*>(sampler);
+    return ptr->running.load() ? 1 : 0;
+}
+
+i64
+LogicSampler_samples(LogicSampler_ptr sampler) {
+    auto ptr = reinterpret_cast<LogicSampler*>(sampler);
+    return ptr->head.load(std::memory_order_acquire);
+}
+
+i64
+LogicSampler_overruns(LogicSampler_ptr sampler) {
+    auto ptr = reinterpret_cast<LogicSampler*>(sampler);
+    return ptr->overruns.load(std::memory_order_relaxed);
+}
+
+i64
+LogicSampler_latest(LogicSampler_ptr sampler,
+                    i64 max_samples,
+                    i64* time_counters_out,
+                    u64* counts_out) {
+    auto ptr = reinterpret_cast<LogicSampler*>(sampler);
+    const i64 n = static_cast<i64>(ptr->patterns.size());
+
+    // The slot after head may be written while copying, so at most
+    // capacity - 1 samples are stable.
+    i64 h = ptr->head.load(std::memory_order_acquire);
+    i64 count = std::min(h, ptr->capacity - 1);
+    if ((max_samples >= 0) && (count > max_samples)) {
+        count = max_samples;
+    }
+    i64 first = h - count;
+
+    for (i64 i = 0; i < count; i++) {
+        i64 slot = (first + i) % ptr->capacity;
+        time_counters_out[i] = ptr->time_counters[slot];
+        std::memcpy(
+          &counts_out[i * n], &ptr->counts[slot * n], n * sizeof(u64));
+    }
+
+    // Drop any samples the thread overwrote while they were being copied
+    i64 valid = ptr->head.load(std::memory_order_acquire) - ptr->capacity + 1;
+    i64 skip = std::max(static_cast<i64>(0), valid - first);
+    if (skip >= count) {
+        return 0;
+    }
+    if (skip > 0) {
+        std::memmove(time_counters_out,
+                     time_counters_out + skip,
+                     (count - skip) * sizeof(i64));
+        std::memmove(
+          counts_out, counts_out + skip * n, (count - skip) * n * sizeof(u64));
+    }
+    return count - skip;
+}
+
+} // extern "C"
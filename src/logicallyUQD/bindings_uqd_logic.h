@@ -11,12 +11,15 @@ extern "C" {
 
 typedef uint8_t u8;
 typedef int64_t i64;
+typedef uint64_t u64;
 
 typedef long long c_TimeType;
 typedef u8 c_ChannelType;
 
 typedef void* CTimeTag_ptr;
 typedef void* CLogic_ptr;
+typedef void* TagStream_ptr;
+typedef void* LogicSampler_ptr;
 
 // Main functions
 
@@ -149,6 +152,91 @@ CLogic_setOutputPattern(CLogic_ptr logic, int output, int pos, int neg);
 void
 CLogic_setOutputEventCount(CLogic_ptr logic, int events);
 
+// Background acquisition functions
+
+TagStream_ptr
+TagStream_create(CTimeTag_ptr timetag,
+                 i64 capacity,
+                 int min_poll_us,
+                 int max_poll_us);
+
+void
+TagStream_destroy(TagStream_ptr stream);
+
+int
+TagStream_start(TagStream_ptr stream);
+
+void
+TagStream_stop(TagStream_ptr stream);
+
+int
+TagStream_isRunning(TagStream_ptr stream);
+
+i64
+TagStream_available(TagStream_ptr stream);
+
+i64
+TagStream_peek(TagStream_ptr stream,
+               c_ChannelType** channel_ret,
+               c_TimeType** time_ret,
+               i64 max_count);
+
+void
+TagStream_release(TagStream_ptr stream, i64 count);
+
+i64
+TagStream_capacity(TagStream_ptr stream);
+
+i64
+TagStream_totalTags(TagStream_ptr stream);
+
+i64
+TagStream_droppedTags(TagStream_ptr stream);
+
+i64
+TagStream_batches(TagStream_ptr stream);
+
+int
+TagStream_pollInterval(TagStream_ptr stream);
+
+int
+TagStream_takeErrorFlags(TagStream_ptr stream);
+
+// Logic counter sampling functions
+
+LogicSampler_ptr
+LogicSampler_create(CLogic_ptr logic,
+                    const int* patterns,
+                    int pattern_count,
+                    i64 capacity,
+                    int interval_us,
+                    i64* time_counters,
+                    u64* counts);
+
+void
+LogicSampler_destroy(LogicSampler_ptr sampler);
+
+int
+LogicSampler_start(LogicSampler_ptr sampler);
+
+void
+LogicSampler_stop(LogicSampler_ptr sampler);
+
+int
+LogicSampler_isRunning(LogicSampler_ptr sampler);
+
+i64
+LogicSampler_samples(LogicSampler_ptr sampler);
+
+i64
+LogicSampler_overruns(LogicSampler_ptr sampler);
+
+i64
+LogicSampler_latest(LogicSampler_ptr sampler,
+                    i64 max_samples,
+                    i64* time_counters_out,
+                    u64* counts_out);
+
 #ifdef __cplusplus
 }
 #endif
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import time
+import warnings
+from logicallyUQD import CalibrationCache, SimulatedUQDLogic16
+
+
+def cache():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache', 'calibration.json')
+        cache = CalibrationCache(path, max_age=3600, calibration_dir=tmp)
+        vendor_file = cache.calibration_file(1)
+
+        uqd = SimulatedUQDLogic16(calibration_cache=cache)
+        assert not uqd.calibration_reused, 'Nothing is cached yet'
+        assert not cache.is_valid(1, uqd.identity), (
+            'Without the vendor file the calibration cannot be reused'
+        )
+
+        # As if CTimeTag_calibrate had written its results
+        with open(vendor_file, 'w') as f:
+            f.write('Timetag Calibration Data\nVerson 1\nChannels 0\n')
+        uqd = SimulatedUQDLogic16(calibration_cache=cache)
+        assert not uqd.calibration_reused
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            uqd = SimulatedUQDLogic16(calibration_cache=cache)
+        assert uqd.calibration_reused, 'The stored calibration should be used'
+        assert len(caught) == 1, 'Skipping the calibration should warn'
+        assert issubclass(caught[0].category, RuntimeWarning)
+
+        identity = dict(uqd.identity)
+        identity['fpga_version'] += 1
+        assert not cache.is_valid(1, identity), 'Firmware change invalidates'
+        identity = dict(uqd.identity)
+        identity['resolution'] *= 2
+        assert not cache.is_valid(1, identity)
+        assert not cache.is_valid(2, uqd.identity), 'Cached per device'
+
+        with open(vendor_file, 'a') as f:
+            f.write('\n0 0\n')
+        assert not cache.is_valid(1, uqd.identity), 'File changed'
+
+        cache.store(1, uqd.identity)
+        assert cache.is_valid(1, uqd.identity)
+        old = CalibrationCache(path, max_age=0.01, calibration_dir=tmp)
+        time.sleep(0.02)
+        assert not old.is_valid(1, uqd.identity), 'Too old'
+
+        cache.invalidate(1)
+        assert cache.lookup(1) is None
+        uqd = SimulatedUQDLogic16(calibration_cache=cache)
+        assert not uqd.calibration_reused
+
+
+def main():
+    cache()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
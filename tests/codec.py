@@ -0,0 +1,57 @@
+import io
+import numpy as np
+from logicallyUQD import encode_tags, decode_tags, TagEncoder, TagDecoder
+
+
+def main():
+    rng = np.random.default_rng(3)
+    n = 100_000
+    # Mix of short and very long gaps to exercise every varint length
+    gaps = rng.integers(0, 2**10, n)
+    gaps[::997] = rng.integers(2**40, 2**50, gaps[::997].shape[0])
+    timestamps = np.cumsum(gaps).astype(np.uint64)
+    channels = rng.integers(0, 16, n).astype(np.uint8)
+
+    frame = encode_tags(channels, timestamps)
+    decoded_channels, decoded_timestamps = decode_tags(frame)
+    assert np.array_equal(decoded_channels, channels), 'Channels round trip'
+    assert np.array_equal(decoded_timestamps, timestamps.astype(np.int64)), (
+        'Timestamps round trip'
+    )
+    assert len(frame) < 9 * n, 'Encoding should be smaller than raw tags'
+
+    # Gaps using the top bits of the varint next to the channel bits
+    wide = np.array([0, 2**59, 2**59 + 1], dtype=np.int64)
+    wide_channels = np.array([15, 15, 8], dtype=np.uint8)
+    decoded_channels, decoded_timestamps = decode_tags(
+        encode_tags(wide_channels, wide)
+    )
+    assert np.array_equal(decoded_channels, wide_channels), 'Wide channels'
+    assert np.array_equal(decoded_timestamps, wide), 'Wide timestamps'
+
+    stream = io.BytesIO()
+    encoder = TagEncoder(stream)
+    batches = np.array_split(np.arange(n), 5)
+    for batch in batches:
+        encoder.write(channels[batch], timestamps[batch])
+    encoder.write(channels[:0], timestamps[:0])
+
+    stream.seek(0)
+    decoded = list(TagDecoder(stream))
+    assert len(decoded) == len(batches) + 1, 'One batch per frame'
+    assert np.array_equal(
+        np.concatenate([d[1] for d in decoded]), timestamps.astype(np.int64)
+    ), 'Streamed timestamps round trip'
+
+    try:
+        encode_tags(channels[::-1], timestamps[::-1])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('Decreasing timestamps should be rejected')
+
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import numpy as np
+from logicallyUQD import CoincidenceCounter, pattern_from_channels
+
+
+def reference_counts(channels, timestamps, window, delays, n_channels):
+    delayed = timestamps + delays[channels]
+    order = np.argsort(delayed, kind='stable')
+    counts = np.zeros(1 << n_channels, dtype=np.uint64)
+
+    start = None
+    pattern = 0
+    for ch, t in zip(channels[order], delayed[order]):
+        if (start is not None) and (t - start <= window):
+            pattern |= 1 << int(ch)
+        else:
+            if start is not None:
+                counts[pattern] += 1
+            start = t
+            pattern = 1 << int(ch)
+    if start is not None:
+        counts[pattern] += 1
+    return counts
+
+
+def random_tags(n, n_channels, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = np.cumsum(rng.integers(0, 40, n)).astype(np.uint64)
+    channels = rng.integers(0, n_channels, n).astype(np.uint8)
+    return channels, timestamps
+
+
+def main():
+    n_channels = 4
+    channels, timestamps = random_tags(20_000, n_channels)
+    delays = np.array([0, 25, 3, 60], dtype=np.int64)
+    windows = [0, 10, 50]
+
+    counter = CoincidenceCounter(windows, delays, n_channels)
+    # Uneven batches so groups and delayed tags span batch boundaries
+    for batch in np.array_split(np.arange(channels.shape[0]), 7):
+        counter.process(channels[batch], timestamps[batch])
+    counter.flush()
+
+    for i, window in enumerate(windows):
+        expected = reference_counts(
+            channels, timestamps.astype(np.int64), window, delays, n_channels
+        )
+        assert np.array_equal(counter.counts[i], expected), (
+            f'Counts differ from reference for window {window}'
+        )
+
+    pattern = pattern_from_channels([1, 2])
+    counts_pos = counter.counts_pos(1)
+    assert counts_pos[pattern] == counter.count_pos(pattern, 1), (
+        'counts_pos and count_pos should agree'
+    )
+    assert counter.count(pattern, pattern_from_channels([3]), 1) <= (
+        counter.count_pos(pattern, 1)
+    ), 'Excluding a channel can only reduce the count'
+
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import numpy as np
+from logicallyUQD import DeviceConfig, SimulatedUQDLogic16
+
+
+def diffing():
+    uqd = SimulatedUQDLogic16(speed=None)
+    n = uqd.number_of_channels
+    config = DeviceConfig(n, input_threshold=-0.5, filter_min_count=2)
+    config.inversion[[1, 3]] = 1
+    config.input_delay[2] = 1e-9
+
+    # Nothing is known about the device yet, so every register is written
+    assert uqd.apply_config(config) == 2 * n + 7
+    assert uqd.apply_config(config) == 0, 'Nothing changed'
+    assert uqd._inversion_mask == 0b1010
+    assert np.all(uqd.input_threshold == -0.5)
+    assert uqd.filter_min_count == 2
+
+    step = config.copy()
+    step.input_threshold[[0, 5]] = 0.25
+    step.exclusion[4] = 1
+    # Rounds to the same number of bins as before
+    step.input_delay[2] = 1e-9 + uqd.resolution * 0.1
+    assert uqd.apply_config(step) == 3
+    assert uqd._exclusion_mask == 0b10000
+    assert uqd.input_threshold[5] == 0.25
+
+    assert uqd.apply_config(config) == 3, 'Back to the first configuration'
+    assert uqd.apply_config(config, force=True) == 2 * n + 7
+
+    # Changes through the setters are known to the diff
+    uqd.input_threshold = (1, 0.5)
+    assert uqd.apply_config(config) == 1
+
+    bad = config.copy()
+    bad.input_threshold[0] = 3
+    try:
+        uqd.apply_config(bad)
+        raise AssertionError('Out of range threshold accepted')
+    except ValueError:
+        pass
+    try:
+        uqd.apply_config(DeviceConfig(n + 1))
+        raise AssertionError('Wrong channel count accepted')
+    except ValueError:
+        pass
+
+
+def snapshot():
+    uqd = SimulatedUQDLogic16(speed=None)
+    config = DeviceConfig(
+        uqd.number_of_channels,
+        input_threshold=np.linspace(-1, 1, uqd.number_of_channels),
+        level_gate=True,
+        led_brightness=40,
+    )
+    config.exclusion[0] = 1
+    uqd.apply_config(config)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'config.json')
+        uqd.config.save(path)
+        restored = DeviceConfig.load(path)
+    assert restored == uqd.config
+    assert restored == config
+
+    other = SimulatedUQDLogic16(speed=None)
+    other.apply_config(restored)
+    assert other.config == config
+    assert other.level_gate and other.led_brightness == 40
+
+
+def main():
+    diffing()
+    snapshot()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import numpy as np
+from logicallyUQD import Correlator
+
+
+def reference_histogram(starts, stops, bin_width, max_lag, auto):
+    lags = stops[None, :] - starts[:, None]
+    if auto:
+        np.fill_diagonal(lags, 2 * max_lag)
+    lags = lags[(lags >= -max_lag) & (lags < max_lag)]
+    edges = np.arange(-max_lag, max_lag + 1, bin_width)
+    return np.histogram(lags, bins=edges)[0]
+
+
+def main():
+    rng = np.random.default_rng(1)
+    n = 4000
+    timestamps = np.cumsum(rng.integers(1, 30, n)).astype(np.uint64)
+    channels = rng.integers(0, 3, n).astype(np.uint8)
+
+    bin_width = 4
+    max_lag = 200
+    pairs = [(0, 1), (1, 0), (2, 2)]
+    correlator = Correlator(pairs, bin_width, max_lag)
+    for batch in np.array_split(np.arange(n), 9):
+        correlator.process(channels[batch], timestamps[batch])
+
+    timestamps = timestamps.astype(np.int64)
+    for p, (a, b) in enumerate(pairs):
+        expected = reference_histogram(
+            timestamps[channels == a],
+            timestamps[channels == b],
+            bin_width,
+            max_lag,
+            a == b,
+        )
+        assert np.array_equal(correlator.histograms[p], expected), (
+            f'Histogram differs from reference for pair {(a, b)}'
+        )
+
+    # Unsorted tags give meaningless counts but must not write outside the
+    # histograms
+    rng = np.random.default_rng(1)
+    unsorted = Correlator([(0, 1), (1, 1)], bin_width=4, max_lag=64)
+    for _ in range(3):
+        unsorted.process(
+            rng.integers(0, 2, 10000), rng.integers(0, 10**6, 10000)
+        )
+    assert unsorted.histograms.shape == (2, 32)
+
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
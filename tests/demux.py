@@ -0,0 +1,56 @@
+import numpy as np
+from logicallyUQD import Demultiplexer, PoissonSource, demultiplex
+
+
+def one_batch():
+    source = PoissonSource([1e6, 2e6, 0, 5e5, 1e5], seed=1)
+    channels, timestamps = source.generate(0, 10**7, 78.125e-12)
+    offsets, packed = demultiplex(channels, timestamps, 4)
+    assert offsets.shape[0] == 5
+    assert offsets[-1] == np.count_nonzero(channels < 4), 'Channel 4 dropped'
+    for c in range(4):
+        expected = timestamps[channels == c].astype(np.int64)
+        assert np.array_equal(packed[offsets[c] : offsets[c + 1]], expected)
+
+    offsets, packed = demultiplex([], [], 2)
+    assert np.array_equal(offsets, [0, 0, 0]) and packed.shape[0] == 0
+
+
+def batches():
+    source = PoissonSource([1e6, 4e6, 2e5], seed=2)
+    channels, timestamps = source.generate(0, 10**7, 78.125e-12)
+    demux = Demultiplexer(number_of_channels=2, capacity=16)
+    for i in range(0, channels.shape[0], 1000):
+        demux.append(channels[i : i + 1000], timestamps[i : i + 1000])
+
+    for c in range(2):
+        assert np.array_equal(demux[c], timestamps[channels == c])
+    assert demux.ignored == np.count_nonzero(channels == 2)
+    assert len(demux) == demux.counts.sum() == np.count_nonzero(channels < 2)
+    assert np.all(demux.capacity >= demux.counts)
+
+    offsets, packed = demux.csr()
+    assert np.array_equal(packed[offsets[1] : offsets[2]], demux.channel(1))
+
+    capacity = demux.capacity
+    demux.clear()
+    assert len(demux) == 0 and demux.channel(0).shape[0] == 0
+    demux.append(channels[:100], timestamps[:100])
+    assert np.array_equal(demux.capacity, capacity), 'Buffer is reused'
+    assert np.array_equal(demux[0], timestamps[:100][channels[:100] == 0])
+
+    try:
+        demux.channel(2)
+        raise AssertionError('Channel out of range accepted')
+    except ValueError:
+        pass
+
+
+def main():
+    one_batch()
+    batches()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
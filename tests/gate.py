@@ -0,0 +1,83 @@
+import numpy as np
+from logicallyUQD import CorrelatedSource, HeraldedGate, PoissonSource
+
+
+def reference(channels, timestamps, herald, gated, start, stop):
+    heralds = timestamps[channels == herald]
+    keep = np.zeros(channels.shape[0], dtype=bool)
+    index = np.full(channels.shape[0], -1)
+    for i in np.flatnonzero(np.isin(channels, gated)):
+        j = np.searchsorted(heralds, timestamps[i] - start, side='right') - 1
+        if (j >= 0) and (heralds[j] >= timestamps[i] - stop):
+            keep[i] = True
+            index[i] = j
+    return keep, index
+
+
+def streaming():
+    source = CorrelatedSource(
+        channels=[0, 1],
+        rate=2e5,
+        jitter=50e-12,
+        background=PoissonSource([1e5, 1e6, 1e6, 1e6], seed=7),
+        seed=7,
+    )
+    channels, timestamps = source.generate(0, 10**8, 78.125e-12)
+    timestamps = timestamps.astype(np.int64)
+    # A window starting at 0 would depend on where same timestamp heralds
+    # fall relative to the batch boundaries
+    start, stop = 1, 64
+    keep, index = reference(channels, timestamps, 0, [1, 2], start, stop)
+
+    gate = HeraldedGate(0, [1, 2], (start, stop))
+    kept_channels = []
+    kept_timestamps = []
+    kept_index = []
+    for i in range(0, channels.shape[0], 999):
+        c, t = gate.process(channels[i : i + 999], timestamps[i : i + 999])
+        kept_channels.append(c)
+        kept_timestamps.append(t)
+        kept_index.append(gate.herald_index)
+
+    assert np.array_equal(np.concatenate(kept_channels), channels[keep])
+    assert np.array_equal(np.concatenate(kept_timestamps), timestamps[keep])
+    assert np.array_equal(np.concatenate(kept_index), index[keep])
+    assert gate.heralds == np.count_nonzero(channels == 0)
+    assert gate.tags_in == channels.shape[0]
+    assert gate.tags_out == np.count_nonzero(keep)
+    # The correlated pairs survive, the uncorrelated background mostly not
+    assert gate.tags_out < channels.shape[0] / 5
+
+
+def windows():
+    # Heralds at 0 and 100, window from 10 to 50 bins after each
+    channels = np.array([0, 1, 1, 1, 0, 1, 1, 2, 1])
+    timestamps = np.array([0, 5, 10, 50, 100, 105, 130, 140, 151])
+    gate = HeraldedGate(0, [1], (10, 50), keep_heralds=True)
+    c, t = gate.process(channels[:5], timestamps[:5])
+    assert t.tolist() == [0, 10, 50, 100]
+    assert gate.herald_index.tolist() == [0, 0, 0, 1]
+    c, t = gate.process(channels[5:], timestamps[5:])
+    assert t.tolist() == [130] and c.tolist() == [1]
+    assert gate.herald_index.tolist() == [1]
+
+    gate.reset()
+    assert gate.heralds == 0
+    c, t = gate.process([], [])
+    assert c.shape[0] == 0
+    for bad in [(-1, 5), (5, 4)]:
+        try:
+            HeraldedGate(0, [1], bad)
+            raise AssertionError('Invalid window accepted')
+        except ValueError:
+            pass
+
+
+def main():
+    windows()
+    streaming()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
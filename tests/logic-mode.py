@@ -1,5 +1,10 @@
 from time import sleep
-from logicallyUQD import UQDLogic16, LogicMode, pattern_from_channels
+from logicallyUQD import (
+    UQDLogic16,
+    LogicMode,
+    LogicSampler,
+    pattern_from_channels,
+)
 
 uqd = UQDLogic16(calibrate=False)
 num_channels = uqd.number_of_channels
@@ -29,4 +34,16 @@ for i in range(10):
     # assert that both methods for getting counts from the channels is the same
     assert all([s == s_e for s, s_e in zip(singles, singles_ext)])
 
+    # all patterns can also be evaluated in a single call
+    singles_batch = logic.calc_counts(input_channels)
+    assert all([s == s_b for s, s_b in zip(singles, singles_batch)])
+
     print(time, singles)
+
+# The same counters sampled at a steady 1 kHz from a native thread
+with LogicSampler(logic, input_channels, interval=1e-3) as sampler:
+    sleep(1)
+time_counters, counts = sampler.latest()
+assert counts.shape == (time_counters.shape[0], num_channels)
+print(f'{sampler.samples} samples, {sampler.overruns} late')
+print('Rates:', sampler.rates())
@@ -0,0 +1,129 @@
+import time
+import numpy as np
+from logicallyUQD import (
+    MultiDeviceSession,
+    PoissonSource,
+    SimulatedUQDLogic16,
+    TagMerger,
+)
+
+
+def merger():
+    rng = np.random.default_rng(6)
+    streams = []
+    for s in range(3):
+        timestamps = np.sort(rng.integers(0, 10**6, 5000))
+        channels = rng.integers(0, 16, 5000).astype(np.uint8)
+        streams.append((channels, timestamps))
+
+    merger = TagMerger([0, 16, 32], time_offsets=[0, 5, -5])
+    merged_channels = []
+    merged_timestamps = []
+    positions = [0, 0, 0]
+    # Streams arrive in uneven batches
+    while any(p < 5000 for p in positions):
+        for s in range(3):
+            n = int(rng.integers(0, 300))
+            channels, timestamps = streams[s]
+            p = positions[s]
+            merger.push(s, channels[p : p + n], timestamps[p : p + n])
+            positions[s] = min(p + n, 5000)
+        channels, timestamps = merger.pop()
+        assert np.all(timestamps <= merger.watermark)
+        merged_channels.append(channels)
+        merged_timestamps.append(timestamps)
+    channels, timestamps = merger.pop(flush=True)
+    merged_channels.append(channels)
+    merged_timestamps.append(timestamps)
+    assert merger.buffered.sum() == 0 and merger.late_tags == 0
+
+    channels = np.concatenate(merged_channels)
+    timestamps = np.concatenate(merged_timestamps)
+    assert np.all(np.diff(timestamps) >= 0), 'Merged stream is sorted'
+    for s, offset in enumerate([0, 5, -5]):
+        mine = (channels >= 16 * s) & (channels < 16 * (s + 1))
+        assert np.array_equal(timestamps[mine], streams[s][1] + offset)
+        assert np.array_equal(channels[mine], streams[s][0] + 16 * s)
+
+    # A silent stream holds everything back until max_buffered is reached
+    merger = TagMerger([0, 16], max_buffered=100)
+    merger.push(0, np.zeros(50), np.arange(50))
+    assert merger.pop()[0].shape[0] == 0
+    merger.advance(1, 20)
+    assert merger.pop()[1].tolist() == list(range(21))
+    merger.push(0, np.zeros(80), np.arange(50, 130))
+    assert merger.pop()[0].shape[0] == 109, 'Over max_buffered'
+    merger.push(1, [1], [10])
+    assert merger.late_tags == 1
+
+
+def session():
+    devices = [
+        SimulatedUQDLogic16(
+            source=PoissonSource([1e5] * 16, seed=s), speed=None, step=1e-3
+        )
+        for s in range(3)
+    ]
+    with MultiDeviceSession(devices) as multi:
+        assert multi.number_of_channels == 48
+        assert multi.channel_offsets.tolist() == [0, 16, 32]
+        assert all(d.external_10MHz_reference for d in devices)
+        parts = []
+        deadline = time.perf_counter() + 0.5
+        while time.perf_counter() < deadline:
+            count, channels, timestamps = multi.read()
+            parts.append((channels, timestamps))
+            time.sleep(1e-3)
+        assert multi.lag().shape == (3,) and multi.lag().min() == 0
+    count, channels, timestamps = multi.read(flush=True)
+    parts.append((channels, timestamps))
+
+    channels = np.concatenate([c for c, _ in parts])
+    timestamps = np.concatenate([t for _, t in parts])
+    assert np.all(np.diff(timestamps) >= 0)
+    assert multi.merger.late_tags == 0
+    per_device = np.bincount(channels // 16, minlength=3)
+    assert np.all(per_device > 0) and per_device.shape[0] == 3
+    assert multi.buffered().sum() == 0
+    print(per_device, multi.reads())
+    assert all(d.is_open() for d in devices), 'Devices passed in stay open'
+
+
+class FailingDevice(SimulatedUQDLogic16):
+    def read_tags(self):
+        if self.time > 10**8:
+            raise RuntimeError('USB transfer failed')
+        return super().read_tags()
+
+
+def failure():
+    devices = [
+        FailingDevice(source=PoissonSource([1e4] * 16), speed=None),
+        SimulatedUQDLogic16(source=PoissonSource([1e4] * 16), speed=None),
+    ]
+    with MultiDeviceSession(devices, poll_interval=1e-4) as multi:
+        deadline = time.perf_counter() + 10
+        while True:
+            assert time.perf_counter() < deadline, 'The error should be raised'
+            try:
+                multi.read()
+            except RuntimeError as error:
+                assert str(error) == 'USB transfer failed'
+                break
+            time.sleep(1e-3)
+        # Let a read in progress when the error was raised finish
+        time.sleep(0.05)
+        reads = multi.reads()
+        time.sleep(0.05)
+        assert multi.reads() == reads, 'Every reader should stop'
+
+
+def main():
+    merger()
+    session()
+    failure()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
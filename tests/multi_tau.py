@@ -0,0 +1,92 @@
+import numpy as np
+from logicallyUQD import CorrelatedSource, MultiTauCorrelator, PoissonSource
+
+
+def reference(channels, timestamps, start, stop, bin_width, levels, points):
+    # Products of the bin counts at every level over the whole stream
+    lags = []
+    counts = []
+    for level in range(levels):
+        width = bin_width << level
+        first = timestamps[0] // width
+        length = timestamps[-1] // width - first + 1
+        a = np.bincount(
+            timestamps[channels == start] // width - first, minlength=length
+        )
+        b = np.bincount(
+            timestamps[channels == stop] // width - first, minlength=length
+        )
+        for k in range(1 if level == 0 else points // 2, points):
+            lags.append(k * width)
+            counts.append(int(np.dot(b[k:], a[: length - k])))
+    return np.array(lags), np.array(counts, dtype=np.uint64)
+
+
+def exact():
+    source = CorrelatedSource(
+        channels=[0, 1],
+        rate=1e5,
+        delays=[0, 20e-9],
+        jitter=1e-9,
+        background=PoissonSource([1e6, 1e6], seed=5),
+        seed=5,
+    )
+    channels, timestamps = source.generate(0, 2 * 10**7, 78.125e-12)
+    timestamps = timestamps.astype(np.int64)
+    pairs = [(0, 1), (1, 1)]
+    correlator = MultiTauCorrelator(pairs, bin_width=4, levels=10, points=8)
+    assert correlator.lags.shape == (7 + 9 * 4,)
+    for i in range(0, channels.shape[0], 1001):
+        correlator.process(channels[i : i + 1001], timestamps[i : i + 1001])
+    # Late tags close every level's last bin
+    late = timestamps[-1] + (4 << 12)
+    correlator.process([0, 1], [late, late])
+
+    for p, (a, b) in enumerate(pairs):
+        lags, counts = reference(channels, timestamps, a, b, 4, 10, 8)
+        assert (correlator.lags == lags).all()
+        assert (correlator.histograms[p] == counts).all()
+
+
+def normalisation():
+    # Photon pairs 20 ns apart on top of Poissonian background
+    source = CorrelatedSource(
+        channels=[0, 1],
+        rate=1e5,
+        delays=[0, 20e-9],
+        background=PoissonSource([1e6, 1e6], seed=9),
+        seed=9,
+    )
+    channels, timestamps = source.generate(0, 10**9, 78.125e-12)
+    correlator = MultiTauCorrelator([(0, 1)], bin_width=128, levels=16)
+    for i in range(0, channels.shape[0], 65536):
+        correlator.process(channels[i : i + 65536], timestamps[i : i + 65536])
+
+    g = correlator.normalised()[0]
+    lags = correlator.lags
+    # The pairs show up at 20 ns, the rest is flat
+    assert g[np.argmax(g)] > 2
+    assert abs(lags[np.argmax(g)] * 78.125e-12 - 20e-9) <= 10e-9
+    flat = (lags * 78.125e-12 > 100e-9) & (lags * 78.125e-12 < 1e-3)
+    assert np.abs(g[flat] - 1).max() < 0.1
+
+    correlator.reset()
+    assert correlator.histograms.sum() == 0
+    assert correlator.duration == 0
+    assert (correlator.normalised() == 0).all()
+
+
+def main():
+    exact()
+    normalisation()
+    for kwargs in [{'bin_width': 0}, {'levels': 0}, {'points': 7}]:
+        try:
+            MultiTauCorrelator([(0, 1)], **kwargs)
+            assert False
+        except ValueError:
+            pass
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+from logicallyUQD import (
+    PoissonSource,
+    SimulatedUQDLogic16,
+    TagClient,
+    TagServer,
+)
+
+
+def wait_for_clients(server, clients):
+    deadline = time.monotonic() + 10
+    while server.clients < clients:
+        assert time.monotonic() < deadline, 'Client did not connect'
+        time.sleep(1e-3)
+
+
+def batches(n, size, seed=0):
+    rng = np.random.default_rng(seed)
+    out = []
+    start = 0
+    for _ in range(n):
+        channels = rng.integers(0, 16, size).astype(np.uint8)
+        timestamps = start + np.cumsum(rng.integers(1, 100, size))
+        start = int(timestamps[-1])
+        out.append((channels, timestamps.astype(np.int64)))
+    return out
+
+
+def round_trip(address, compress, number_of_channels=16):
+    sent = batches(10, 1000)
+    with TagServer(
+        address=address,
+        compress=compress,
+        resolution=78.125e-12,
+        number_of_channels=number_of_channels,
+    ) as server:
+        clients = [TagClient(server.address, timeout=10) for _ in range(2)]
+        wait_for_clients(server, 2)
+        for i, (channels, timestamps) in enumerate(sent):
+            server.publish(channels, timestamps, error_flags=i)
+        assert server.sequence == 10
+
+    for client in clients:
+        assert client.resolution == 78.125e-12
+        assert client.number_of_channels == (number_of_channels or 0)
+        received = list(client.batches())
+        assert len(received) == 10
+        for (c, t), (channels, timestamps) in zip(received, sent):
+            assert (c == channels).all()
+            assert (t == timestamps).all()
+        assert client.sequence == 9
+        assert client.error_flags == 9
+        assert client.lost_batches == 0
+        assert client.dropped_tags == 0
+        assert client.closed
+        client.close()
+
+
+def transports():
+    round_trip(('127.0.0.1', 0), False)
+    round_trip(('127.0.0.1', 0), True)
+    round_trip(('127.0.0.1', 0), True, number_of_channels=None)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'tags.sock')
+        round_trip(path, False)
+        assert not os.path.exists(path), 'Socket file should be removed'
+
+
+def late_join():
+    sent = batches(6, 1000)
+    with TagServer() as server:
+        early = TagClient(server.address, timeout=10)
+        wait_for_clients(server, 1)
+        for channels, timestamps in sent[:5]:
+            server.publish(channels, timestamps)
+        # Batches published before a client connects are not lost for it
+        late = TagClient(server.address, timeout=10)
+        wait_for_clients(server, 2)
+        server.publish(*sent[5])
+
+    received = list(late.batches())
+    assert len(received) == 1
+    assert (received[0][1] == sent[5][1]).all()
+    assert late.sequence == 5
+    assert late.lost_batches == 0
+    assert late.dropped_tags == 0
+    assert len(list(early.batches())) == 6
+    assert early.lost_batches == 0
+    early.close()
+    late.close()
+
+
+def drop():
+    # Batches much larger than the socket buffers fill the queue
+    sent = batches(20, 2**20)
+    total = sum(c.shape[0] for c, _ in sent)
+    server = TagServer(max_queued=1, policy='drop')
+    client = TagClient(server.address, timeout=10)
+    wait_for_clients(server, 1)
+    for channels, timestamps in sent:
+        server.publish(channels, timestamps)
+    dropped = server.dropped
+    assert dropped > 0, 'A client that does not read should lose batches'
+
+    received = []
+
+    def receive():
+        for channels, timestamps in client.batches():
+            assert (timestamps == sent[client.sequence][1]).all()
+            received.append(channels.shape[0])
+
+    reader = threading.Thread(target=receive)
+    reader.start()
+    server.close()
+    reader.join()
+    received = sum(received)
+    assert client.lost_batches > 0
+    assert client.dropped_tags == dropped
+    assert received + client.dropped_tags == total
+    client.close()
+
+
+def block():
+    sent = batches(20, 2**18)
+    with TagServer(max_queued=1, policy='block') as server:
+        client = TagClient(server.address, timeout=10)
+        wait_for_clients(server, 1)
+
+        def publish():
+            for channels, timestamps in sent:
+                server.publish(channels, timestamps)
+
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        for i in range(20):
+            time.sleep(1e-3)
+            channels, timestamps = client.read()
+            assert client.sequence == i
+            assert (timestamps == sent[i][1]).all()
+        publisher.join()
+        assert server.dropped == 0
+    assert client.read() is None
+    assert client.lost_batches == 0
+    client.close()
+
+
+def device():
+    source = PoissonSource([1e5] * 4, seed=3)
+    uqd = SimulatedUQDLogic16(
+        source=source, number_of_channels=4, speed=None, step=1e-3
+    )
+    server = TagServer(uqd, min_batch=1000, max_delay=1.0)
+    client = TagClient(server.address, timeout=10)
+    wait_for_clients(server, 1)
+    uqd.start_timetags()
+    uqd.inject_error_flags(2)
+    tags = 0
+    while tags < 20000:
+        tags += server.poll()
+    uqd.stop_timetags()
+    server.close()
+    assert client.number_of_channels == 4
+
+    received = list(client.batches())
+    assert sum(c.shape[0] for c, _ in received) == tags
+    # Reads are coalesced into batches of at least min_batch tags
+    assert all(c.shape[0] >= 1000 for c, _ in received[:-1])
+    assert len(received) < 20
+    timestamps = np.concatenate([t for _, t in received])
+    assert (np.diff(timestamps) >= 0).all()
+    client.close()
+
+    # run() publishes until stopped
+    uqd = SimulatedUQDLogic16(source=source, speed=None, step=1e-3)
+    stop = threading.Event()
+    with TagServer(uqd, min_batch=100) as server:
+        client = TagClient(server.address, timeout=10)
+        wait_for_clients(server, 1)
+        uqd.start_timetags()
+        thread = threading.Thread(target=server.run, args=(stop,))
+        thread.start()
+        for _ in range(5):
+            channels, timestamps = client.read()
+            assert channels.shape == timestamps.shape
+        stop.set()
+        thread.join()
+    client.close()
+
+    try:
+        TagServer(policy='wait')
+        assert False
+    except ValueError:
+        pass
+
+
+def main():
+    transports()
+    late_join()
+    drop()
+    block()
+    device()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
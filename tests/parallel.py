@@ -0,0 +1,93 @@
+import numpy as np
+from logicallyUQD import (
+    CoincidenceCounter,
+    Correlator,
+    MultiTauCorrelator,
+    PoissonSource,
+    TagFilter,
+    channels_from_patterns,
+    demultiplex,
+    errors_from_bit_sets,
+    get_num_threads,
+    patterns_from_channels,
+    set_num_threads,
+)
+
+
+def analyse(channels, timestamps):
+    offsets, packed = demultiplex(channels, timestamps, 8)
+    c, t = TagFilter([0, 2, 3, 5], delays=[0, 0, 30]).process(
+        channels, timestamps
+    )
+    correlator = Correlator(
+        [(0, 1), (1, 1), (2, 3), (4, 5)], bin_width=4, max_lag=256
+    )
+    counter = CoincidenceCounter([4, 16, 64], number_of_channels=8)
+    multi_tau = MultiTauCorrelator([(0, 1), (2, 2), (3, 4)], 8, levels=12)
+    for i in range(0, channels.shape[0], 2**18):
+        batch = (channels[i : i + 2**18], timestamps[i : i + 2**18])
+        correlator.process(*batch)
+        counter.process(*batch)
+        multi_tau.process(*batch)
+    counter.flush()
+    return [
+        offsets,
+        packed,
+        c.copy(),
+        t.copy(),
+        correlator.histograms.copy(),
+        counter.counts.copy(),
+        multi_tau.histograms.copy(),
+    ]
+
+
+def kernels():
+    channels, timestamps = PoissonSource([1e6] * 8, seed=11).generate(
+        0, 10**10, 78.125e-12
+    )
+    timestamps = timestamps.astype(np.int64)
+    assert channels.shape[0] > 4 * 2**16, 'Batches should be split'
+
+    set_num_threads(1)
+    serial = analyse(channels, timestamps)
+    set_num_threads(4)
+    assert get_num_threads() == 4
+    parallel = analyse(channels, timestamps)
+    set_num_threads(1)
+    for a, b in zip(serial, parallel):
+        assert a.shape == b.shape
+        assert (a == b).all(), 'Results should not depend on threads'
+
+    set_num_threads(0)
+    assert get_num_threads() >= 1
+    set_num_threads(1)
+    try:
+        set_num_threads(-1)
+        assert False
+    except ValueError:
+        pass
+
+
+def bits():
+    errors = errors_from_bit_sets([0, 1, 0b1000000010])
+    assert errors.shape == (3, 16)
+    assert errors[0].sum() == 0
+    assert errors[1, 15] == 1
+    assert errors[2, 14] == 2 and errors[2, 6] == 512
+    assert errors[2].sum() == 514
+
+    patterns = np.arange(2**10)
+    selected = channels_from_patterns(patterns, 10)
+    assert selected.shape == (2**10, 10)
+    assert (selected[5] == [1, 0, 1, 0, 0, 0, 0, 0, 0, 0]).all()
+    assert (patterns_from_channels(selected) == patterns).all()
+
+
+def main():
+    kernels()
+    bits()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
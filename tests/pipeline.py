@@ -0,0 +1,201 @@
+import os
+import tempfile
+import numpy as np
+from logicallyUQD import (
+    CoincidenceCounter,
+    CorrelatedSource,
+    Correlator,
+    HeraldedGate,
+    Pipeline,
+    PoissonSource,
+    SimulatedUQDLogic16,
+    TagFilter,
+    TagReader,
+    TagRecorder,
+)
+
+
+def stream():
+    source = CorrelatedSource(
+        channels=[0, 1, 2],
+        rate=1e5,
+        delays=[0, 5e-9, 0],
+        jitter=100e-12,
+        background=PoissonSource([1e5, 1e5, 1e5, 1e6], seed=4),
+        seed=4,
+    )
+    channels, timestamps = source.generate(0, 10**9, 78.125e-12)
+    return channels, timestamps.astype(np.int64)
+
+
+def filtering():
+    channels, timestamps = stream()
+    delays = [100, -20, 0]
+    keep = np.isin(channels, [0, 1])
+    shifted = timestamps[keep] + np.array([120, 0, 20])[channels[keep]]
+    order = np.argsort(shifted, kind='stable')
+    expected_channels = channels[keep][order]
+    expected_timestamps = shifted[order]
+
+    tag_filter = TagFilter([0, 1], delays)
+    assert tag_filter.channels == [0, 1]
+    assert (tag_filter.delays[:3] == [120, 0, 20]).all()
+    parts = []
+    for i in range(0, channels.shape[0], 1000):
+        c, t = tag_filter.process(
+            channels[i : i + 1000], timestamps[i : i + 1000]
+        )
+        # Returned arrays are views of the filter's buffers
+        parts.append((c.copy(), t.copy()))
+    parts.append(tag_filter.flush())
+    assert (np.concatenate([p[0] for p in parts]) == expected_channels).all()
+    assert (np.concatenate([p[1] for p in parts]) == expected_timestamps).all()
+
+    # Without delays the output needs no reordering or carry
+    c, t = TagFilter([3]).process(channels, timestamps)
+    assert (t == timestamps[channels == 3]).all()
+    assert TagFilter([3]).flush()[1].shape[0] == 0
+
+
+def stages(delays):
+    return [
+        TagFilter([0, 1, 2]),
+        TagFilter(delays=delays),
+        HeraldedGate(0, [1, 2], (0, 256), keep_heralds=True),
+        Correlator([(0, 1), (0, 2)], bin_width=8, max_lag=512),
+        CoincidenceCounter(8, number_of_channels=3),
+    ]
+
+
+def pipeline():
+    channels, timestamps = stream()
+    delays = [64, 0, 0]
+
+    # The same stages run by hand on the whole stream
+    reference = stages(delays)
+    c, t = reference[0].process(channels, timestamps)
+    c, t = reference[1].process(c, t)
+    c2, t2 = reference[1].flush()
+    c, t = np.concatenate((c, c2)), np.concatenate((t, t2))
+    c, t = reference[2].process(c, t)
+    reference[3].process(c, t)
+    reference[4].process(c, t)
+    reference[4].flush()
+
+    chain = Pipeline(stages(delays))
+    assert chain.names == [
+        '0:TagFilter+1:TagFilter',
+        '2:HeraldedGate',
+        '3:Correlator',
+        '4:CoincidenceCounter',
+    ], 'Adjacent filters should be fused'
+    kept = []
+    for i in range(0, channels.shape[0], 4096):
+        out = chain.process(channels[i : i + 4096], timestamps[i : i + 4096])
+        kept.append(out[1].copy())
+    kept.append(chain.flush()[1])
+    assert (np.concatenate(kept) == t).all()
+    assert (chain.stages[2].histograms == reference[3].histograms).all()
+    assert (chain.stages[3].counts == reference[4].counts).all()
+    assert chain.tags == channels.shape[0]
+
+    timings = chain.timings()
+    assert set(timings) == set(chain.names)
+    assert timings['3:Correlator']['count'] == chain.batches
+
+    # A recording gives the same result as the live stream
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'run.uqd')
+        with TagRecorder(path, 78.125e-12, 16, chunk_size=5000) as recorder:
+            recorder.write(channels, timestamps)
+        with TagReader(path) as reader:
+            replay = Pipeline(stages(delays))
+            assert replay.run(reader) == channels.shape[0]
+        assert (replay.stages[2].histograms == reference[3].histograms).all()
+        assert (replay.stages[3].counts == reference[4].counts).all()
+
+        # A recorder is a stage too
+        path = os.path.join(directory, 'gated.uqd')
+        with TagRecorder(path, 78.125e-12, 16) as recorder:
+            Pipeline(stages(delays)[:3] + [recorder]).run([
+                (channels, timestamps)
+            ])
+        with TagReader(path) as reader:
+            assert (reader.read()[1] == t).all()
+
+
+def flushing():
+    # Tags held back by a filter still go through the stages after it
+    chain = Pipeline([TagFilter(delays=[0, 100]), HeraldedGate(0, [1], (1, 5))])
+    chain.process([0, 1, 0, 1], [0, 10, 20, 30])
+    c, t = chain.flush()
+    assert t.shape[0] == 0, 'The gate rejects every held back tag'
+
+    def run_whole(stage, c, t):
+        c, t = stage.process(c, t)
+        c, t = c.copy(), t.copy()
+        flushed = stage.flush()
+        return np.concatenate((c, flushed[0])), np.concatenate((t, flushed[1]))
+
+    def chain_stages():
+        return [
+            TagFilter(delays=[0, 300, 0]),
+            HeraldedGate(0, [1, 2], (1, 512), keep_heralds=True),
+            TagFilter([0, 1], delays=[200, 0]),
+        ]
+
+    channels, timestamps = stream()
+    reference = chain_stages()
+    c, t = run_whole(reference[0], channels, timestamps)
+    c, t = reference[1].process(c, t)
+    c, t = run_whole(reference[2], c.copy(), t.copy())
+
+    chain = Pipeline(chain_stages())
+    kept = []
+    for i in range(0, channels.shape[0], 4096):
+        out = chain.process(channels[i : i + 4096], timestamps[i : i + 4096])
+        kept.append((out[0].copy(), out[1].copy()))
+    # Both filters hold back tags, flush merges them in time order
+    flushed = chain.flush()
+    assert (np.diff(flushed[1]) >= 0).all()
+    kept.append(flushed)
+    assert (np.concatenate([k[1] for k in kept]) == t).all()
+    assert (np.concatenate([k[0] for k in kept]) == c).all()
+
+
+def device():
+    source = PoissonSource([1e5] * 4, seed=1)
+    uqd = SimulatedUQDLogic16(
+        source=source, number_of_channels=4, speed=None, step=0.01
+    )
+    seen = []
+    chain = Pipeline(
+        [TagFilter([1, 2]), lambda c, t: seen.append(c.copy())],
+        names=['select', 'collect'],
+    )
+    uqd.start_timetags()
+    tags = chain.run(uqd, max_batches=5)
+    uqd.stop_timetags()
+    assert chain.batches == 5
+    assert tags == chain.tags
+    assert len(seen) == 5
+    assert np.isin(np.concatenate(seen), [1, 2]).all()
+    assert chain.telemetry.snapshot()['reads']['count'] >= 5
+
+    try:
+        Pipeline([object()])
+        assert False
+    except TypeError:
+        pass
+
+
+def main():
+    filtering()
+    pipeline()
+    flushing()
+    device()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import numpy as np
+from logicallyUQD import PoissonSource, RateBinner
+
+
+def reference(channels, timestamps, bin_width, origin, bins, channel_count):
+    edges = origin + np.arange(bins + 1) * bin_width
+    return np.array([
+        np.histogram(timestamps[channels == c], edges)[0]
+        for c in range(channel_count)
+    ])
+
+
+def streaming():
+    source = PoissonSource([1e6, 5e5, 1e5], seed=4)
+    channels, timestamps = source.generate(0, 10**8, 78.125e-12)
+    timestamps = timestamps.astype(np.int64)
+    binner = RateBinner(
+        10**5, number_of_channels=2, capacity=100, levels=3, decimation=4
+    )
+    # Batch edges fall inside bins
+    for i in range(0, channels.shape[0], 777):
+        binner.process(channels[i : i + 777], timestamps[i : i + 777])
+
+    origin = (timestamps[0] // 10**5) * 10**5
+    last = timestamps[-1] // 10**5 - timestamps[0] // 10**5
+    assert binner.bins(0) == last, 'Every bin before the last tag is complete'
+    expected = reference(channels, timestamps, 10**5, origin, last, 2)
+
+    times, counts = binner.trace()
+    assert counts.shape == (2, 100)
+    assert np.array_equal(counts, expected[:, -100:])
+    assert np.array_equal(np.diff(times), np.full(99, 10**5))
+    assert times[-1] == origin + (last - 1) * 10**5
+    assert binner.partial.sum() == np.count_nonzero(
+        (channels < 2) & (timestamps >= origin + last * 10**5)
+    )
+
+    # Level 2 bins are 16 level 0 bins
+    assert binner.bins(2) == last // 16
+    times, counts = binner.trace(2)
+    whole = (last // 16) * 16
+    summed = expected[:, :whole].reshape(2, -1, 16).sum(axis=2)
+    assert np.array_equal(counts, summed[:, -counts.shape[1] :])
+    assert times[0] == origin + (last // 16 - counts.shape[1]) * 16 * 10**5
+
+    _, rates = binner.rates(78.125e-12, max_bins=10)
+    assert rates.shape == (2, 10)
+    assert abs(rates[0].mean() / 1e6 - 1) < 0.1
+
+
+def gaps():
+    binner = RateBinner(
+        10, number_of_channels=1, capacity=8, levels=3, decimation=2
+    )
+    binner.process([0, 0, 0], [3, 15, 16])
+    # A gap of far more bins than the rings hold
+    binner.process([0], [10**12 + 5])
+    assert binner.bins(0) == 10**11
+    assert binner.bins(1) == 10**11 // 2 and binner.bins(2) == 10**11 // 4
+    assert binner.trace(0)[1].sum() == 0
+    _, counts = binner.trace(0, max_bins=3)
+    assert counts.shape == (1, 3)
+
+    binner.reset()
+    binner.process([0, 0, 0, 0], [0, 10, 25, 31])
+    assert binner.trace()[1].tolist() == [[1, 1, 1]]
+    binner.advance(65)
+    assert binner.trace()[1].tolist() == [[1, 1, 1, 1, 0, 0]]
+    assert binner.trace(1)[1].tolist() == [[2, 2, 0]]
+    assert binner.trace(2)[1].tolist() == [[4]]
+
+
+def main():
+    streaming()
+    gaps()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
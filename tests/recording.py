@@ -0,0 +1,55 @@
+import os
+import tempfile
+import numpy as np
+from logicallyUQD import TagRecorder, TagReader
+
+
+def main():
+    rng = np.random.default_rng(2)
+    n = 50_000
+    timestamps = np.cumsum(rng.integers(1, 100, n)).astype(np.uint64)
+    channels = rng.integers(0, 16, n).astype(np.uint8)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'run.uqd')
+        with TagRecorder(
+            path, 78.125e-12, 16, thresholds=[0.1] * 16, chunk_size=4096
+        ) as recorder:
+            for batch in np.array_split(np.arange(n), 13):
+                recorder.write(channels[batch], timestamps[batch])
+
+        reader = TagReader(path)
+        assert reader.count == n, 'Every tag should be recorded'
+        assert reader.resolution == 78.125e-12, 'Header should be kept'
+        assert reader.thresholds == [0.1] * 16, 'Thresholds should be kept'
+
+        all_channels, all_timestamps = reader.read()
+        assert np.array_equal(all_channels, channels)
+        assert np.array_equal(all_timestamps, timestamps.astype(np.int64))
+
+        t0 = int(timestamps[1234])
+        t1 = int(timestamps[40321])
+        keep = (
+            (timestamps >= t0) & (timestamps < t1) & np.isin(channels, [3, 7])
+        )
+        part_channels, part_timestamps = reader.read(t0, t1, channels=[3, 7])
+        assert np.array_equal(part_channels, channels[keep]), (
+            'Time and channel selection should match a full scan'
+        )
+        assert np.array_equal(part_timestamps, timestamps[keep])
+        reader.close()
+
+        # A recording that was never closed is still readable
+        path = os.path.join(directory, 'unclosed.uqd')
+        recorder = TagRecorder(path, 78.125e-12, 16, chunk_size=1000)
+        recorder.write(channels[:5500], timestamps[:5500])
+        recorder.flush()
+        reader = TagReader(path)
+        assert reader.count == 5500, 'Index should be rebuilt from chunks'
+        reader.close()
+
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import multiprocessing
+import numpy as np
+from logicallyUQD import (
+    PoissonSource,
+    SimulatedUQDLogic16,
+    TagPublisher,
+    TagSubscriber,
+)
+
+
+def subscribe(name, ready, results):
+    with TagSubscriber(name) as subscriber:
+        ready.release()
+        tags = 0
+        checksum = 0
+        for channels, timestamps in subscriber.batches():
+            tags += channels.shape[0]
+            checksum += int(timestamps.sum())
+            assert subscriber.valid()
+        results.put((tags, checksum, subscriber.overruns))
+
+
+def fan_out():
+    source = PoissonSource([1e5] * 4, seed=5)
+    uqd = SimulatedUQDLogic16(source=source, speed=None, step=1e-3)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    ready = context.Semaphore(0)
+    # Enough slots that the subscribers cannot fall behind
+    with TagPublisher(uqd, slots=4096, slot_capacity=256) as publisher:
+        workers = [
+            context.Process(
+                target=subscribe, args=(publisher.name, ready, results)
+            )
+            for _ in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for _ in workers:
+            assert ready.acquire(timeout=60)
+
+        uqd.start_timetags()
+        total = 0
+        checksum = 0
+        for _ in range(200):
+            count, channels, timestamps = uqd.read_tags()
+            total += count
+            checksum += int(timestamps[:count].astype(np.int64).sum())
+            publisher.publish(channels[:count], timestamps[:count])
+        uqd.stop_timetags()
+        assert publisher.sequence < 4096
+
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+    for _ in workers:
+        assert results.get(timeout=1) == (total, checksum, 0)
+
+
+def overrun():
+    with TagPublisher(
+        slots=4, slot_capacity=10, number_of_channels=2, resolution=1e-9
+    ) as publisher:
+        subscriber = TagSubscriber(publisher.name)
+        assert subscriber.number_of_channels == 2
+        assert subscriber.resolution == 1e-9
+        assert subscriber.read() is None
+
+        # 25 tags take three slots
+        assert publisher.publish(np.zeros(25), np.arange(25)) == 3
+        assert subscriber.lag == 3
+        channels, timestamps = subscriber.read()
+        assert np.array_equal(timestamps, np.arange(10))
+
+        for i in range(5):
+            publisher.publish([1], [100 + i])
+        assert not subscriber.valid(), 'Slot reused while held'
+        channels, timestamps = subscriber.read()
+        # Slots hold the last 4 batches
+        assert subscriber.overruns == 3
+        assert timestamps.tolist() == [101] and channels.tolist() == [1]
+        assert subscriber.lag == 3
+
+        late = TagSubscriber(publisher.name, latest=True)
+        assert late.read() is None and late.lag == 0
+        publisher.publish([0], [7])
+        assert late.read()[1].tolist() == [7]
+        held = timestamps.tolist()
+        late.close()
+        subscriber.close()
+    # Views held across close keep the block mapped
+    assert timestamps.tolist() == held
+
+
+def main():
+    overrun()
+    fan_out()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import tempfile
+import numpy as np
+from time import perf_counter_ns, sleep
+from logicallyUQD import (
+    CorrelatedSource,
+    Pipeline,
+    PoissonSource,
+    ReplaySource,
+    SimulatedLogicMode,
+    SimulatedLogicSampler,
+    SimulatedUQDLogic16,
+    TagRecorder,
+)
+
+
+def timetag_mode():
+    source = PoissonSource([1e5] * 16, seed=0)
+    uqd = SimulatedUQDLogic16(source=source, speed=None, step=0.1)
+    for ch in range(uqd.number_of_channels):
+        uqd.input_threshold = (ch + 1, 0.1)
+
+    uqd.start_timetags()
+    read_time = []
+    total = 0
+    for _ in range(4):
+        a = perf_counter_ns()
+        (count, channels, timestamps) = uqd.read_tags()
+        read_time.append(perf_counter_ns() - a)
+        total += count
+        assert np.all(np.diff(timestamps.astype(np.int64)) >= 0), (
+            'Tags should be time ordered'
+        )
+    uqd.stop_timetags()
+
+    # 16 channels at 100 kHz for 0.4s
+    assert abs(total - 640_000) < 5 * np.sqrt(640_000), (
+        f'Unexpected number of tags {total}'
+    )
+    print(f'Read:\t{np.mean(read_time):.2f} +/- {np.std(read_time):.2f}ns')
+
+
+def filtering():
+    source = CorrelatedSource(
+        [0, 1], 1e4, background=PoissonSource([0, 0, 1e4], seed=3), seed=1
+    )
+    uqd = SimulatedUQDLogic16(
+        source=source, number_of_channels=4, speed=None, step=0.1
+    )
+    uqd.filter_min_count = 2
+    uqd.filter_max_time = 1e-9
+    uqd.start_timetags()
+    (count, channels, timestamps) = uqd.read_tags()
+    assert count > 0, 'Pairs should pass the filter'
+    assert np.all(channels != 2), 'Lone background tags should be filtered'
+
+    uqd.input_delay = (1, 100e-9)
+    uqd.filter_min_count = 1
+    (count, channels, timestamps) = uqd.read_tags()
+    delays = timestamps[channels == 1].astype(np.int64)
+    delays -= timestamps[channels == 0].astype(np.int64)[: delays.shape[0]]
+    assert abs(np.median(delays) * uqd.resolution - 100e-9) < 1e-9, (
+        'input_delay should shift channel 1'
+    )
+
+
+def inversion():
+    source = CorrelatedSource([0, 1], 1e4, seed=5)
+    uqd = SimulatedUQDLogic16(
+        source=source, number_of_channels=4, speed=None, step=0.1
+    )
+    uqd.start_timetags()
+
+    def delay():
+        (count, channels, timestamps) = uqd.read_tags()
+        delays = timestamps[channels == 1].astype(np.int64)
+        delays -= timestamps[channels == 0].astype(np.int64)[: delays.shape[0]]
+        return np.median(delays) * uqd.resolution
+
+    uqd.inversion = (1, 1)
+    assert delay() == 0, 'Inversion should only change on inversion_apply'
+    uqd.inversion_apply()
+    assert abs(delay() - 5e-9) < 1e-10, (
+        'Inverted channels should trigger a pulse width later'
+    )
+    assert list(uqd.config.inversion) == [0, 1, 0, 0]
+
+    uqd.inversion = (1, 0)
+    uqd.inversion = (0, 1)
+    uqd.inversion_apply()
+    uqd.read_tags()  # Tags delayed past the previous read
+    assert abs(delay() + 5e-9) < 1e-10, 'Channel 0 should now be late'
+
+
+def logic_mode():
+    source = CorrelatedSource([0, 1, 2], 1e4, jitter=50e-12, seed=2)
+    uqd = SimulatedUQDLogic16(source=source, speed=None, step=0.1)
+    logic = SimulatedLogicMode(uqd)
+    logic.set_window_width(64)
+
+    time = logic.read_logic() * 5e-9
+    singles = [logic.calc_count_pos(1 << ch) for ch in range(16)]
+    triples = logic.calc_count_pos(0b111)
+    assert abs(time - 0.1) < 1e-6, 'Time counter should match the interval'
+    assert singles[0] == singles[1] == singles[2] == triples, (
+        'Every event should be seen on all three channels'
+    )
+    assert sum(singles[3:]) == 0, 'Unused channels should not count'
+    assert list(logic.calc_counts([1 << ch for ch in range(16)])) == singles, (
+        'Batched counts should match calc_count_pos'
+    )
+
+    try:
+        logic.set_window_width_ex(1, 64)
+        assert False, 'Per index windows are not simulated'
+    except NotImplementedError:
+        pass
+
+
+def logic_sampler():
+    source = CorrelatedSource([0, 1], 1e4, jitter=50e-12, seed=3)
+    uqd = SimulatedUQDLogic16(source=source, speed=None, step=1e-3)
+    logic = SimulatedLogicMode(uqd)
+    logic.set_window_width(64)
+
+    with SimulatedLogicSampler(logic, [0b01, 0b10, 0b11], capacity=64) as s:
+        sleep(0.2)
+    time_counters, counts = s.latest()
+    assert not s.is_running
+    assert counts.shape == (min(s.samples, 63), 3), 'Ring should keep the end'
+    assert (time_counters == 200000).all(), 'Each sample spans one step'
+    assert (counts[:, 0] == counts[:, 2]).all(), 'Every event is a pair'
+
+    rates = s.rates()
+    duration = time_counters.sum() * 5e-9
+    assert abs(rates[2] - 1e4) < 5 * np.sqrt(1e4 / duration), (
+        'Rate should match the source'
+    )
+    assert np.allclose(s.averages(10), counts[-10:].mean(axis=0))
+
+
+async def concurrent_reads():
+    source = PoissonSource([1e5] * 4, seed=4)
+    uqd = SimulatedUQDLogic16(source=source, speed=None, step=1e-3)
+    uqd.start_timetags()
+
+    # The event loop must keep running while the device is being read
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0)
+
+    task = asyncio.create_task(ticker())
+    count, channels, timestamps = await uqd.aread_tags()
+    assert count == channels.shape[0] == timestamps.shape[0] > 0
+
+    batches = 0
+    last = timestamps.view(np.int64)[-1]
+    async for channels, timestamps in uqd.stream():
+        assert timestamps.dtype == np.int64
+        assert timestamps[0] >= last, 'Batches should continue in order'
+        last = timestamps[-1]
+        batches += 1
+        if batches == 20:
+            break
+
+    uqd.stop_timetags()
+    logic = SimulatedLogicMode(uqd)
+    time_counter = await logic.aread_logic()
+    assert time_counter > 0
+    task.cancel()
+    assert ticks > batches, 'Reads should not block the event loop'
+
+
+def replay():
+    rng = np.random.default_rng(6)
+    channels = rng.integers(0, 4, 10_000).astype(np.uint8)
+    timestamps = 1000 + np.cumsum(rng.integers(1, 1000, 10_000))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'tags.uqd')
+        with TagRecorder(path, 78.125e-12, 4) as recorder:
+            recorder.write(channels, timestamps)
+
+        # Device time zero is the first tag, start_timetags skips one step
+        step = 1e-6
+        first = int(timestamps[0]) + int(step / 78.125e-12)
+        expected = timestamps[timestamps >= first] - timestamps[0]
+
+        uqd = SimulatedUQDLogic16(
+            source=ReplaySource(path), speed=None, step=step
+        )
+        assert uqd.number_of_channels == 4
+        uqd.start_timetags()
+        replayed = []
+        while not uqd.exhausted:
+            (count, _, t) = uqd.read_tags()
+            replayed.append(t.astype(np.int64))
+        assert (np.concatenate(replayed) == expected).all()
+        assert uqd.read_tags()[0] == 0, 'Nothing follows the end'
+
+        uqd = SimulatedUQDLogic16(
+            source=ReplaySource(path), speed=None, step=step
+        )
+        uqd.start_timetags()
+        pipeline = Pipeline([])
+        assert pipeline.run(uqd) == expected.shape[0], (
+            'Pipeline.run should end with the recording'
+        )
+
+        async def stream():
+            uqd = SimulatedUQDLogic16(
+                source=ReplaySource(path), speed=None, step=step
+            )
+            uqd.start_timetags()
+            return [t async for _, t in uqd.stream()]
+
+        streamed = asyncio.run(stream())
+        assert (np.concatenate(streamed) == expected).all(), (
+            'stream should end with the recording'
+        )
+
+
+def main():
+    timetag_mode()
+    filtering()
+    inversion()
+    logic_mode()
+    logic_sampler()
+    asyncio.run(concurrent_reads())
+    replay()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
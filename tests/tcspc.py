@@ -0,0 +1,105 @@
+import numpy as np
+from logicallyUQD import LifetimeHistogrammer, PoissonSource
+
+
+def reference(channels, timestamps, sync, photon_channels, bins, width):
+    syncs = timestamps[channels == sync]
+    photon = np.isin(channels, photon_channels)
+    j = np.searchsorted(syncs, timestamps, side='right') - 1
+    synced = photon & (j >= 0)
+    macro = syncs[j[synced]]
+    micro = timestamps[synced] - macro
+    histograms = np.zeros((len(photon_channels), bins), dtype=np.uint64)
+    for row, c in enumerate(photon_channels):
+        k = micro[channels[synced] == c] // width
+        np.add.at(histograms[row], k[k < bins], 1)
+    return histograms, channels[synced], macro, micro
+
+
+def streaming():
+    # An 80 MHz sync with photons at a few MHz
+    channels, timestamps = PoissonSource([8e7, 2e6, 3e6], seed=3).generate(
+        0, 10**7, 78.125e-12
+    )
+    timestamps = timestamps.astype(np.int64)
+    # Sync and photons at the same timestamp have an arbitrary order in the
+    # stream, drop them so the reference agrees
+    syncs = timestamps[channels == 0]
+    ties = np.isin(timestamps, syncs) & (channels != 0)
+    channels = channels[~ties]
+    timestamps = timestamps[~ties]
+
+    histograms, c_ref, macro_ref, micro_ref = reference(
+        channels, timestamps, 0, [1, 2], 64, 4
+    )
+    tcspc = LifetimeHistogrammer(0, [1, 2], 64, bin_width=4, keep_photons=True)
+    out = [[], [], []]
+    for i in range(0, channels.shape[0], 997):
+        c, macro, micro = tcspc.process(
+            channels[i : i + 997], timestamps[i : i + 997]
+        )
+        out[0].append(c)
+        out[1].append(macro)
+        out[2].append(micro)
+
+    assert (tcspc.histograms == histograms).all()
+    assert (np.concatenate(out[0]) == c_ref).all()
+    assert (np.concatenate(out[1]) == macro_ref).all()
+    assert (np.concatenate(out[2]) == micro_ref).all()
+    assert tcspc.photons == c_ref.shape[0]
+    assert tcspc.overflow == tcspc.photons - histograms.sum()
+    assert tcspc.syncs == (channels == 0).sum()
+    assert tcspc.last_sync == timestamps[channels == 0][-1]
+
+
+def counters():
+    tcspc = LifetimeHistogrammer(3, [0, 1], 4, bin_width=2)
+    assert tcspc.last_sync is None
+    assert (tcspc.bin_edges == [0, 2, 4, 6, 8]).all()
+
+    result = tcspc.process([0, 3, 0, 1, 2], [5, 10, 11, 13, 14])
+    assert result is None
+    assert tcspc.unsynced == 1
+    assert tcspc.last_sync == 10
+    # The sync is carried, channel 2 is not a photon channel
+    tcspc.process([1, 0, 3, 1], [17, 30, 40, 40])
+    assert (tcspc.histograms == [[1, 0, 0, 0], [1, 1, 0, 1]]).all()
+    assert tcspc.overflow == 1
+    assert tcspc.photons == 5
+    assert tcspc.syncs == 2
+    assert tcspc.channels == [0, 1]
+
+    tcspc.process([], [])
+    tcspc.reset()
+    assert tcspc.histograms.sum() == 0
+    assert tcspc.last_sync is None
+    assert tcspc.photons == 0
+
+    # A photon before the latest sync, as after a restart without reset
+    tcspc = LifetimeHistogrammer(0, [1], 4, keep_photons=True)
+    tcspc.process([0], [10**12])
+    c, macro, micro = tcspc.process([1, 1], [1000, 10**12 + 2])
+    assert tcspc.early == 1
+    assert tcspc.photons == 1
+    assert (micro == [2]).all()
+    assert (tcspc.histograms == [[0, 0, 1, 0]]).all()
+
+    tcspc.reset()
+    assert tcspc.early == 0
+
+    for args in [(3, [3], 4), (0, [1, 1], 4), (0, [1], 0), (256, [1], 4)]:
+        try:
+            LifetimeHistogrammer(*args)
+            assert False
+        except ValueError:
+            pass
+
+
+def main():
+    counters()
+    streaming()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+from logicallyUQD import (
+    LogHistogram,
+    PoissonSource,
+    SimulatedLogicMode,
+    SimulatedUQDLogic16,
+)
+
+
+def histogram():
+    h = LogHistogram()
+    for value in range(1, 1001):
+        h.add(value)
+    summary = h.summary()
+    assert summary['count'] == 1000
+    assert summary['min'] == 1 and summary['max'] == 1000
+    assert abs(summary['mean'] - 500.5) < 1e-9
+    # Percentiles are bucket upper edges, within a factor of two
+    assert 500 <= summary['p50'] < 1000
+    assert 990 <= summary['p99'] <= 1000
+    assert h.counts.sum() == 1000
+    assert h.counts[0] == 0 and h.counts[1] == 1 and h.counts[2] == 2
+
+
+def acquisition():
+    source = PoissonSource([1e5] * 4, seed=0)
+    uqd = SimulatedUQDLogic16(source=source, speed=None, step=1e-3)
+    assert uqd.telemetry is None, 'Telemetry should be off by default'
+
+    telemetry = uqd.enable_telemetry()
+    uqd.start_timetags()
+    total = 0
+    for i in range(100):
+        if i == 50:
+            uqd.inject_error_flags(1 | 512)
+        count, _, _ = uqd.read_tags()
+        total += count
+    uqd.stop_timetags()
+
+    snapshot = telemetry.snapshot()
+    reads = snapshot['reads']
+    assert reads['count'] == 100 and reads['empty'] == 0
+    assert reads['tags'] == total
+    assert reads['tags_per_read']['count'] == 100
+    assert reads['gap_ns']['count'] == 99
+    assert reads['tags_per_second'] > 0
+    assert snapshot['calls']['read_tags']['count'] == 100
+    assert snapshot['calls']['start_timetags']['count'] == 1
+    assert snapshot['calls']['stop_timetags']['count'] == 1
+
+    errors = snapshot['errors']
+    assert set(errors) == {'DataOverflow', 'OutTooLate'}
+    assert errors['DataOverflow']['count'] == 1
+    assert len(telemetry.error_events()) == 1
+
+    logic = SimulatedLogicMode(uqd)
+    logic.read_logic()
+    assert telemetry.snapshot()['calls']['read_logic']['count'] == 1
+
+    uqd.disable_telemetry()
+    uqd.read_tags()
+    assert uqd.telemetry is None
+
+
+def main():
+    histogram()
+    acquisition()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import numpy as np
+from logicallyUQD import TimeConverter, VendorCalibration
+
+CALIBRATION_FILE = os.path.join(
+    os.path.dirname(__file__), '..', 'Timetag Calibration Data1.txt'
+)
+
+
+def calibration_file():
+    calibration = VendorCalibration.load(CALIBRATION_FILE)
+    assert calibration.version == 1
+    assert calibration.number_of_channels == 16
+    assert calibration.table.shape == (16, 8)
+    assert calibration.table[1, 0] == 7
+    assert abs(calibration.delays(1.0)[0] - 18.3874) < 1e-12
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'calibration.txt')
+        calibration.save(path)
+        again = VendorCalibration.load(path)
+    assert (again.table == calibration.table).all()
+    assert np.allclose(again.delays(), calibration.delays())
+
+
+def conversion():
+    rng = np.random.default_rng(0)
+    n = 100_000
+    channels = rng.integers(0, 16, n, dtype=np.uint8)
+    timestamps = np.sort(rng.integers(0, 2**40, n, dtype=np.int64))
+    delays = rng.uniform(-5e-9, 5e-9, 16)
+    converter = TimeConverter(78.125e-12, delays)
+
+    # Reference with exact integer arithmetic
+    offsets = np.rint(delays * 1e12).astype(np.int64)
+    expected = timestamps * 625 // 8 + offsets[channels]
+    ps = converter.to_picoseconds(channels, timestamps)
+    assert ps.dtype == np.int64
+    assert (ps == expected).all(), 'Picoseconds should be exact'
+
+    seconds = converter.to_seconds(channels, timestamps)
+    assert np.allclose(seconds, timestamps * 78.125e-12 + delays[channels])
+
+    # In place, and from the uint64 arrays returned by read_tags
+    raw = timestamps.copy()
+    result = converter.to_picoseconds(channels, raw.view(np.uint64), out=raw)
+    assert np.shares_memory(result, raw)
+    assert (raw == expected).all()
+
+    buffer = np.empty(2 * n)
+    converter.to_seconds(channels, timestamps, out=buffer)
+    assert np.allclose(buffer[:n], seconds)
+
+    calibrated = TimeConverter.from_calibration(CALIBRATION_FILE, 78.125e-12)
+    assert np.allclose(
+        calibrated.delays,
+        -VendorCalibration.load(CALIBRATION_FILE).delays(),
+    )
+
+
+def main():
+    calibration_file()
+    conversion()
+    print('All tests passed!')
+
+
+if __name__ == '__main__':
+    main()